@@ -1,6 +1,7 @@
 from flask import Blueprint
 from flask_restx import Api
 
+from .main.controller.collection_search_controller import api as collection_search_ns
 from .main.controller.file_controller import api as file_ns
 from .main.controller.gdal_info_controller import api as gdal_info_ns
 from .main.controller.private_catalog_controller import api as collection_ns
@@ -26,3 +27,4 @@ api.add_namespace(file_ns, path='/file')
 api.add_namespace(gdal_info_ns, path='/gdal_info')
 api.add_namespace(stac_generator_ns, path='/stac_generator')
 api.add_namespace(stac_ns, path='/stac')
+api.add_namespace(collection_search_ns, path='/collections')
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -9,6 +10,47 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     RESTX_MASK_SWAGGER = False
     AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS = os.getenv('AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS', "stac-items")
+    AZURE_STORAGE_CONNECTION_POOL_SIZE = int(os.getenv('AZURE_STORAGE_CONNECTION_POOL_SIZE', 32))
+    AZURE_STORAGE_UPLOAD_BLOCK_SIZE = int(os.getenv('AZURE_STORAGE_UPLOAD_BLOCK_SIZE', 8 * 1024 * 1024))
+    AZURE_STORAGE_UPLOAD_MAX_CONCURRENCY = int(os.getenv('AZURE_STORAGE_UPLOAD_MAX_CONCURRENCY', 8))
+    RETRIEVE_FILE_MAX_BYTES = int(os.getenv('RETRIEVE_FILE_MAX_BYTES', 32 * 1024 * 1024))
+    RETRIEVE_FILE_CHUNK_SIZE = int(os.getenv('RETRIEVE_FILE_CHUNK_SIZE', 1024 * 1024))
+    METADATA_CACHE_DIR = os.getenv('METADATA_CACHE_DIR',
+                                   os.path.join(tempfile.gettempdir(), "stac-portal-metadata-cache"))
+    METADATA_CACHE_MAX_BYTES = int(os.getenv('METADATA_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    METADATA_CACHE_FRESH_SECONDS = float(os.getenv('METADATA_CACHE_FRESH_SECONDS', 30))
+    UPLOAD_SESSION_MAX_CHUNK_SIZE = int(os.getenv('UPLOAD_SESSION_MAX_CHUNK_SIZE', 100 * 1024 * 1024))
+    UPLOAD_SESSION_TTL_SECONDS = float(os.getenv('UPLOAD_SESSION_TTL_SECONDS', 24 * 60 * 60))
+    SEARCH_CACHE_MAX_BYTES = int(os.getenv('SEARCH_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    SEARCH_CACHE_TTL_SECONDS = float(os.getenv('SEARCH_CACHE_TTL_SECONDS', 60))
+    SEARCH_CACHE_BBOX_GRID_DEGREES = float(os.getenv('SEARCH_CACHE_BBOX_GRID_DEGREES', 0.01))
+    BLOB_LISTING_CACHE_MAX_BYTES = int(os.getenv('BLOB_LISTING_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    BLOB_LISTING_CACHE_TTL_SECONDS = float(os.getenv('BLOB_LISTING_CACHE_TTL_SECONDS', 10))
+    INGESTION_MAX_CONCURRENT_JOBS = int(os.getenv('INGESTION_MAX_CONCURRENT_JOBS', 8))
+    INGESTION_MAX_CONCURRENT_JOBS_PER_CATALOG = int(os.getenv('INGESTION_MAX_CONCURRENT_JOBS_PER_CATALOG', 2))
+    INGESTION_RESERVED_INTERACTIVE_JOBS = int(os.getenv('INGESTION_RESERVED_INTERACTIVE_JOBS', 2))
+    INGESTION_MAX_ATTEMPTS = int(os.getenv('INGESTION_MAX_ATTEMPTS', 5))
+    INGESTION_RETRY_BACKOFF_SECONDS = float(os.getenv('INGESTION_RETRY_BACKOFF_SECONDS', 30))
+    INGESTION_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv('INGESTION_RETRY_BACKOFF_MAX_SECONDS', 3600))
+    INGESTION_JOB_LEASE_SECONDS = float(os.getenv('INGESTION_JOB_LEASE_SECONDS', 300))
+    INGESTION_DISPATCHER_POLL_SECONDS = float(os.getenv('INGESTION_DISPATCHER_POLL_SECONDS', 5))
+    INGESTION_INCREMENTAL_OVERLAP_SECONDS = float(os.getenv('INGESTION_INCREMENTAL_OVERLAP_SECONDS', 24 * 60 * 60))
+    INGESTION_REQUEST_TIMEOUT_SECONDS = float(os.getenv('INGESTION_REQUEST_TIMEOUT_SECONDS', 6 * 60 * 60))
+    PIPELINE_MAX_CONCURRENT_JOBS = int(os.getenv('PIPELINE_MAX_CONCURRENT_JOBS', 4))
+    PIPELINE_MAX_ATTEMPTS = int(os.getenv('PIPELINE_MAX_ATTEMPTS', 3))
+    PIPELINE_RETRY_BACKOFF_SECONDS = float(os.getenv('PIPELINE_RETRY_BACKOFF_SECONDS', 30))
+    PIPELINE_JOB_LEASE_SECONDS = float(os.getenv('PIPELINE_JOB_LEASE_SECONDS', 300))
+    PIPELINE_WORKER_POLL_SECONDS = float(os.getenv('PIPELINE_WORKER_POLL_SECONDS', 2))
+    # Url the ingester reaches this API on, progress callbacks are not requested when empty
+    STAC_PORTAL_BACKEND_URL = os.getenv('STAC_PORTAL_BACKEND_URL', "")
+    STATUS_STREAM_KEEPALIVE_SECONDS = float(os.getenv('STATUS_STREAM_KEEPALIVE_SECONDS', 15))
+    STATUS_STREAM_MAX_SECONDS = float(os.getenv('STATUS_STREAM_MAX_SECONDS', 60 * 60))
+    STAC_INGESTION_STATUS_RETENTION_DAYS = float(os.getenv('STAC_INGESTION_STATUS_RETENTION_DAYS', 90))
+    STAC_INGESTION_STATUS_PRUNE_BATCH_SIZE = int(os.getenv('STAC_INGESTION_STATUS_PRUNE_BATCH_SIZE', 1000))
+    SCHEDULER_POLL_SECONDS = float(os.getenv('SCHEDULER_POLL_SECONDS', 30))
+    SCHEDULER_MAX_ACTIVE_INGESTIONS = int(os.getenv('SCHEDULER_MAX_ACTIVE_INGESTIONS', 20))
+    SCHEDULER_JITTER_FRACTION = float(os.getenv('SCHEDULER_JITTER_FRACTION', 0.1))
+    SCHEDULER_PRUNE_INTERVAL_SECONDS = float(os.getenv('SCHEDULER_PRUNE_INTERVAL_SECONDS', 24 * 60 * 60))
 
 
 class DevelopmentConfig(Config):
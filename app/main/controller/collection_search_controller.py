@@ -0,0 +1,45 @@
+from flask import request
+from flask_restx import Resource
+
+from ..custom_exceptions import *
+from ..service import collection_search_service
+from ..util import cql2
+from ..util.dto import CollectionSearchDto
+
+api = CollectionSearchDto.api
+
+
+@api.route("/search/")
+class CollectionSearch(Resource):
+    @api.doc(description="Search public and private collections in a single paginated query")
+    @api.response(200, "Success")
+    @api.response(400, "Validation Error - Invalid datetime or filter")
+    @api.expect(CollectionSearchDto.collection_search, CollectionSearchDto.collection_list_arguments, validate=True)
+    def post(self):
+        spatial_extent: list[float] = request.json.get("bbox")
+        temporal_extent: str = request.json.get("datetime")
+        query: str = request.json.get("q")
+        limit: int = request.json.get("limit", 100)
+        offset: int = request.json.get("offset", 0)
+        args = CollectionSearchDto.collection_list_arguments.parse_args()
+        try:
+            filter_expression = cql2.parse_filter(request.json.get("filter"), request.json.get("filter-lang"))
+            return collection_search_service.search_all_collections(
+                spatial_extent, temporal_extent, query, limit, offset, args["simplified_footprint"],
+                filter_expression), 200
+        except ConvertingTimestampError:
+            return {
+                       "message": "Datetime must be an interval of two timestamps separated by a /",
+                   }, 400
+        except InvalidFilterError as e:
+            return {
+                       "message": str(e),
+                   }, 400
+
+
+@api.route("/queryables/")
+class CollectionQueryables(Resource):
+    @api.doc(description="JSON schema of the properties collection search filters may reference")
+    @api.response(200, "Success")
+    def get(self):
+        return collection_search_service.get_queryables(request.base_url), 200
@@ -1,7 +1,9 @@
 from flask import request
 from flask_restx import Resource
-from werkzeug.utils import secure_filename
 
+from ..custom_exceptions import FileTooLargeError, InvalidSasTokenRequestError, InvalidUploadChunkError, \
+    UnsupportedFileTypeError, UploadIncompleteError, UploadSessionAlreadyExistsError, UploadSessionDoesNotExistError
+from ..service import upload_session_service
 from ..service.file_service import *
 from ..util.dto import FileDto, FilesDto
 
@@ -18,6 +20,14 @@ class CheckBlobStatus(Resource):
         return {"available": available, "message": message}, 200
 
 
+@api.route("/metadata_cache/")
+class MetadataCacheStatistics(Resource):
+    @api.doc(description="Get statistics of the metadata file cache, hits and misses are counted per worker")
+    @api.response(200, "Success")
+    def get(self):
+        return get_metadata_cache_statistics(), 200
+
+
 @api.route("/sas_token/<filename>/")
 class GetSasToken(Resource):
     @api.doc(description="Get a SAS token for the blob")
@@ -40,6 +50,21 @@ class GetReadSasToken(Resource):
                 "endpoint": endpoint}, 200
 
 
+@api.route("/sas_tokens/")
+class GetSasTokens(Resource):
+    @api.doc(description="Get SAS tokens for many blobs, or a single token for the container")
+    @api.expect(FileDto.sas_tokens, validate=True)
+    @api.response(200, "Success")
+    @api.response(400, "Invalid request")
+    def post(self):
+        data = request.json
+        try:
+            return get_sas_tokens(data["permission"], data.get("blob_names"), data.get("prefix"),
+                                  data.get("container_scope", False)), 200
+        except InvalidSasTokenRequestError as e:
+            return {"message": str(e)}, 400
+
+
 @api.route("/stac_assets/<item_id>/upload/")
 class CommitStacAssets(Resource):
     @api.doc(description="Upload stac assets to the azure storage blob")
@@ -49,9 +74,7 @@ class CommitStacAssets(Resource):
     def post(self, item_id):
         args = FileDto.file_upload.parse_args()
         file = args["file"]
-        filename = secure_filename(file.filename)
-        if item_id not in filename:
-            filename = f"{item_id}_{filename}"
+        filename = blob_name_for_item_file(item_id, file.filename)
 
         try:
             message = upload_filestream_to_blob(filename, file)
@@ -60,27 +83,151 @@ class CommitStacAssets(Resource):
             return {"message": "File already exists"}, 409
 
 
+@api.route("/uploads/")
+class UploadSessions(Resource):
+    @api.doc(description="Initiate a resumable upload, whose chunks are then sent to /file/uploads/<upload_id>/chunk/")
+    @api.expect(FileDto.upload_session, validate=True)
+    @api.response(201, "Created")
+    @api.response(400, "Invalid size")
+    @api.response(409, "File already exists or is being uploaded")
+    def post(self):
+        data = request.json
+        try:
+            return upload_session_service.create_upload_session(data["item_id"], data["filename"], data["size"],
+                                                                data.get("content_type")), 201
+        except InvalidUploadChunkError as e:
+            return {"message": str(e)}, 400
+        except FileExistsError:
+            return {"message": "File already exists"}, 409
+        except UploadSessionAlreadyExistsError:
+            return {"message": "File is already being uploaded"}, 409
+
+
+@api.route("/uploads/<string:upload_id>/")
+class UploadSessionViaId(Resource):
+    @api.doc(description="Get a resumable upload with the byte ranges received so far")
+    @api.response(200, "Success")
+    @api.response(404, "Upload not found")
+    def get(self, upload_id):
+        try:
+            return upload_session_service.get_upload_session_status(upload_id), 200
+        except UploadSessionDoesNotExistError:
+            return {"message": "Upload not found"}, 404
+
+    @api.doc(description="Abort a resumable upload")
+    @api.response(200, "Success")
+    @api.response(404, "Upload not found")
+    def delete(self, upload_id):
+        try:
+            upload_session_service.abort_upload_session(upload_id)
+            return {"message": "Upload aborted"}, 200
+        except UploadSessionDoesNotExistError:
+            return {"message": "Upload not found"}, 404
+
+
+@api.route("/uploads/<string:upload_id>/chunk/")
+class UploadSessionChunk(Resource):
+    @api.doc(description="Send a chunk of a resumable upload as the raw request body. A chunk sent again at the "
+                         "same offset replaces the earlier one.")
+    @api.expect(FileDto.upload_chunk_arguments)
+    @api.response(200, "Success")
+    @api.response(400, "Chunk out of range or too large")
+    @api.response(404, "Upload not found")
+    @api.response(411, "Content-Length required")
+    def put(self, upload_id):
+        args = FileDto.upload_chunk_arguments.parse_args()
+        if not request.content_length:
+            return {"message": "Content-Length required"}, 411
+        try:
+            return upload_session_service.upload_chunk(upload_id, args["offset"], request.stream,
+                                                       request.content_length), 200
+        except InvalidUploadChunkError as e:
+            return {"message": str(e)}, 400
+        except UploadSessionDoesNotExistError:
+            return {"message": "Upload not found"}, 404
+
+
+@api.route("/uploads/<string:upload_id>/complete/")
+class CompleteUploadSession(Resource):
+    @api.doc(description="Store the file of a resumable upload once all its chunks are received")
+    @api.response(200, "Success")
+    @api.response(404, "Upload not found")
+    @api.response(409, "Chunks are missing or the file already exists")
+    def post(self, upload_id):
+        try:
+            return upload_session_service.complete_upload_session(upload_id), 200
+        except UploadSessionDoesNotExistError:
+            return {"message": "Upload not found"}, 404
+        except UploadIncompleteError as e:
+            return {"message": str(e)}, 409
+        except FileExistsError:
+            return {"message": "File already exists"}, 409
+
+
+@api.route("/stac_assets/preflight/")
+class PreflightStacAssets(Resource):
+    @api.doc(description="Tell which files are already stored with the same content before uploading them")
+    @api.expect(FileDto.upload_preflight, validate=True)
+    @api.response(200, "Success")
+    @api.response(400, "Too many files")
+    def post(self):
+        try:
+            return {"files": preflight_uploads(request.json["files"])}, 200
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+
+@api.route("/stac_assets/<item_id>/blobs/")
+class ListStacAssets(Resource):
+    @api.doc(description="List the blobs stored for an item, a page at a time")
+    @api.expect(FileDto.list_assets_arguments)
+    @api.response(200, "Success")
+    @api.response(400, "Invalid page size or continuation token")
+    def get(self, item_id):
+        args = FileDto.list_assets_arguments.parse_args()
+        try:
+            return list_item_assets(item_id, args["page_size"], args["continuation_token"], args["signed"]), 200
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+
 @api.route("/stac_assets/<item_id>/url/")
 class RetrieveStacAssets(Resource):
     @api.doc(description="Retrieve stac assets from the backend")
+    @api.expect(FileDto.retrieve_file_arguments)
     @api.response(200, "Success")
     @api.response(404, "Item not found")
+    @api.response(413, "File too large, use preview_bytes")
+    @api.response(415, "File is neither JSON nor XML, use preview_bytes")
     def get(self, item_id):
+        args = FileDto.retrieve_file_arguments.parse_args()
         try:
             file_url = return_file_url(item_id)
+            if args["preview_bytes"] is not None:
+                return retrieve_file_preview(file_url, args["preview_bytes"]), 200
             response = retrieve_file(file_url)
             return {"message": response}, 200
         except FileNotFoundError:
             return {"message": "File not found"}, 404
+        except FileTooLargeError as e:
+            return {"message": str(e)}, 413
+        except UnsupportedFileTypeError as e:
+            return {"message": str(e)}, 415
 
 
 @api.route("/stac_assets/upload/")
 class Upload(Resource):
     @files_api.doc(description="Upload stac assets to the azure storage blob")
     @files_api.response(200, "Success")
+    @files_api.response(207, "Some files failed to upload")
     @files_api.response(409, "Item already exists")
-    @files_api.expect(FilesDto.files_upload, validate=True)
+    @files_api.expect(FilesDto.files_upload, FilesDto.upload_arguments, validate=True)
     def post(self):
+        # only reads the query string, the concurrent upload streams the body itself
+        args = FilesDto.upload_arguments.parse_args()
+        if args["concurrent"]:
+            return self._upload_concurrently(args["itemIds"])
+
         try:
             item_ids = request.form["itemIds"].split(",")
         except KeyError:
@@ -91,9 +238,7 @@ class Upload(Resource):
 
             if item_id:
                 file = request.files[f"file[{i}]"]
-                filename = secure_filename(file.filename)
-                if item_id not in filename:
-                    filename = f"{item_id}_{filename}"
+                filename = blob_name_for_item_file(item_id, file.filename)
                 try:
                     upload_filestream_to_blob(filename, file)
                 except FileExistsError:
@@ -104,3 +249,16 @@ class Upload(Resource):
                     return {"message": "Error uploading file"}, 400
 
         return {"message": "Success"}, 200
+
+    @staticmethod
+    def _upload_concurrently(item_ids: str or None):
+        boundary = request.mimetype_params.get("boundary")
+        if request.mimetype != "multipart/form-data" or not boundary:
+            return {"message": "Expected a multipart/form-data body"}, 400
+        try:
+            results = upload_multipart_stream(request.stream, boundary, item_ids.split(",") if item_ids else None)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if any(result["status"] == "failed" for result in results):
+            return {"message": "Error uploading file", "files": results}, 207
+        return {"message": "Success", "files": results}, 200
@@ -6,6 +6,7 @@ from flask_restx import Resource
 from ..custom_exceptions import *
 from ..service import private_catalog_service
 from ..service import stac_service
+from ..util import cql2
 from ..util.dto import PrivateCatalogDto
 
 api = PrivateCatalogDto.api
@@ -13,14 +14,29 @@ collections = PrivateCatalogDto.collection
 
 
 @api.route("/collections/search/")
-@api.expect(PrivateCatalogDto.collection_search, validate=True)
+@api.expect(PrivateCatalogDto.collection_search, PrivateCatalogDto.collection_list_arguments, validate=True)
 class Collections(Resource):
     @api.doc(description='Search for collections in all catalogs')
     @api.response(200, 'Success')
+    @api.response(400, 'Validation Error - Invalid datetime or filter')
     def post(self):
-        spatial_extent: list[float] = request.json['bbox']
-        temporal_extent: str = request.json['datetime']
-        return (private_catalog_service.search_collections(spatial_extent, temporal_extent)), 200
+        spatial_extent: list[float] = request.json.get('bbox')
+        temporal_extent: str = request.json.get('datetime')
+        query: str = request.json.get('q')
+        args = PrivateCatalogDto.collection_list_arguments.parse_args()
+        try:
+            filter_expression = cql2.parse_filter(request.json.get('filter'), request.json.get('filter-lang'))
+            return (private_catalog_service.search_collections(spatial_extent, temporal_extent, q=query,
+                                                               simplified_footprint=args["simplified_footprint"],
+                                                               filter_expression=filter_expression)), 200
+        except ConvertingTimestampError:
+            return {
+                       "message": "Datetime must be an interval of two timestamps separated by a /",
+                   }, 400
+        except InvalidFilterError as e:
+            return {
+                       "message": str(e),
+                   }, 400
 
 
 @api.route("/collections/")
@@ -59,8 +75,11 @@ class CollectionsList(Resource):
                        "message": f"Error converting timestamp: {e}",
                    }, 400
 
+    @api.doc(description="List all private collections")
+    @api.expect(PrivateCatalogDto.collection_list_arguments)
     def get(self):
-        return private_catalog_service.get_all_collections(), 200
+        args = PrivateCatalogDto.collection_list_arguments.parse_args()
+        return private_catalog_service.get_all_collections(args["simplified_footprint"]), 200
 
 
 @api.route("/collections/<collection_id>/")
@@ -3,6 +3,7 @@ from flask_restx import Resource
 
 from ..custom_exceptions import *
 from ..service import public_catalogs_service
+from ..util import cql2
 from ..util.dto import PublicCatalogsDto
 
 api = PublicCatalogsDto.api
@@ -61,20 +62,37 @@ class PublicCatalogsUpdate(Resource):
 class PublicCatalogsCollections(Resource):
     @api.doc("Get all public collections stored in the database")
     @api.response(200, 'Success')
+    @api.expect(PublicCatalogsDto.collection_list_arguments)
     def get(self):
-        return public_catalogs_service.get_all_stored_public_collections_as_list_of_dict()
+        args = PublicCatalogsDto.collection_list_arguments.parse_args()
+        return public_catalogs_service.get_all_stored_public_collections_as_list_of_dict(
+            args["simplified_footprint"])
 
 
 @api.route("/collections/search/")
 class PublicCatalogsCollections(Resource):
     @api.doc(description='Get all collections of all public catalogs')
     @api.response(200, 'Success')
-    @api.expect(PublicCatalogsDto.collection_search, validate=True)
+    @api.expect(PublicCatalogsDto.collection_search, PublicCatalogsDto.collection_list_arguments, validate=True)
+    @api.response(400, 'Validation Error - Invalid datetime or filter')
     def post(self):
-        spatial_extent: list[float] = request.json['bbox']
-        temporal_extent: str = request.json['datetime']
-        return (public_catalogs_service.search_collections(spatial_extent, temporal_extent,
-                                                           )), 200
+        spatial_extent: list[float] = request.json.get('bbox')
+        temporal_extent: str = request.json.get('datetime')
+        query: str = request.json.get('q')
+        args = PublicCatalogsDto.collection_list_arguments.parse_args()
+        try:
+            filter_expression = cql2.parse_filter(request.json.get('filter'), request.json.get('filter-lang'))
+            return (public_catalogs_service.search_collections(spatial_extent, temporal_extent, q=query,
+                                                               simplified_footprint=args["simplified_footprint"],
+                                                               filter_expression=filter_expression)), 200
+        except ConvertingTimestampError:
+            return {
+                       'message': 'Datetime must be an interval of two timestamps separated by a /',
+                   }, 400
+        except InvalidFilterError as e:
+            return {
+                       'message': str(e),
+                   }, 400
 
 
 @api.route("/<int:public_catalog_id>/collections/search/")
@@ -82,17 +100,31 @@ class SpecificPublicCatalogCollections(Resource):
     @api.doc(description="Get all collections for specified public catalog")
     @api.response(200, "Success")
     @api.response(404, "Not Found - Catalog does not exist")
-    @api.expect(PublicCatalogsDto.collection_search, validate=True)
+    @api.expect(PublicCatalogsDto.collection_search, PublicCatalogsDto.collection_list_arguments, validate=True)
+    @api.response(400, 'Validation Error - Invalid datetime or filter')
     def post(self, public_catalog_id):
-        spatial_extent: list[float] = request.json['bbox']
-        temporal_extent: str = request.json['datetime']
+        spatial_extent: list[float] = request.json.get('bbox')
+        temporal_extent: str = request.json.get('datetime')
+        query: str = request.json.get('q')
+        args = PublicCatalogsDto.collection_list_arguments.parse_args()
         try:
+            filter_expression = cql2.parse_filter(request.json.get('filter'), request.json.get('filter-lang'))
             return (public_catalogs_service.search_collections(spatial_extent, temporal_extent,
-                                                               public_catalog_id)), 200
+                                                               public_catalog_id, q=query,
+                                                               simplified_footprint=args["simplified_footprint"],
+                                                               filter_expression=filter_expression)), 200
         except CatalogDoesNotExistError:
             return {
                        'message': 'Catalog with this id does not exist',
                    }, 404
+        except ConvertingTimestampError:
+            return {
+                       'message': 'Datetime must be an interval of two timestamps separated by a /',
+                   }, 400
+        except InvalidFilterError as e:
+            return {
+                       'message': str(e),
+                   }, 400
 
 
 @api.route("/<int:public_catalog_id>/load_history/")
@@ -114,9 +146,12 @@ class PublicCatalogCollections(Resource):
     @api.doc(description="Get all collections for specified public catalog")
     @api.response(200, "Success")
     @api.response(404, "Not Found - Catalog does not exist")
+    @api.expect(PublicCatalogsDto.collection_list_arguments)
     def get(self, public_catalog_id):
+        args = PublicCatalogsDto.collection_list_arguments.parse_args()
         try:
-            return public_catalogs_service.get_collections_from_public_catalog_id(public_catalog_id), 200
+            return public_catalogs_service.get_collections_from_public_catalog_id(
+                public_catalog_id, args["simplified_footprint"]), 200
         except PublicCatalogDoesNotExistError:
             return {
                        'message': 'Catalog with this id does not exist',
@@ -194,9 +229,11 @@ class UpdateAllStacRecords(Resource):
 
     @api.doc(
         description='Update all stored stac records from all public catalogs')
+    @api.expect(PublicCatalogsDto.update_arguments)
     def get(self):
+        args = PublicCatalogsDto.update_arguments.parse_args()
         try:
-            result = public_catalogs_service.update_all_stac_records()
+            result = public_catalogs_service.update_all_stac_records(args["full_refresh"])
             response = []
             for i in result:
                 response.append({
@@ -216,10 +253,12 @@ class UpdateStacRecordsSpecifyingPublicCatalogId(Resource):
     @api.doc(description="""Get all stac records from a public catalog.""")
     @api.response(200, 'Success')
     @api.response(404, 'Public catalog not found')
+    @api.expect(PublicCatalogsDto.update_arguments)
     def get(self, public_catalog_id):
+        args = PublicCatalogsDto.update_arguments.parse_args()
         try:
             return public_catalogs_service.update_specific_collections_via_catalog_id(
-                public_catalog_id)
+                public_catalog_id, full_refresh=args["full_refresh"])
         except CatalogDoesNotExistError:
             return {'message': 'Public catalog not found'}, 404
         except ConnectionError:
@@ -230,14 +269,15 @@ class UpdateStacRecordsSpecifyingPublicCatalogId(Resource):
 
     @api.doc(description="""Update specific collections from catalog.""")
     @api.expect(
-        PublicCatalogsDto.update_stac_collections_specify_collection_ids,
+        PublicCatalogsDto.update_stac_collections_specify_collection_ids, PublicCatalogsDto.update_arguments,
         validate=True)
     @api.response(200, 'Success')
     def post(self, public_catalog_id):
         collections_to_update = request.json['collections']
+        args = PublicCatalogsDto.update_arguments.parse_args()
         try:
             result = public_catalogs_service.update_specific_collections_via_catalog_id(
-                public_catalog_id, collections_to_update)
+                public_catalog_id, collections_to_update, args["full_refresh"])
             response = []
             for i in result:
                 response.append({
@@ -258,11 +298,52 @@ class UpdateStacRecordsSpecifyingPublicCatalogId(Resource):
 @api.route('/run_search_parameters/<int:parameter_id>/')
 class RunSearchParameters(Resource):
     @api.doc(description="Run search parameters for specified public catalog")
-    @api.response(200, "Success")
+    @api.response(200, "Work session id, or a message when nothing was ingestible since the last successful run")
+    @api.response(400, "Search parameters can not be ingested")
+    @api.response(404, "Search param with this id does not exist")
+    @api.expect(PublicCatalogsDto.update_arguments)
     def get(self, parameter_id):
+        args = PublicCatalogsDto.update_arguments.parse_args()
         try:
-            return public_catalogs_service.run_search_parameters(parameter_id), 200
+            return public_catalogs_service.run_search_parameters(parameter_id, args["full_refresh"]), 200
+        except IncrementalWindowEmptyError:
+            return {
+                       'message': 'Nothing to ingest since the last successful run',
+                   }, 200
         except StoredSearchParametersDoesNotExistError:
             return {
                        'message': 'Search param with this id does not exist',
                    }, 404
+        except ValueError as e:
+            return {
+                       'message': str(e),
+                   }, 400
+
+
+@api.route('/<int:public_catalog_id>/refresh_interval/')
+class PublicCatalogRefreshInterval(Resource):
+    @api.doc(description="Set how often the stored search parameters of a public catalog are refreshed by the "
+                         "scheduler, unless they have their own interval")
+    @api.expect(PublicCatalogsDto.refresh_interval, validate=True)
+    @api.response(200, 'Success')
+    @api.response(404, 'Public catalog not found')
+    def put(self, public_catalog_id):
+        try:
+            return public_catalogs_service.set_public_catalog_refresh_interval(
+                public_catalog_id, request.json['refresh_interval_seconds']), 200
+        except PublicCatalogDoesNotExistError:
+            return {'message': 'Public catalog not found'}, 404
+
+
+@api.route('/stored_search_parameters/<int:parameter_id>/refresh_interval/')
+class StoredSearchParametersRefreshInterval(Resource):
+    @api.doc(description="Set how often stored search parameters are refreshed by the scheduler")
+    @api.expect(PublicCatalogsDto.stored_search_parameters_refresh_interval, validate=True)
+    @api.response(200, 'Success')
+    @api.response(404, 'Search param with this id does not exist')
+    def put(self, parameter_id):
+        try:
+            return public_catalogs_service.set_stored_search_parameters_refresh_interval(
+                parameter_id, request.json.get('refresh_interval_seconds')), 200
+        except StoredSearchParametersDoesNotExistError:
+            return {'message': 'Search param with this id does not exist'}, 404
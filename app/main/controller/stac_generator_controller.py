@@ -3,6 +3,8 @@ import logging
 from flask import request
 from flask_restx import Resource
 
+from ..custom_exceptions import PipelineJobDoesNotExistError
+from ..service import pipeline_job_service
 from ..service.stac_generator_service import create_STAC_Item
 from ..util.dto import StacGeneratorDto
 
@@ -24,3 +26,27 @@ class StacGenerator(Resource):
             logging.error(e)
 
         return None
+
+
+@api.route("/pipeline/")
+class StacPipeline(Resource):
+    @api.doc(description="Queue the completion of uploads and the generation, validation and publication of the "
+                         "STAC item made from them")
+    @api.expect(StacGeneratorDto.pipeline, validate=True)
+    @api.response(202, "Job queued")
+    def post(self):
+        data = request.json
+        job_id = pipeline_job_service.enqueue_pipeline_job(data["collection_id"], data["manifest"], data["metadata"])
+        return {"job_id": job_id}, 202
+
+
+@api.route("/pipeline/<int:job_id>/")
+class StacPipelineJob(Resource):
+    @api.doc(description="Get the state and the per-stage timings of a pipeline job")
+    @api.response(200, "Success")
+    @api.response(404, "Job not found")
+    def get(self, job_id):
+        try:
+            return pipeline_job_service.get_pipeline_job(job_id), 200
+        except PipelineJobDoesNotExistError:
+            return {"message": "Job not found"}, 404
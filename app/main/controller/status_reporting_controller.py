@@ -1,6 +1,10 @@
+import datetime
+
 import sqlalchemy
+from flask import Response, request, stream_with_context
 from flask_restx import Resource
 
+from ..service import ingestion_job_service
 from ..service import status_reporting_service
 from ..util.dto import StatusReportingDto
 
@@ -9,9 +13,21 @@ api = StatusReportingDto.api
 
 @api.route('/loading_public_stac_records/')
 class StacIngestionStatus(Resource):
-    @api.doc(description='Get all statuses of stac ingestion statuses')
+    @api.doc(description='Get a page of stac ingestion statuses, newest first. The number of statuses matching '
+                         'the filters is returned in the X-Total-Count header.')
+    @api.expect(StatusReportingDto.stac_ingestion_status_list_arguments)
     def get(self):
-        return status_reporting_service.get_all_stac_ingestion_statuses()
+        args = StatusReportingDto.stac_ingestion_status_list_arguments.parse_args()
+        statuses, total = status_reporting_service.get_stac_ingestion_statuses(
+            args['public_catalog_id'], args['state'], _as_naive_utc(args['started_after']),
+            _as_naive_utc(args['started_before']), args['limit'], args['offset'])
+        return statuses, 200, {'X-Total-Count': str(total)}
+
+
+def _as_naive_utc(value: datetime.datetime or None) -> datetime.datetime or None:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
 
 
 @api.route('/loading_public_stac_records/<string:status_id>/')
@@ -32,3 +48,56 @@ class StacIngestionStatusViaId(Resource):
                 status_id), 200
         except sqlalchemy.orm.exc.UnmappedInstanceError:
             return {'message': 'No result found to delete'}, 404
+
+
+@api.route('/loading_public_stac_records/<int:status_id>/progress/')
+class StacIngestionStatusProgress(Resource):
+    @api.doc(description='Report partial progress of a running ingestion, called by the ingester')
+    @api.expect(StatusReportingDto.stac_ingestion_progress, validate=True)
+    @api.response(200, 'Success')
+    @api.response(404, 'No result found')
+    def post(self, status_id):
+        try:
+            return status_reporting_service.report_stac_ingestion_progress(
+                status_id, request.json['items_done'], request.json.get('items_per_second'),
+                request.json.get('current_collection')), 200
+        except AttributeError:
+            return {'message': 'No result found'}, 404
+
+
+@api.route('/loading_public_stac_records/<int:status_id>/events/')
+class StacIngestionStatusEvents(Resource):
+    @api.doc(description='Stream a stac ingestion status as server-sent events, pushed whenever it changes, '
+                         'until the ingestion finished')
+    @api.produces(['text/event-stream'])
+    def get(self, status_id):
+        return Response(stream_with_context(status_reporting_service.stream_stac_ingestion_status(status_id)),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@api.route('/analytics/')
+class IngestionAnalytics(Resource):
+    @api.doc(description='Throughput, duration percentiles, failure rates and slowest collections of ingestions '
+                         'per source catalog, over a window of ingestion start times')
+    @api.expect(StatusReportingDto.ingestion_analytics_arguments)
+    def get(self):
+        args = StatusReportingDto.ingestion_analytics_arguments.parse_args()
+        until = _as_naive_utc(args['until']) or datetime.datetime.utcnow()
+        since = _as_naive_utc(args['since']) or until - datetime.timedelta(days=30)
+        return status_reporting_service.get_ingestion_analytics(since, until, args['public_catalog_id'],
+                                                                args['slowest_collections']), 200
+
+
+@api.route('/ingestion_queue/')
+class IngestionQueueStatistics(Resource):
+    @api.doc(description='Get the depth and wait times of the ingestion queue per lane')
+    def get(self):
+        return ingestion_job_service.get_queue_statistics(), 200
+
+
+@api.route('/search_cache/')
+class SearchCacheStatistics(Resource):
+    @api.doc(description='Get hit/miss statistics of the collection search cache of the worker serving the request')
+    def get(self):
+        return status_reporting_service.get_search_cache_statistics(), 200
@@ -64,3 +64,43 @@ class PrivateItemAlreadyExistsError(ItemAlreadyExistsError):
 
 class ItemDoesNotExistError(Error):
     pass
+
+
+class InvalidFilterError(Error):
+    pass
+
+
+class InvalidSasTokenRequestError(Error):
+    pass
+
+
+class UploadSessionDoesNotExistError(Error):
+    pass
+
+
+class UploadSessionAlreadyExistsError(Error):
+    pass
+
+
+class InvalidUploadChunkError(Error):
+    pass
+
+
+class UploadIncompleteError(Error):
+    pass
+
+
+class FileTooLargeError(Error):
+    pass
+
+
+class UnsupportedFileTypeError(Error):
+    pass
+
+
+class PipelineJobDoesNotExistError(Error):
+    pass
+
+
+class IncrementalWindowEmptyError(Error):
+    pass
@@ -1,8 +1,25 @@
+import datetime
+from typing import Dict, List
+
 import shapely
 from geoalchemy2 import Geometry
-from geoalchemy2.shape import to_shape
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import MultiPolygon, box
+from shapely.ops import unary_union
+from sqlalchemy import Computed, Integer, and_, cast, null, or_, true
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 from .. import db
+from ..util.cql2 import Queryable
+
+SEARCH_VECTOR_LANGUAGE = "english"
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(id, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+# Tolerance in degrees used to simplify the footprint returned by light responses
+SIMPLIFIED_FOOTPRINT_TOLERANCE = 0.01
 
 
 class Collection(db.Model):
@@ -16,15 +33,86 @@ class Collection(db.Model):
     temporal_extent_start = db.Column(db.DateTime, nullable=True, default=None)
     temporal_extent_end = db.Column(db.DateTime, nullable=True, default=None)
     spatial_extent = db.Column(Geometry(geometry_type="MULTIPOLYGON"), nullable=True, default=None)
+    spatial_extent_envelope = db.Column(Geometry(geometry_type="GEOMETRY"), nullable=True, default=None)
+    spatial_extent_simplified = db.Column(Geometry(geometry_type="GEOMETRY"), nullable=True, default=None)
+    search_vector = db.Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True))
+
+    _columns_not_in_dict = ("_id", "spatial_extent", "spatial_extent_envelope", "spatial_extent_simplified",
+                            "search_vector")
+
+    def set_spatial_extent(self, bboxes: List[List[float]]) -> None:
+        """
+        Set the spatial extent from a list of bboxes, together with its envelope and simplified footprint.
+
+        :param bboxes: List of bboxes as in the extent of a STAC collection
+        """
+        multi_polygon = MultiPolygon([box(*bbox) for bbox in bboxes])
+        self.spatial_extent = from_shape(multi_polygon, srid=4326)
+        self.spatial_extent_envelope = from_shape(multi_polygon.envelope, srid=4326)
+        simplified_footprint = unary_union(multi_polygon).simplify(SIMPLIFIED_FOOTPRINT_TOLERANCE,
+                                                                   preserve_topology=True)
+        self.spatial_extent_simplified = from_shape(simplified_footprint, srid=4326)
+
+    @classmethod
+    def spatial_extent_intersects(cls, geometry_ewkt: str):
+        """
+        Filter for collections whose spatial extent intersects a geometry.
+
+        Prefilters on the envelope and only tests the exact spatial extent when the envelope is not covered by
+        the geometry.
+
+        :param geometry_ewkt: Geometry as EWKT
+        """
+        return and_(cls.spatial_extent_envelope.ST_Intersects(geometry_ewkt),
+                    or_(cls.spatial_extent_envelope.ST_CoveredBy(geometry_ewkt),
+                        cls.spatial_extent.ST_Intersects(geometry_ewkt)))
+
+    @classmethod
+    def temporal_extent_overlaps(cls, time_start: datetime.datetime or None, time_end: datetime.datetime or None):
+        """
+        Filter for collections whose temporal extent overlaps an interval.
+
+        Missing bounds on either side are treated as open ended.
+
+        :param time_start: Start of the interval, None for an open start
+        :param time_end: End of the interval, None for an open end
+        """
+        conditions = []
+        if time_end:
+            conditions.append(or_(cls.temporal_extent_start <= time_end, cls.temporal_extent_start == None))
+        if time_start:
+            conditions.append(or_(cls.temporal_extent_end >= time_start, cls.temporal_extent_end == None))
+        return and_(true(), *conditions)
+
+    @classmethod
+    def queryables(cls) -> Dict[str, Queryable]:
+        """
+        Properties that CQL2 filters on collections may reference.
+        """
+        return {
+            "id": Queryable("string", cls.id, "Collection id"),
+            "title": Queryable("string", cls.title, "Collection title"),
+            "description": Queryable("string", cls.description, "Collection description"),
+            "type": Queryable("string", cls.type, "Collection type"),
+            "catalog": Queryable("integer", cast(null(), Integer),
+                                 "Id of the public catalog the collection was loaded from"),
+            "datetime": Queryable("interval", (cls.temporal_extent_start, cls.temporal_extent_end),
+                                  "Temporal extent of the collection, missing bounds are open ended"),
+            "start_datetime": Queryable("timestamp", cls.temporal_extent_start, "Start of the temporal extent"),
+            "end_datetime": Queryable("timestamp", cls.temporal_extent_end, "End of the temporal extent"),
+            "geometry": Queryable("geometry", cls.spatial_extent, "Spatial extent of the collection",
+                                  intersects=cls.spatial_extent_intersects),
+        }
 
-    def as_dict(self):
+    def as_dict(self, simplified_footprint: bool = False):
         data = {
             c.name: str(getattr(self, c.name))
-            for c in self.__table__.columns
+            for c in self.__table__.columns if c.name not in self._columns_not_in_dict
         }
-        data.pop("_id")
-        data.pop("spatial_extent")
-        shape: shapely.geometry.polygon.Polygon = to_shape(self.spatial_extent)
+        if simplified_footprint and self.spatial_extent_simplified is not None:
+            shape: shapely.geometry.base.BaseGeometry = to_shape(self.spatial_extent_simplified)
+        else:
+            shape: shapely.geometry.polygon.Polygon = to_shape(self.spatial_extent)
         data["spatial_extent_wkt"] = shape.wkt
 
         return data
@@ -0,0 +1,52 @@
+import datetime
+import json
+
+from .. import db
+
+JOB_STATE_QUEUED = "queued"
+JOB_STATE_RUNNING = "running"
+JOB_STATE_SUCCEEDED = "succeeded"
+JOB_STATE_FAILED = "failed"
+ACTIVE_JOB_STATES = (JOB_STATE_QUEUED, JOB_STATE_RUNNING)
+# loads requested by a user, dispatched before and with capacity reserved from bulk refreshes
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+
+class IngestionJob(db.Model):
+    """
+    Ingestion request waiting for, or being run by, the ingestion dispatcher.
+    """
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (
+        db.Index("ix_ingestion_jobs_state_next_attempt_at", "state", "next_attempt_at"),
+        # at most one queued or running job per set of parameters
+        db.Index("ix_ingestion_jobs_active_parameters_hash", "parameters_hash", unique=True,
+                 postgresql_where=db.text("state IN ('queued', 'running')")),
+    )
+    id: int = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    stac_ingestion_status_id: int = db.Column(db.Integer,
+                                              db.ForeignKey('stac_ingestion_status.id', ondelete='CASCADE'),
+                                              nullable=False, unique=True)
+    source_stac_api_url: str = db.Column(db.Text, nullable=False, index=True)
+    parameters: str = db.Column(db.Text, nullable=False)
+    parameters_hash: str = db.Column(db.Text, nullable=True)
+    state: str = db.Column(db.Text, nullable=False, default=JOB_STATE_QUEUED)
+    lane: str = db.Column(db.Text, nullable=False, default=LANE_BULK, server_default=LANE_BULK)
+    attempts: int = db.Column(db.Integer, nullable=False, default=0)
+    time_created: datetime.datetime = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    next_attempt_at: datetime.datetime = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    # time the last attempt was claimed by a dispatcher
+    started_at: datetime.datetime = db.Column(db.DateTime, nullable=True)
+    lease_expires_at: datetime.datetime = db.Column(db.DateTime, nullable=True)
+    worker: str = db.Column(db.Text, nullable=True)
+    last_error: str = db.Column(db.Text, nullable=True)
+
+    def as_dict(self):
+        data = {
+            c.name: str(getattr(self, c.name))
+            for c in self.__table__.columns if c.name != "parameters"
+        }
+        data["parameters"] = json.loads(self.parameters)
+        return data
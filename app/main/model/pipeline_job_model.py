@@ -0,0 +1,65 @@
+import datetime
+import json
+
+from .. import db
+from .ingestion_job_model import JOB_STATE_QUEUED
+
+STAGE_COMMIT = "commit"
+STAGE_GENERATE = "generate"
+STAGE_VALIDATE = "validate"
+STAGE_PUBLISH = "publish"
+PIPELINE_STAGES = (STAGE_COMMIT, STAGE_GENERATE, STAGE_VALIDATE, STAGE_PUBLISH)
+
+
+class PipelineJob(db.Model):
+    """
+    Upload-then-generate request, run in the background by the pipeline worker.
+
+    A job commits the uploads of its manifest, generates and validates the STAC item from its metadata and publishes
+    it to WRITE_STAC_API_SERVER. Stages that finished are recorded with their duration in stage_timings, so an
+    attempt that is retried continues with the first unfinished stage.
+    """
+    __tablename__ = "pipeline_jobs"
+    __table_args__ = (
+        db.Index("ix_pipeline_jobs_state_next_attempt_at", "state", "next_attempt_at"),
+    )
+    id: int = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    collection_id: str = db.Column(db.Text, nullable=False)
+    # JSON with the upload_ids of resumable uploads to complete and the blob_names of uploads that are stored already
+    manifest: str = db.Column(db.Text, nullable=False)
+    # JSON of the metadata the item is generated from, as posted to /stac_generator/
+    item_metadata: str = db.Column(db.Text, nullable=False)
+    state: str = db.Column(db.Text, nullable=False, default=JOB_STATE_QUEUED)
+    current_stage: str = db.Column(db.Text, nullable=True)
+    # JSON of the seconds taken by every finished stage
+    stage_timings: str = db.Column(db.Text, nullable=False, default="{}")
+    # JSON of the upload_ids of the manifest that were completed, as a completed upload can not be completed again
+    committed_upload_ids: str = db.Column(db.Text, nullable=False, default="[]")
+    # JSON of the generated item
+    item: str = db.Column(db.Text, nullable=True)
+    item_id: str = db.Column(db.Text, nullable=True)
+    attempts: int = db.Column(db.Integer, nullable=False, default=0)
+    time_created: datetime.datetime = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    next_attempt_at: datetime.datetime = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at: datetime.datetime = db.Column(db.DateTime, nullable=True)
+    time_finished: datetime.datetime = db.Column(db.DateTime, nullable=True)
+    lease_expires_at: datetime.datetime = db.Column(db.DateTime, nullable=True)
+    worker: str = db.Column(db.Text, nullable=True)
+    last_error: str = db.Column(db.Text, nullable=True)
+
+    def as_dict(self):
+        return {
+            "job_id": self.id,
+            "collection_id": self.collection_id,
+            "item_id": self.item_id,
+            "state": self.state,
+            "current_stage": self.current_stage,
+            "stage_timings": json.loads(self.stage_timings),
+            "manifest": json.loads(self.manifest),
+            "committed_upload_ids": json.loads(self.committed_upload_ids),
+            "attempts": self.attempts,
+            "time_created": str(self.time_created),
+            "started_at": str(self.started_at) if self.started_at else None,
+            "time_finished": str(self.time_finished) if self.time_finished else None,
+            "last_error": self.last_error,
+        }
@@ -8,3 +8,6 @@ class PrivateCollection(Collection):
         'polymorphic_identity': 'PrivateCollection',
     }
     id: str = db.Column(db.Text, nullable=False)
+    __table_args__ = (db.Index('ix_private_collections_search_vector', 'search_vector', postgresql_using='gin'),
+                      db.Index('ix_private_collections_spatial_extent_envelope', 'spatial_extent_envelope',
+                               postgresql_using='gist'))
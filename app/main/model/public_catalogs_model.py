@@ -1,8 +1,14 @@
 import datetime
 import json
+from typing import Dict, List
+
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from .. import db
 from ..model.collection_model import Collection
+from ..model.status_reporting_model import COLLECTION_RESULT_NEWLY_STORED, COLLECTION_RESULT_UPDATED
+from ..util.cql2 import Queryable
+from ..util.parameters_hash import hash_parameters
 
 
 class PublicCatalog(db.Model):
@@ -14,6 +20,8 @@ class PublicCatalog(db.Model):
     added_on: datetime.datetime = db.Column(db.DateTime,
                                             nullable=False,
                                             default=datetime.datetime.utcnow)
+    # default refresh interval of the stored search parameters of the catalog, None to not refresh periodically
+    refresh_interval_seconds: int = db.Column(db.Integer, nullable=True)
     stored_search_parameters = db.relationship("StoredSearchParameters", backref="public_catalogs", lazy="dynamic",
                                                cascade="all, delete-orphan")
     stored_ingestion_statuses = db.relationship("StacIngestionStatus", backref="public_catalogs", lazy="dynamic",
@@ -43,28 +51,79 @@ class PublicCollection(Collection):
         'polymorphic_identity': 'PublicCollection',
     }
     parent_catalog = db.Column(db.Integer, db.ForeignKey("public_catalogs.id", ondelete='CASCADE'), nullable=False)
-    __table_args__ = (db.UniqueConstraint('id', 'parent_catalog', name='_id_parent_catalog_uc'),)
+    __table_args__ = (db.UniqueConstraint('id', 'parent_catalog', name='_id_parent_catalog_uc'),
+                      db.Index('ix_public_collections_search_vector', 'search_vector', postgresql_using='gin'),
+                      db.Index('ix_public_collections_spatial_extent_envelope', 'spatial_extent_envelope',
+                               postgresql_using='gist'))
 
-    def as_dict(self):
-        data = super().as_dict()
+    @classmethod
+    def queryables(cls) -> Dict[str, Queryable]:
+        queryables = super().queryables()
+        queryables["catalog"] = Queryable("integer", cls.parent_catalog,
+                                          "Id of the public catalog the collection was loaded from")
+        return queryables
+
+    def as_dict(self, simplified_footprint: bool = False):
+        data = super().as_dict(simplified_footprint)
         data["parent_catalog"] = self.parent_catalog
         return data
 
 
 class StoredSearchParameters(db.Model):
     __tablename__ = "stored_search_parameters"
+    __table_args__ = (db.Index('ix_stored_search_parameters_collections', 'collections', postgresql_using='gin'),)
     id: int = db.Column(db.Integer, primary_key=True, autoincrement=True)
     bbox = db.Column(db.Text, nullable=True, default="[]")
     datetime = db.Column(db.Text, nullable=True, default="")
     collection = db.Column(db.Text, nullable=True, default="")
     used_search_parameters: str = db.Column(db.Text,
-                                            nullable=False,
-                                            unique=True)
+                                            nullable=False)
+    # hash of the canonical JSON of used_search_parameters, so key order does not create duplicates
+    parameters_hash: str = db.Column(db.Text, nullable=False, unique=True)
+    # collections filter of used_search_parameters, None when the whole catalog was loaded
+    collections: List[str] = db.Column(ARRAY(db.Text), nullable=True)
     associated_catalog_id: int = db.Column(db.Integer,
                                            db.ForeignKey('public_catalogs.id',
                                                          ondelete='CASCADE'),
                                            nullable=False,
                                            index=True)
+    # the status of an ingestion can be shared by several rows that were sent in one request
+    last_stac_ingestion_status_id: int = db.Column(db.Integer,
+                                                   db.ForeignKey('stac_ingestion_status.id',
+                                                                 ondelete='SET NULL'),
+                                                   nullable=True,
+                                                   index=True)
+    last_stac_ingestion_status = db.relationship("StacIngestionStatus", lazy="joined")
+    # time_started of the last ingestion of these parameters that succeeded, updates only ingest items since then
+    # not annotated, datetime is the column above within the class body
+    last_successful_run_at = db.Column(db.DateTime, nullable=True)
+    # None follows the refresh interval of the catalog, 0 disables periodic refreshes
+    refresh_interval_seconds: int = db.Column(db.Integer, nullable=True)
+    next_refresh_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def set_used_search_parameters(self, used_search_parameters: Dict[str, any]) -> None:
+        self.used_search_parameters = json.dumps(used_search_parameters)
+        self.parameters_hash = hash_parameters(used_search_parameters)
+        self.collections = used_search_parameters.get('collections')
+
+    def last_ingestion_as_dict(self) -> Dict[str, any] or None:
+        """
+        Status of the last ingestion of these parameters, narrowed down to the collection of this row.
+        """
+        status = self.last_stac_ingestion_status
+        if status is None:
+            return None
+        newly_stored_collections = status.get_collections(COLLECTION_RESULT_NEWLY_STORED)
+        updated_collections = status.get_collections(COLLECTION_RESULT_UPDATED)
+        return {
+            "status_id": status.id,
+            "state": status.state,
+            "time_started": str(status.time_started),
+            "time_finished": str(status.time_finished),
+            "error_message": status.error_message,
+            "newly_stored": self.collection in newly_stored_collections,
+            "updated": self.collection in updated_collections,
+        }
 
     def as_dict(self):
         data = {}
@@ -83,4 +142,8 @@ class StoredSearchParameters(db.Model):
             data["used_search_parameters"] = ""
         data["associated_catalog_id"] = self.associated_catalog_id
         data["id"] = self.id
+        data["last_ingestion"] = self.last_ingestion_as_dict()
+        data["last_successful_run_at"] = str(self.last_successful_run_at)
+        data["refresh_interval_seconds"] = self.refresh_interval_seconds
+        data["next_refresh_at"] = str(self.next_refresh_at)
         return data
@@ -1,13 +1,35 @@
 import datetime
+from typing import List
 
 from .. import db
 
+COLLECTION_RESULT_NEWLY_STORED = "newly_stored"
+COLLECTION_RESULT_UPDATED = "updated"
+
+
+class StacIngestionCollectionResult(db.Model):
+    """
+    Collection that an ingestion stored or updated.
+    """
+    __tablename__ = "stac_ingestion_collection_results"
+    id: int = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    stac_ingestion_status_id: int = db.Column(db.Integer,
+                                              db.ForeignKey('stac_ingestion_status.id', ondelete='CASCADE'),
+                                              nullable=False, index=True)
+    collection_id: str = db.Column(db.Text, nullable=False)
+    # newly_stored or updated
+    result: str = db.Column(db.Text, nullable=False)
+
 
 class StacIngestionStatus(db.Model):
     __tablename__ = "stac_ingestion_status"
+    __table_args__ = (
+        # ingestion analytics aggregate per source catalog over a window of time_started
+        db.Index("ix_stac_ingestion_status_source_time_started", "source_stac_api_url", "time_started"),
+    )
     id: int = db.Column(db.Integer, primary_key=True, autoincrement=True)
     time_started: datetime.datetime = db.Column(
-        db.DateTime, nullable=True, default=datetime.datetime.utcnow)
+        db.DateTime, nullable=True, default=datetime.datetime.utcnow, index=True)
     time_finished: datetime.datetime = db.Column(db.DateTime, nullable=True)
     source_stac_api_url: str = db.Column(db.Text, db.ForeignKey('public_catalogs.url', ondelete='CASCADE'), index=True)
     target_stac_api_url: str = db.Column(db.Text, nullable=True)
@@ -16,13 +38,9 @@ class StacIngestionStatus(db.Model):
     newly_stored_collections_count: int = db.Column(db.Integer,
                                                     nullable=True,
                                                     default=0)
-    newly_stored_collections: str = db.Column(db.Text,
-                                              nullable=True,
-                                              default="")
     updated_collections_count: int = db.Column(db.Integer,
                                                nullable=True,
                                                default=0)
-    updated_collections: str = db.Column(db.Text, nullable=True, default="")
     newly_stored_items_count: int = db.Column(db.Integer,
                                               nullable=True,
                                               default=0)
@@ -30,9 +48,33 @@ class StacIngestionStatus(db.Model):
     already_stored_items_count: int = db.Column(db.Integer,
                                                 nullable=True,
                                                 default=0)
+    # queued, running, retrying, succeeded or failed, mirrored from the ingestion job
+    state: str = db.Column(db.Text, nullable=True, default="queued")
+    attempts: int = db.Column(db.Integer, nullable=True, default=0)
+    # partial progress reported by the ingester while it runs
+    items_done: int = db.Column(db.Integer, nullable=True)
+    items_per_second: float = db.Column(db.Float, nullable=True)
+    current_collection: str = db.Column(db.Text, nullable=True)
+    progress_updated_at: datetime.datetime = db.Column(db.DateTime, nullable=True)
+
+    collection_results = db.relationship("StacIngestionCollectionResult", lazy="selectin",
+                                         cascade="all, delete-orphan", passive_deletes=True)
+
+    def get_collections(self, result: str) -> List[str]:
+        return [r.collection_id for r in self.collection_results if r.result == result]
+
+    def set_collections(self, result: str, collection_ids: List[str]) -> None:
+        self.collection_results = [r for r in self.collection_results if r.result != result] + [
+            StacIngestionCollectionResult(collection_id=collection_id, result=result)
+            for collection_id in collection_ids
+        ]
 
     def as_dict(self):
-        return {
+        data = {
             c.name: str(getattr(self, c.name))
             for c in self.__table__.columns
         }
+        # the collection lists used to be comma separated columns
+        data["newly_stored_collections"] = ",".join(self.get_collections(COLLECTION_RESULT_NEWLY_STORED))
+        data["updated_collections"] = ",".join(self.get_collections(COLLECTION_RESULT_UPDATED))
+        return data
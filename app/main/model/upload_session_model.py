@@ -0,0 +1,31 @@
+import datetime
+
+from .. import db
+
+
+class UploadSession(db.Model):
+    """
+    Resumable upload of a blob, whose chunks are staged as uncommitted blocks until the upload is completed.
+    """
+    __tablename__ = "upload_sessions"
+    id: str = db.Column(db.Text, primary_key=True)
+    item_id: str = db.Column(db.Text, nullable=False)
+    # at most one upload per blob, as the uncommitted blocks of a blob are shared by everyone uploading to it
+    blob_name: str = db.Column(db.Text, nullable=False, unique=True)
+    size: int = db.Column(db.BigInteger, nullable=False)
+    content_type: str = db.Column(db.Text, nullable=True)
+    time_created: datetime.datetime = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    # time of the last received chunk, sessions are pruned once this is older than UPLOAD_SESSION_TTL_SECONDS
+    updated_at: datetime.datetime = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow,
+                                              index=True)
+
+    def as_dict(self):
+        return {
+            "upload_id": self.id,
+            "item_id": self.item_id,
+            "blob_name": self.blob_name,
+            "size": self.size,
+            "content_type": self.content_type,
+            "time_created": str(self.time_created),
+            "updated_at": str(self.updated_at),
+        }
@@ -0,0 +1,182 @@
+from typing import Dict, List, Type
+
+import shapely
+from flask import current_app
+from sqlalchemy import Float, Integer, cast, func, literal, null, select, union_all
+
+from .. import db
+from ..model.collection_model import SEARCH_VECTOR_LANGUAGE, Collection
+from ..model.private_catalog_model import PrivateCollection
+from ..model.public_catalogs_model import PublicCollection
+from ..util import cql2
+from ..util import process_timestamp
+from ..util import search_cache
+
+MAX_SEARCH_LIMIT = 1000
+SOURCES = ((PublicCollection, "public"), (PrivateCollection, "private"))
+
+
+def search_all_collections(bbox: list[float] or None, time_interval_timestamp: str or None, q: str = None,
+                           limit: int = 100, offset: int = 0,
+                           simplified_footprint: bool = False,
+                           filter_expression: Dict[str, any] = None) -> Dict[str, any]:
+    """
+    Search public and private collections in a single query.
+
+    Both tables are filtered with the same interval overlap semantics, where missing bounds are open ended,
+    and paginated together. Results are ranked by relevance when q is given.
+
+    :param bbox: Bounding box as a list of floats, None to not filter spatially
+    :param time_interval_timestamp: Time interval string, use .. for open ranges, None to not filter temporally
+    :param q: Keywords matched against the id, title and description
+    :param limit: Maximum number of collections to return, capped at MAX_SEARCH_LIMIT
+    :param offset: Number of collections to skip
+    :param simplified_footprint: Return the simplified footprint instead of the exact spatial extent
+    :param filter_expression: CQL2-JSON filter over the queryables returned by get_queryables
+    :return: Page of collections, each with a source of either public or private, and the total match count
+    """
+    limit = max(0, min(limit, MAX_SEARCH_LIMIT))
+    offset = max(0, offset)
+    time_interval = search_cache.canonical_time_interval(time_interval_timestamp) if time_interval_timestamp else None
+    q = q.strip() if q else None
+    filter_clauses = {}
+    if filter_expression is not None:
+        filter_clauses = {source: cql2.compile_filter(filter_expression, _queryables(model, source))
+                          for model, source in SOURCES}
+    cache = search_cache.get_collection_search_cache()
+    if bbox is None:
+        cache_key = ("all", None, time_interval, q, limit, offset, simplified_footprint,
+                     cql2.canonical_filter(filter_expression))
+        return cache.get_or_set(cache_key, (), lambda: _search_all_collections(
+            time_interval_timestamp, q, limit, offset, simplified_footprint, filter_clauses))
+
+    # the collections of the snapped bbox are cached unpaginated and narrowed to the exact bbox per search
+    cell = shapely.geometry.box(
+        *search_cache.snap_bbox_to_grid(bbox, current_app.config["SEARCH_CACHE_BBOX_GRID_DEGREES"]))
+    cache_key = ("all", cell.wkt, time_interval, q, simplified_footprint, cql2.canonical_filter(filter_expression))
+    collections = search_cache.filter_by_bbox(
+        cache.get_or_set(cache_key, (), lambda: _search_all_collections_in_cell(
+            cell, time_interval_timestamp, q, simplified_footprint, filter_clauses)),
+        shapely.geometry.box(*bbox))
+    return {
+        "collections": collections[offset:offset + limit],
+        "total": len(collections),
+        "limit": limit,
+        "offset": offset,
+    }
+
+
+def _queryables(model: Type[Collection], source: str) -> Dict[str, cql2.Queryable]:
+    queryables = model.queryables()
+    queryables["source"] = cql2.Queryable("string", literal(source), "Either public or private")
+    return queryables
+
+
+def get_queryables(schema_id: str) -> Dict[str, any]:
+    """
+    Get the JSON schema of the properties that collection search filters may reference.
+
+    :param schema_id: Url the schema is served from
+    """
+    return cql2.queryables_as_json_schema(_queryables(PublicCollection, "public"), schema_id)
+
+
+def _collection_select(model: Type[Collection], source: str, filters: List, ts_query, simplified_footprint: bool,
+                       exact_spatial_extent: bool = False):
+    if simplified_footprint:
+        geometry = func.coalesce(model.spatial_extent_simplified, model.spatial_extent)
+    else:
+        geometry = model.spatial_extent
+    if ts_query is not None:
+        rank = func.ts_rank_cd(model.search_vector, ts_query)
+    else:
+        rank = literal(0.0)
+    parent_catalog = model.parent_catalog if model is PublicCollection else null()
+    columns = []
+    if exact_spatial_extent and simplified_footprint:
+        columns.append(func.ST_AsText(model.spatial_extent).label("spatial_extent_exact_wkt"))
+    return select(literal(source).label("source"),
+                  model.id.label("id"),
+                  model.type.label("type"),
+                  model.title.label("title"),
+                  model.description.label("description"),
+                  model.temporal_extent_start.label("temporal_extent_start"),
+                  model.temporal_extent_end.label("temporal_extent_end"),
+                  func.ST_AsText(geometry).label("spatial_extent_wkt"),
+                  cast(parent_catalog, Integer).label("parent_catalog"),
+                  cast(rank, Float).label("rank"),
+                  *columns).where(*filters)
+
+
+def _collections_subquery(bbox: shapely.geometry.polygon.Polygon or None, time_interval_timestamp: str or None,
+                          q: str or None, simplified_footprint: bool, filter_clauses: Dict[str, any]):
+    if time_interval_timestamp:
+        time_start, time_end = process_timestamp.process_timestamp_dual_string(time_interval_timestamp)
+    else:
+        time_start, time_end = None, None
+    ts_query = func.websearch_to_tsquery(SEARCH_VECTOR_LANGUAGE, q) if q else None
+
+    selects = []
+    for model, source in SOURCES:
+        filters = [model.temporal_extent_overlaps(time_start, time_end)]
+        if source in filter_clauses:
+            filters.append(filter_clauses[source])
+        if bbox is not None:
+            filters.append(model.spatial_extent_intersects(f"SRID=4326;{bbox.wkt}"))
+        if ts_query is not None:
+            filters.append(model.search_vector.op("@@")(ts_query))
+        selects.append(_collection_select(model, source, filters, ts_query, simplified_footprint,
+                                          exact_spatial_extent=bbox is not None))
+    return union_all(*selects).subquery()
+
+
+def _order(collections):
+    return collections.c.rank.desc(), collections.c.source, collections.c.id
+
+
+def _row_as_dict(row, q: str or None) -> Dict[str, any]:
+    data = {
+        "source": row.source,
+        "id": row.id,
+        "type": row.type,
+        "title": str(row.title),
+        "description": str(row.description),
+        "temporal_extent_start": str(row.temporal_extent_start),
+        "temporal_extent_end": str(row.temporal_extent_end),
+        "spatial_extent_wkt": row.spatial_extent_wkt,
+        "parent_catalog": row.parent_catalog,
+    }
+    if q:
+        data["rank"] = row.rank
+    return data
+
+
+def _search_all_collections(time_interval_timestamp: str or None, q: str or None, limit: int, offset: int,
+                            simplified_footprint: bool, filter_clauses: Dict[str, any]) -> Dict[str, any]:
+    collections = _collections_subquery(None, time_interval_timestamp, q, simplified_footprint, filter_clauses)
+    query = select(collections, func.count().over().label("total")).order_by(
+        *_order(collections)).limit(limit).offset(offset)
+    rows = db.session.execute(query).all()
+    if rows:
+        total = rows[0].total
+    else:
+        # the window count is not available when the page is past the last match
+        total = db.session.execute(select(func.count()).select_from(collections)).scalar()
+    return {
+        "collections": [_row_as_dict(row, q) for row in rows],
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+    }
+
+
+def _search_all_collections_in_cell(cell: shapely.geometry.polygon.Polygon, time_interval_timestamp: str or None,
+                                    q: str or None, simplified_footprint: bool,
+                                    filter_clauses: Dict[str, any]) -> List[tuple]:
+    """
+    Search all collections intersecting a grid cell, each paired with its exact spatial extent as WKT.
+    """
+    collections = _collections_subquery(cell, time_interval_timestamp, q, simplified_footprint, filter_clauses)
+    rows = db.session.execute(select(collections).order_by(*_order(collections))).all()
+    return [(row.spatial_extent_exact_wkt if simplified_footprint else row.spatial_extent_wkt, _row_as_dict(row, q))
+            for row in rows]
@@ -1,12 +1,44 @@
+import hashlib
+import itertools
+import json
 import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import unquote
 
 import azure.core.exceptions
-import requests
 import xmltodict
-from azure.storage.blob import BlobServiceClient
-from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+from azure.core import MatchConditions
+from azure.storage.blob import BlobBlock, BlobSasPermissions, ContainerSasPermissions, ContentSettings
 from flask import current_app
+from werkzeug.sansio import multipart
+from werkzeug.utils import secure_filename
+
+from ..custom_exceptions import FileTooLargeError, InvalidSasTokenRequestError, UnsupportedFileTypeError
+from ..util import search_cache
+from ..util.blob_storage import get_blob_storage
+from ..util.metadata_cache import get_metadata_cache
+
+SAS_TOKEN_LIFETIME = timedelta(hours=1)
+# Maximum number of blobs a single batch SAS request covers
+MAX_SAS_BATCH_SIZE = 1000
+# Bytes read from the request body at once when streaming uploads
+_STREAM_READ_SIZE = 256 * 1024
+# Maximum size of the itemIds field of a streamed upload
+_MAX_ITEM_IDS_FIELD_SIZE = 1024 * 1024
+_FILE_FIELD_RE = re.compile(r"file\[(\d+)\]")
+# Content types of blobs stored without a meaningful one, whose format retrieve_file tells from their content
+_UNTYPED_CONTENT_TYPES = ("", "application/octet-stream", "binary/octet-stream", "text/plain")
+# Maximum number of files a single preflight request covers
+MAX_PREFLIGHT_FILES = 1000
+# Most blobs a storage account returns per listing request
+MAX_ASSET_LISTING_PAGE_SIZE = 5000
+# Blobs listed per page when the client does not ask for a page size
+DEFAULT_ASSET_LISTING_PAGE_SIZE = 1000
+# Blob metadata key the SHA-256 of uploaded content is stored under
+SHA256_METADATA_KEY = "sha256"
 
 
 def check_blob_status():
@@ -15,125 +47,518 @@ def check_blob_status():
     :return: A tuple containing the status and the message.
     """
     try:
-        connection_string = current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-        blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string
-        )
-        blob_service_client.close()
+        get_blob_storage()
 
         return True, "Blob storage is available."
     except Exception as e:
         return False, str(e)
 
 
+def blob_name_for_item_file(item_id: str, filename: str) -> str:
+    """
+    Get the name of the blob a file of an item is stored as.
+    """
+    filename = secure_filename(filename)
+    if item_id not in filename:
+        filename = f"{item_id}_{filename}"
+    return filename
+
+
+def _content_settings(content_type: str or None, md5) -> ContentSettings:
+    return ContentSettings(content_type=content_type, content_md5=bytearray(md5.digest()))
+
+
 def upload_filestream_to_blob(filename: str, filestream) -> str:
     logging.info("Uploading file : " + filename)
-    connection_string = current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-    blob_service_client_settings = {
-        "max_single_put_size": 64 * 1024 * 1024,  # split to 4MB chunks`
-        "max_single_get_size": 64 * 1024 * 1024,  # split to 4MB chunks
-    }
-    blob_service_client = BlobServiceClient.from_connection_string(
-        connection_string, **blob_service_client_settings
-    )
-    blob_client = blob_service_client.get_blob_client(
-        container=current_app.config["AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS"],
-        blob=filename,
-    )
+    blob_client = get_blob_storage().container_client().get_blob_client(filename)
+    kwargs = {}
+    # uploaded files are spooled by werkzeug, so hashing them first costs a local read. SpooledTemporaryFile has
+    # no seekable() before Python 3.11
+    if hasattr(filestream, "seek"):
+        start = filestream.tell()
+        sha256, md5 = hashlib.sha256(), hashlib.md5()
+        for chunk in iter(lambda: filestream.read(_STREAM_READ_SIZE), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+        filestream.seek(start)
+        kwargs["metadata"] = {SHA256_METADATA_KEY: sha256.hexdigest()}
+        kwargs["content_settings"] = _content_settings(getattr(filestream, "mimetype", None) or None, md5)
     try:
-        blob_client.upload_blob(filestream, overwrite=False)
+        blob_client.upload_blob(filestream, overwrite=False, **kwargs)
+        invalidate_asset_listings()
         return "File uploaded successfully."
     except azure.core.exceptions.ResourceExistsError:
         raise FileExistsError
-    finally:
-        blob_service_client.close()
+
+
+def _preflight_file(container_client, file: dict) -> dict:
+    blob_name = blob_name_for_item_file(file["item_id"], file["filename"])
+    result = {"item_id": file["item_id"], "filename": file["filename"], "blob_name": blob_name}
+    try:
+        properties = container_client.get_blob_client(blob_name).get_blob_properties()
+    except azure.core.exceptions.ResourceNotFoundError:
+        result["status"] = "missing"
+        return result
+
+    stored_sha256 = (properties.metadata or {}).get(SHA256_METADATA_KEY)
+    stored_md5 = properties.content_settings.content_md5
+    if file.get("sha256") and stored_sha256:
+        identical = file["sha256"].lower() == stored_sha256.lower()
+    elif file.get("md5") and stored_md5:
+        identical = file["md5"].lower() == bytes(stored_md5).hex()
+    elif file.get("size") is not None and file["size"] != properties.size:
+        identical = False
+    else:
+        result["status"] = "exists"
+        return result
+    result["status"] = "identical" if identical else "different"
+    return result
+
+
+def preflight_uploads(files: list[dict]) -> list[dict]:
+    """
+    Compare files about to be uploaded with the stored blobs, so the transfer of files already stored can be skipped.
+
+    Files are compared by their SHA-256, which uploads through this API store as blob metadata, or else by their MD5,
+    or else by their size.
+
+    :param files: Files with item_id, filename and optionally sha256 or md5 as hex digests and size
+    :return: Result per file with a status of missing (upload it), identical (skip it), different (stored with
+        other content, an upload would be refused) or exists (stored, but cannot be compared)
+    """
+    if len(files) > MAX_PREFLIGHT_FILES:
+        raise ValueError(f"At most {MAX_PREFLIGHT_FILES} files are allowed")
+    container_client = get_blob_storage().container_client()
+    max_workers = max(1, min(len(files), current_app.config["AZURE_STORAGE_UPLOAD_MAX_CONCURRENCY"]))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blob-preflight") as executor:
+        return list(executor.map(lambda file: _preflight_file(container_client, file), files))
+
+
+class _StagedBlobUpload:
+    """
+    Upload of a blob whose data arrives in pieces, staged as blocks by an executor and committed at the end.
+    """
+
+    def __init__(self, blob_client, content_type: str or None, executor: ThreadPoolExecutor,
+                 in_flight: threading.Semaphore, block_size: int, result: dict):
+        self.blob_client = blob_client
+        self.content_type = content_type
+        self.executor = executor
+        self.in_flight = in_flight
+        self.block_size = block_size
+        self.result = result
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._futures = []
+        self._sha256 = hashlib.sha256()
+        self._md5 = hashlib.md5()
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.result["size"] += len(data)
+        self._sha256.update(data)
+        self._md5.update(data)
+        while len(self._buffer) >= self.block_size:
+            self._stage(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+
+    def close(self) -> Future:
+        if self._buffer:
+            self._stage(bytes(self._buffer))
+            self._buffer = bytearray()
+        self.result["sha256"] = self._sha256.hexdigest()
+        # the executor starts tasks in submission order, so the blocks are being staged before the commit waits
+        return self.executor.submit(self._commit)
+
+    def _stage(self, block: bytes) -> None:
+        # block ids of a blob must all have the same length
+        block_id = f"{len(self._block_ids):08d}"
+        self._block_ids.append(block_id)
+        # bounds the memory held by blocks that are not staged yet
+        self.in_flight.acquire()
+        future = self.executor.submit(self.blob_client.stage_block, block_id, block, length=len(block))
+        future.add_done_callback(lambda _: self.in_flight.release())
+        self._futures.append(future)
+
+    def _commit(self) -> None:
+        try:
+            for future in self._futures:
+                future.result()
+            self.blob_client.commit_block_list(
+                [BlobBlock(block_id) for block_id in self._block_ids],
+                content_settings=_content_settings(self.content_type, self._md5),
+                metadata={SHA256_METADATA_KEY: self.result["sha256"]},
+                match_condition=MatchConditions.IfMissing,
+            )
+            self.result["status"] = "uploaded"
+        except (azure.core.exceptions.ResourceExistsError, azure.core.exceptions.ResourceModifiedError):
+            self.result["status"] = "exists"
+        except Exception as e:
+            logging.error("Error uploading file " + self.result["blob_name"] + ": " + str(e))
+            self.result["status"] = "failed"
+            self.result["message"] = str(e)
+
+
+def upload_multipart_stream(stream, boundary: str, item_ids: list[str] = None) -> list[dict]:
+    """
+    Upload the files of a multipart/form-data body while it is being received.
+
+    A part named file[i] is stored like in upload_filestream_to_blob, under its filename prefixed with item_ids[i].
+    Its data is cut into blocks of AZURE_STORAGE_UPLOAD_BLOCK_SIZE that up to AZURE_STORAGE_UPLOAD_MAX_CONCURRENCY
+    threads stage while the rest of the body is read, so neither the body nor a whole file is held in memory or
+    on disk. Existing blobs are not overwritten.
+
+    :param stream: Request body
+    :param boundary: Boundary of the multipart body
+    :param item_ids: Item ids of the files, read from an itemIds field preceding the files when not given
+    :return: Result per file part, with a status of either uploaded, exists, skipped or failed
+    """
+    block_size = current_app.config["AZURE_STORAGE_UPLOAD_BLOCK_SIZE"]
+    max_concurrency = current_app.config["AZURE_STORAGE_UPLOAD_MAX_CONCURRENCY"]
+    container_client = get_blob_storage().container_client()
+    decoder = multipart.MultipartDecoder(boundary.encode())
+    in_flight = threading.BoundedSemaphore(max_concurrency)
+    results = []
+    item_ids_field = None
+    upload = None
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="blob-upload") as executor:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, multipart.NeedData):
+                decoder.receive_data(stream.read(_STREAM_READ_SIZE) or None)
+            elif isinstance(event, multipart.Field):
+                upload = None
+                if event.name == "itemIds" and item_ids is None:
+                    item_ids_field = bytearray()
+            elif isinstance(event, multipart.File):
+                item_ids_field = None
+                upload = None
+                result = {"field": event.name, "blob_name": None, "size": 0, "status": "skipped"}
+                results.append(result)
+                match = _FILE_FIELD_RE.fullmatch(event.name or "")
+                index = int(match.group(1)) if match else None
+                if index is None or item_ids is None or index >= len(item_ids) or not item_ids[index]:
+                    continue
+                filename = blob_name_for_item_file(item_ids[index], event.filename)
+                result["blob_name"] = filename
+                upload = _StagedBlobUpload(container_client.get_blob_client(filename),
+                                           event.headers.get("Content-Type"), executor, in_flight, block_size, result)
+            elif isinstance(event, multipart.Data):
+                if item_ids_field is not None:
+                    item_ids_field += event.data
+                    if len(item_ids_field) > _MAX_ITEM_IDS_FIELD_SIZE:
+                        raise ValueError("itemIds field is too large")
+                    if not event.more_data:
+                        item_ids = item_ids_field.decode().split(",")
+                        item_ids_field = None
+                elif upload is not None:
+                    upload.write(event.data)
+                    if not event.more_data:
+                        upload.close()
+                        upload = None
+            elif isinstance(event, multipart.Epilogue):
+                break
+    invalidate_asset_listings()
+    return results
 
 
 def return_file_url(filename: str):
-    connection_string = current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-    container_name = current_app.config["AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS"]
+    return get_blob_storage().blob_url(filename)
+
+
+def invalidate_asset_listings() -> None:
+    """
+    Drop the cached asset listings of this worker after blobs were stored, the ones of other workers expire after
+    BLOB_LISTING_CACHE_TTL_SECONDS.
+    """
+    search_cache.get_blob_listing_cache().bump(("blobs",))
+
 
+def _is_item_asset(blob_name: str, item_id: str) -> bool:
+    # the prefix listing of item "a" also returns the blobs of item "a2". Blob names do not record where the item
+    # id ends, so the blobs of item "a_b" or "a.b" (like "a_b_B4.tif") still pass as blobs of item "a".
+    rest = blob_name[len(item_id):]
+    return not rest or not rest[0].isalnum()
+
+
+def _list_item_assets_page(item_id: str, page_size: int, continuation_token: str or None) -> dict:
+    storage = get_blob_storage()
+    pages = storage.container_client().list_blobs(name_starts_with=item_id, results_per_page=page_size) \
+        .by_page(continuation_token=continuation_token)
     try:
-        blob_client = blob_service_client.get_blob_client(
-            container=container_name, blob=filename
-        )
-        return blob_client.url
+        page = list(next(pages, []))
+    except azure.core.exceptions.HttpResponseError as e:
+        if e.status_code == 400 and continuation_token is not None:
+            raise ValueError("Invalid continuation_token")
+        raise
+    blobs = []
+    for blob in page:
+        if not _is_item_asset(blob.name, item_id):
+            continue
+        blobs.append({
+            "blob_name": blob.name,
+            "url": storage.blob_url(blob.name),
+            "size": blob.size,
+            "content_type": blob.content_settings.content_type,
+            "etag": blob.etag,
+            "last_modified": blob.last_modified.isoformat() if blob.last_modified else None,
+        })
+    return {"blobs": blobs, "continuation_token": pages.continuation_token}
+
+
+def list_item_assets(item_id: str, page_size: int = DEFAULT_ASSET_LISTING_PAGE_SIZE, continuation_token: str = None,
+                     signed: bool = False) -> dict:
+    """
+    List the blobs stored for an item, which are the ones named after its id like in blob_name_for_item_file.
+
+    Names are matched on the item id followed by a non-alphanumeric character, so the blobs of items whose id
+    starts with this id and such a character, like "a_b" for "a", are listed as well. Files whose name contains
+    the item id elsewhere than at the start are not listed.
+
+    Blobs are listed a page at a time by the storage account. Pages are cached for BLOB_LISTING_CACHE_TTL_SECONDS,
+    uploads through this worker invalidate its cached pages right away.
+
+    :param item_id: Id of the item
+    :param page_size: Most blobs to list, pages can hold fewer blobs even when more follow
+    :param continuation_token: Token of the page to list, returned with the previous page
+    :param signed: Add read SAS tokens to the urls of the blobs, all expiring at the same time
+    :return: Blobs with their name, url, size, content type, ETag and last modification time, the
+        continuation_token of the next page, None on the last page, and with signed the expiry of the tokens
+    """
+    if not item_id:
+        raise ValueError("item_id is required")
+    if not 0 < page_size <= MAX_ASSET_LISTING_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_ASSET_LISTING_PAGE_SIZE}")
+    page = search_cache.get_blob_listing_cache().get_or_set(
+        ("blobs", item_id, page_size, continuation_token), ("blobs", item_id),
+        lambda: _list_item_assets_page(item_id, page_size, continuation_token))
+    out = {"item_id": item_id, "blobs": page["blobs"], "continuation_token": page["continuation_token"]}
+    if not signed:
+        return out
+
+    # tokens are issued per response, cached pages are shared and must not be changed
+    storage = get_blob_storage()
+    expiry = datetime.utcnow() + SAS_TOKEN_LIFETIME
+    permission = BlobSasPermissions(read=True)
+    blobs = []
+    for blob in page["blobs"]:
+        sas_token = storage.blob_sas(blob["blob_name"], permission, expiry)
+        blobs.append(dict(blob, url=f"{blob['url']}?{sas_token}"))
+    out["blobs"] = blobs
+    out["expiry"] = expiry.isoformat() + "Z"
+    return out
+
+
+def _blob_name_from_url(file_url: str) -> str:
+    # if filename begins with http, it is url, only take the filename
+    if file_url.startswith("http"):
+        return unquote(file_url.split("/")[-1])
+    return file_url
+
+
+def _declared_document_type(content_type: str or None) -> str or None:
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    if mimetype in ("application/json", "text/json") or mimetype.endswith("+json"):
+        return "json"
+    if mimetype in ("application/xml", "text/xml") or mimetype.endswith("+xml"):
+        return "xml"
+    if mimetype in _UNTYPED_CONTENT_TYPES:
+        return None
+    raise UnsupportedFileTypeError(f"Cannot parse files of type {mimetype}")
+
+
+def _document_type(content_type: str or None, head: bytes) -> str:
+    document_type = _declared_document_type(content_type)
+    if document_type is not None:
+        return document_type
+    # blobs uploaded without a content type, tell the format from the first character
+    first = head.lstrip(b"\xef\xbb\xbf \t\r\n")[:1]
+    if first in (b"{", b"["):
+        return "json"
+    if first == b"<":
+        return "xml"
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    raise UnsupportedFileTypeError(f"Cannot parse files of type {mimetype or 'unknown'}")
+
+
+def retrieve_file(file_url: str, max_bytes: int = None):
+    """
+    Download and parse a JSON or XML file.
+
+    The parser is chosen by the content type of the blob, or by its first character when it has none. Files
+    larger than max_bytes are not downloaded, XML is parsed while it is being downloaded.
+
+    Parsed files are kept in the metadata cache. A cached file is used as is for METADATA_CACHE_FRESH_SECONDS after
+    it was validated, after that a conditional request checks that its ETag is still current.
+
+    :param file_url: Url or name of the blob
+    :param max_bytes: Maximum size of the file, RETRIEVE_FILE_MAX_BYTES if None
+    :return: Parsed file
+    """
+    if max_bytes is None:
+        max_bytes = current_app.config["RETRIEVE_FILE_MAX_BYTES"]
+    blob_name = _blob_name_from_url(file_url)
+    cache = get_metadata_cache()
+    cached = cache.get(blob_name) if cache is not None else None
+    if cached is not None and cache.is_fresh(cached):
+        cache.record_hit()
+        return cached["document"]
+
+    storage = get_blob_storage()
+    blob_client = storage.container_client().get_blob_client(blob_name)
+    try:
+        if cached is not None:
+            properties = blob_client.get_blob_properties(etag=cached["etag"],
+                                                         match_condition=MatchConditions.IfModified)
+        else:
+            properties = blob_client.get_blob_properties()
     except azure.core.exceptions.ResourceNotFoundError:
-        blob_service_client.close()
         raise FileNotFoundError
-    finally:
-        blob_service_client.close()
+    except azure.core.exceptions.HttpResponseError as e:
+        if e.status_code != 304:
+            raise
+        cache.record_hit(revalidated=True)
+        cache.set(blob_name, cached["etag"], cached["document"])
+        return cached["document"]
 
+    document = _download_document(storage, blob_name, properties, max_bytes)
+    if cache is not None:
+        cache.set(blob_name, properties.etag, document)
+    return document
 
-def retrieve_file(file_url: str):
+
+def _download_document(storage, blob_name: str, properties, max_bytes: int):
+    if properties.size > max_bytes:
+        raise FileTooLargeError(f"File is larger than {max_bytes} bytes")
+    # JSON is only parsed once complete, XML and untyped files are received in small chunks to be parsed on arrival
+    streaming = _declared_document_type(properties.content_settings.content_type) != "json"
+    blob_client = storage.container_client(streaming=streaming).get_blob_client(blob_name)
     try:
-        _, file_url_with_sas_read_token = get_read_sas_token(file_url)
-        response = requests.get(file_url_with_sas_read_token)
-        response.raise_for_status()
-        try:
-            return response.json()
-        except:
-            return xmltodict.parse(response.content)
+        # the etag makes sure that all chunks come from the version whose size was checked
+        chunks = blob_client.download_blob(etag=properties.etag, match_condition=MatchConditions.IfNotModified) \
+            .chunks()
+    except azure.core.exceptions.ResourceNotFoundError:
+        raise FileNotFoundError
+    head = next(chunks, b"")
+    document_type = _document_type(properties.content_settings.content_type, head)
+    if document_type == "json":
+        return json.loads(head + b"".join(chunks))
+    return xmltodict.parse(chunk for chunk in itertools.chain([head], chunks))
+
+
+def get_metadata_cache_statistics() -> dict:
+    cache = get_metadata_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+def retrieve_file_preview(file_url: str, length: int) -> dict:
+    """
+    Download the first bytes of a file, for example to preview files too large or of a type retrieve_file does
+    not parse.
 
-    except requests.exceptions.HTTPError as http_err:
-        raise http_err
-    except Exception as err:
-        raise err
+    :param file_url: Url or name of the blob
+    :param length: Number of bytes, capped at RETRIEVE_FILE_MAX_BYTES
+    :return: Content type and size of the file and its first bytes decoded as UTF-8
+    """
+    length = max(1, min(length, current_app.config["RETRIEVE_FILE_MAX_BYTES"]))
+    blob_client = get_blob_storage().container_client().get_blob_client(_blob_name_from_url(file_url))
+    try:
+        downloader = blob_client.download_blob(offset=0, length=length)
+        data = downloader.readall()
+    except azure.core.exceptions.ResourceNotFoundError:
+        raise FileNotFoundError
+    except azure.core.exceptions.HttpResponseError as e:
+        # empty blobs have no byte range to read
+        if e.status_code != 416:
+            raise
+        return {"content_type": None, "size": 0, "preview": "", "truncated": False}
+    # properties.size is the size of the range, the size of the file is only reported in the content range
+    size = int(downloader.properties.content_range.rsplit("/", 1)[1])
+    return {
+        "content_type": downloader.properties.content_settings.content_type,
+        "size": size,
+        "preview": data.decode("utf-8", errors="replace"),
+        "truncated": size > len(data),
+    }
 
 
 def get_write_sas_token(filename: str):
-    connection_string = current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-    account_key = connection_string.split("AccountKey=")[1].split(";")[0]
-    connection_string_split = connection_string.split(";")
-    azure_params = {}
-    for param in connection_string_split:
-        param_split = param.split("=")
-        azure_params[param_split[0]] = param_split[1]
-    azure_params["AccountKey"] = account_key
-    account_name = azure_params["AccountName"]
-    account_key = azure_params["AccountKey"]
-    endpoint_suffix = azure_params["EndpointSuffix"]
-    container_name = current_app.config["AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS"]
-    blob_name = filename
-
-    sas_token = generate_blob_sas(
-        account_name=account_name,
-        account_key=account_key,
-        container_name=container_name,
-        blob_name=blob_name,
-        permission=BlobSasPermissions(write=True),
-        expiry=datetime.utcnow() + timedelta(hours=1),
-    )
-
-    blob_url = f"https://{account_name}.blob.{endpoint_suffix}/{container_name}/{blob_name}?{sas_token}"
-    return sas_token, blob_url
+    storage = get_blob_storage()
+    sas_token = storage.blob_sas(filename, BlobSasPermissions(write=True), datetime.utcnow() + SAS_TOKEN_LIFETIME)
+    return sas_token, f"{storage.blob_url(filename)}?{sas_token}"
 
 
 def get_read_sas_token(filename: str):
-    # if filename begins with http, it is url, only take the filename
-    if filename.startswith("http"):
-        filename = filename.split("/")[-1]
-
-    connection_string = current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-    account_key = connection_string.split("AccountKey=")[1].split(";")[0]
-    connection_string_split = connection_string.split(";")
-    azure_params = {}
-    for param in connection_string_split:
-        param_split = param.split("=")
-        azure_params[param_split[0]] = param_split[1]
-    azure_params["AccountKey"] = account_key
-    account_name = azure_params["AccountName"]
-    account_key = azure_params["AccountKey"]
-    endpoint_suffix = azure_params["EndpointSuffix"]
-    container_name = current_app.config["AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS"]
+    filename = _blob_name_from_url(filename)
+    storage = get_blob_storage()
     # create read sas token
-    sas_token = generate_blob_sas(
-        account_name=account_name,
-        account_key=account_key,
-        container_name=container_name,
-        blob_name=filename,
-        permission=BlobSasPermissions(read=True),
-        expiry=datetime.utcnow() + timedelta(hours=1),
-    )
-    return sas_token, f"https://{account_name}.blob.{endpoint_suffix}/{container_name}/{filename}?{sas_token}"
+    sas_token = storage.blob_sas(filename, BlobSasPermissions(read=True), datetime.utcnow() + SAS_TOKEN_LIFETIME)
+    return sas_token, f"{storage.blob_url(filename)}?{sas_token}"
+
+
+def get_sas_tokens(permission: str, blob_names: list[str] = None, prefix: str = None,
+                   container_scope: bool = False) -> dict:
+    """
+    Issue SAS tokens for many blobs at once, all expiring at the same time.
+
+    With container_scope a single token for the whole container is issued, which the caller appends to the url
+    of every blob it accesses. Otherwise one token is issued per blob name, or for read tokens per existing blob
+    starting with prefix. Storage accounts without hierarchical namespace cannot scope a token to a prefix, so
+    write tokens for blobs that do not exist yet need their names or container_scope.
+
+    :param permission: Either read or write
+    :param blob_names: Names or urls of the blobs
+    :param prefix: Prefix of the names of the blobs
+    :param container_scope: Issue a single token for the container
+    :return: Expiry and either the container token or the tokens per blob
+    """
+    if permission not in ("read", "write"):
+        raise InvalidSasTokenRequestError("permission must be either read or write")
+    if not container_scope and not blob_names and prefix is None:
+        raise InvalidSasTokenRequestError("Either blob_names, prefix or container_scope is required")
+    if blob_names and len(blob_names) > MAX_SAS_BATCH_SIZE:
+        raise InvalidSasTokenRequestError(f"At most {MAX_SAS_BATCH_SIZE} blob_names are allowed")
+
+    storage = get_blob_storage()
+    expiry = datetime.utcnow() + SAS_TOKEN_LIFETIME
+    out = {
+        "permission": permission,
+        "expiry": expiry.isoformat() + "Z",
+    }
+    if container_scope:
+        sas_token = storage.container_sas(
+            ContainerSasPermissions(read=permission == "read", list=permission == "read", write=permission == "write"),
+            expiry,
+        )
+        out["container"] = storage.default_container
+        out["sas_token"] = sas_token
+        out["endpoint"] = f"{storage.container_url()}?{sas_token}"
+        return out
+
+    truncated = False
+    if blob_names:
+        names = [_blob_name_from_url(name) for name in blob_names]
+    elif permission == "read":
+        names = []
+        for blob in storage.container_client().list_blobs(name_starts_with=prefix):
+            if len(names) == MAX_SAS_BATCH_SIZE:
+                truncated = True
+                break
+            names.append(blob.name)
+    else:
+        raise InvalidSasTokenRequestError("Write tokens for a prefix need blob_names or container_scope")
+
+    blob_permission = BlobSasPermissions(read=permission == "read", write=permission == "write")
+    tokens = []
+    for name in dict.fromkeys(names):
+        sas_token = storage.blob_sas(name, blob_permission, expiry)
+        tokens.append({
+            "blob_name": name,
+            "sas_token": sas_token,
+            "endpoint": f"{storage.blob_url(name)}?{sas_token}",
+        })
+    out["tokens"] = tokens
+    out["truncated"] = truncated
+    return out
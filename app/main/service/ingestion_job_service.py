@@ -0,0 +1,357 @@
+"""
+Durable queue of requests to the selective ingester.
+
+Ingestions are stored as rows in ingestion_jobs and run by the ingestion dispatcher (manage.py
+run_ingestion_dispatcher), which caps the number of concurrent jobs globally and per source catalog. A claimed job
+holds a lease that the dispatcher renews while the request to the ingester is open; jobs whose lease ran out,
+because their dispatcher stopped, are queued again. Failed attempts are retried with exponential backoff.
+"""
+import datetime
+import json
+import logging
+import os
+import random
+import socket
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+import sqlalchemy
+from flask import Flask, current_app
+from sqlalchemy import case, func, select
+
+from .status_reporting_service import make_stac_ingestion_status_entry, set_stac_ingestion_status_entry, \
+    set_stac_ingestion_status_state
+from .. import db
+from ..model.ingestion_job_model import IngestionJob, ACTIVE_JOB_STATES, JOB_STATE_FAILED, JOB_STATE_QUEUED, \
+    JOB_STATE_RUNNING, JOB_STATE_SUCCEEDED, LANE_BULK, LANE_INTERACTIVE, LANES
+from ..model.public_catalogs_model import StoredSearchParameters
+from ..model.status_reporting_model import StacIngestionStatus
+from ..util import status_notifications
+from ..util.parameters_hash import hash_parameters
+
+# Key of the advisory lock that serialises job claims, so caps hold across several dispatchers
+_CLAIM_LOCK_KEY = 7_134_001
+# Keys of the ingester response, in the order of the counts taken by set_stac_ingestion_status_entry
+_RESULT_KEYS = ("newly_stored_collections_count", "newly_stored_collections", "updated_collections_count",
+                "updated_collections", "newly_stored_items_count", "updated_items_count",
+                "already_stored_items_count")
+
+
+def _get_active_job_status_id(parameters_hash: str) -> int or None:
+    return db.session.query(IngestionJob.stac_ingestion_status_id).filter(
+        IngestionJob.parameters_hash == parameters_hash, IngestionJob.state.in_(ACTIVE_JOB_STATES)).scalar()
+
+
+def _promote_to_lane(parameters_hash: str, lane: str) -> None:
+    # an interactive request for parameters that are queued as a bulk refresh should not wait behind the bulk lane
+    if lane == LANE_INTERACTIVE:
+        IngestionJob.query.filter(IngestionJob.parameters_hash == parameters_hash,
+                                  IngestionJob.state == JOB_STATE_QUEUED) \
+            .update({IngestionJob.lane: LANE_INTERACTIVE}, synchronize_session=False)
+        db.session.commit()
+
+
+def enqueue_ingestion_job(parameters: Dict[str, any], lane: str = LANE_BULK) -> int:
+    """
+    Queue an ingestion for the dispatcher.
+
+    When an ingestion with the same parameters is already queued or running, no new one is queued and the
+    work session id of that ingestion is returned instead.
+
+    :param parameters: STAC Filter parameters, including source_stac_catalog_url and update
+    :param lane: LANE_INTERACTIVE for loads a user waits for, LANE_BULK for refreshes
+    :return: Work session id which can be used to check the status of the ingestion
+    """
+    parameters_hash = hash_parameters(parameters)
+    active_callback_id = _get_active_job_status_id(parameters_hash)
+    if active_callback_id is not None:
+        _promote_to_lane(parameters_hash, lane)
+        return active_callback_id
+
+    source_stac_catalog_url = parameters['source_stac_catalog_url']
+    target_stac_catalog_url = current_app.config['WRITE_STAC_API_SERVER']
+    update = parameters['update']
+    callback_id = make_stac_ingestion_status_entry(source_stac_catalog_url, target_stac_catalog_url, update)
+    parameters['callback_id'] = callback_id
+    job = IngestionJob()
+    job.stac_ingestion_status_id = callback_id
+    job.source_stac_api_url = source_stac_catalog_url
+    job.parameters = json.dumps(parameters)
+    job.parameters_hash = parameters_hash
+    job.lane = lane
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        # an identical ingestion was queued concurrently
+        db.session.rollback()
+        StacIngestionStatus.query.filter_by(id=callback_id).delete()
+        db.session.commit()
+        active_callback_id = _get_active_job_status_id(parameters_hash)
+        if active_callback_id is None:
+            raise
+        _promote_to_lane(parameters_hash, lane)
+        return active_callback_id
+    return callback_id
+
+
+def get_queue_statistics() -> Dict[str, any]:
+    """
+    Depth and wait times of the ingestion queue per lane.
+
+    :return: Queued and running jobs, the wait of queued jobs and the mean wait of jobs first started in the last
+        hour, per lane
+    """
+    now = datetime.datetime.utcnow()
+    an_hour_ago = now - datetime.timedelta(hours=1)
+    queued = IngestionJob.state == JOB_STATE_QUEUED
+    waiting = func.extract("epoch", now - IngestionJob.time_created)
+    first_started_recently = sqlalchemy.and_(IngestionJob.started_at >= an_hour_ago, IngestionJob.attempts == 1)
+    rows = db.session.query(
+        IngestionJob.lane,
+        func.count(case((queued, 1))).label("queued"),
+        func.count(case((IngestionJob.state == JOB_STATE_RUNNING, 1))).label("running"),
+        func.max(case((queued, waiting))).label("oldest_queued_wait"),
+        func.avg(case((queued, waiting))).label("mean_queued_wait"),
+        func.avg(case((first_started_recently,
+                       func.extract("epoch", IngestionJob.started_at - IngestionJob.time_created))))
+        .label("mean_wait_last_hour")
+    ).filter(sqlalchemy.or_(IngestionJob.state.in_(ACTIVE_JOB_STATES), IngestionJob.started_at >= an_hour_ago)) \
+        .group_by(IngestionJob.lane).all()
+    lanes = {lane: {"queued": 0, "running": 0, "oldest_queued_wait_seconds": None,
+                    "mean_queued_wait_seconds": None, "mean_wait_seconds_last_hour": None} for lane in LANES}
+    for row in rows:
+        lanes[row.lane] = {
+            "queued": row.queued,
+            "running": row.running,
+            "oldest_queued_wait_seconds": float(row.oldest_queued_wait) if row.oldest_queued_wait is not None
+            else None,
+            "mean_queued_wait_seconds": float(row.mean_queued_wait) if row.mean_queued_wait is not None else None,
+            "mean_wait_seconds_last_hour": float(row.mean_wait_last_hour) if row.mean_wait_last_hour is not None
+            else None,
+        }
+    return {
+        "max_concurrent_jobs": current_app.config['INGESTION_MAX_CONCURRENT_JOBS'],
+        "reserved_interactive_jobs": current_app.config['INGESTION_RESERVED_INTERACTIVE_JOBS'],
+        "lanes": lanes,
+    }
+
+
+def run_dispatcher() -> None:
+    """
+    Dispatch queued ingestion jobs until the process is stopped.
+    """
+    app: Flask = current_app._get_current_object()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    max_jobs = app.config['INGESTION_MAX_CONCURRENT_JOBS']
+    running: Dict[int, Future] = {}
+    logging.info("Ingestion dispatcher %s started", worker)
+    with ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingestion") as executor:
+        while True:
+            for job_id, future in list(running.items()):
+                if future.done():
+                    del running[job_id]
+                    if future.exception() is not None:
+                        logging.error("Ingestion job %s crashed: %s", job_id, future.exception())
+            try:
+                _renew_leases(list(running), worker)
+                for job_id in _claim_jobs(max_jobs - len(running), worker):
+                    running[job_id] = executor.submit(_run_job, app, job_id, worker)
+            except Exception as e:
+                db.session.rollback()
+                logging.error("Ingestion dispatcher error: " + str(e))
+            time.sleep(app.config['INGESTION_DISPATCHER_POLL_SECONDS'])
+
+
+def _lease_expiry() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=current_app.config['INGESTION_JOB_LEASE_SECONDS'])
+
+
+def _renew_leases(job_ids: List[int], worker: str) -> None:
+    if job_ids:
+        IngestionJob.query.filter(IngestionJob.id.in_(job_ids), IngestionJob.worker == worker,
+                                  IngestionJob.state == JOB_STATE_RUNNING) \
+            .update({IngestionJob.lease_expires_at: _lease_expiry()}, synchronize_session=False)
+    db.session.commit()
+
+
+def _claim_jobs(free_slots: int, worker: str) -> List[int]:
+    """
+    Requeue jobs with an expired lease and claim as many due jobs as the concurrency caps allow.
+
+    Interactive jobs are claimed first. Bulk jobs leave INGESTION_RESERVED_INTERACTIVE_JOBS slots free for them.
+    """
+    now = datetime.datetime.utcnow()
+    db.session.execute(select(func.pg_advisory_xact_lock(_CLAIM_LOCK_KEY)))
+    _requeue_expired_jobs(now)
+
+    running_per_catalog = {}
+    running_per_lane = {lane: 0 for lane in LANES}
+    for source_stac_api_url, lane, count in db.session.query(
+            IngestionJob.source_stac_api_url, IngestionJob.lane, func.count()) \
+            .filter(IngestionJob.state == JOB_STATE_RUNNING) \
+            .group_by(IngestionJob.source_stac_api_url, IngestionJob.lane).all():
+        running_per_catalog[source_stac_api_url] = running_per_catalog.get(source_stac_api_url, 0) + count
+        running_per_lane[lane] = running_per_lane.get(lane, 0) + count
+    max_jobs = current_app.config['INGESTION_MAX_CONCURRENT_JOBS']
+    free_slots = min(free_slots, max_jobs - sum(running_per_lane.values()))
+    free_bulk_slots = max_jobs - current_app.config['INGESTION_RESERVED_INTERACTIVE_JOBS'] - \
+        running_per_lane[LANE_BULK]
+    max_per_catalog = current_app.config['INGESTION_MAX_CONCURRENT_JOBS_PER_CATALOG']
+    if free_slots <= 0:
+        db.session.commit()
+        return []
+
+    lane_priority = case((IngestionJob.lane == LANE_INTERACTIVE, 0), else_=1)
+    position = func.row_number().over(partition_by=IngestionJob.source_stac_api_url,
+                                      order_by=(lane_priority, IngestionJob.next_attempt_at, IngestionJob.id)) \
+        .label("position")
+    due = db.session.query(IngestionJob.id, IngestionJob.source_stac_api_url, IngestionJob.lane,
+                           lane_priority.label("lane_priority"), position) \
+        .filter(IngestionJob.state == JOB_STATE_QUEUED, IngestionJob.next_attempt_at <= now).subquery()
+    candidates = db.session.query(due.c.id, due.c.source_stac_api_url, due.c.lane) \
+        .filter(due.c.position <= max_per_catalog) \
+        .order_by(due.c.lane_priority, due.c.position, due.c.id).all()
+
+    claimed = []
+    for job_id, source_stac_api_url, lane in candidates:
+        if len(claimed) == free_slots:
+            break
+        if running_per_catalog.get(source_stac_api_url, 0) >= max_per_catalog:
+            continue
+        if lane == LANE_BULK:
+            if free_bulk_slots <= 0:
+                continue
+            free_bulk_slots -= 1
+        running_per_catalog[source_stac_api_url] = running_per_catalog.get(source_stac_api_url, 0) + 1
+        claimed.append(job_id)
+    if claimed:
+        lease_expires_at = _lease_expiry()
+        jobs: List[IngestionJob] = IngestionJob.query.filter(IngestionJob.id.in_(claimed)).all()
+        statuses = {status.id: status for status in StacIngestionStatus.query.filter(
+            StacIngestionStatus.id.in_([job.stac_ingestion_status_id for job in jobs])).all()}
+        for job in jobs:
+            job.state = JOB_STATE_RUNNING
+            job.attempts += 1
+            job.worker = worker
+            job.lease_expires_at = lease_expires_at
+            job.started_at = now
+            status = statuses.get(job.stac_ingestion_status_id)
+            if status is not None:
+                status.state = JOB_STATE_RUNNING
+                status.attempts = job.attempts
+                status_notifications.notify_status_changed(status.id)
+    db.session.commit()
+    return claimed
+
+
+def _requeue_expired_jobs(now: datetime.datetime) -> None:
+    expired: List[IngestionJob] = IngestionJob.query.filter(IngestionJob.state == JOB_STATE_RUNNING,
+                                                            IngestionJob.lease_expires_at < now).all()
+    for job in expired:
+        logging.warning("Lease of ingestion job %s held by %s expired", job.id, job.worker)
+        error_message = str({"error": "Ingestion dispatcher stopped while the job was running"})
+        if job.attempts >= current_app.config['INGESTION_MAX_ATTEMPTS']:
+            job.state = JOB_STATE_FAILED
+            status_state = JOB_STATE_FAILED
+        else:
+            job.state = JOB_STATE_QUEUED
+            job.next_attempt_at = now
+            status_state = "retrying"
+        job.worker = None
+        job.lease_expires_at = None
+        job.last_error = error_message
+        status: StacIngestionStatus = StacIngestionStatus.query.get(job.stac_ingestion_status_id)
+        if status is not None:
+            status.state = status_state
+            status.error_message = error_message
+            if status_state == JOB_STATE_FAILED:
+                status.time_finished = now
+            status_notifications.notify_status_changed(status.id)
+
+
+def _run_job(app: Flask, job_id: int, worker: str) -> None:
+    with app.app_context():
+        try:
+            job: IngestionJob = IngestionJob.query.get(job_id)
+            parameters = json.loads(job.parameters)
+            status_id = job.stac_ingestion_status_id
+            db.session.commit()
+            if app.config['STAC_PORTAL_BACKEND_URL']:
+                parameters['progress_callback_url'] = (app.config['STAC_PORTAL_BACKEND_URL'].rstrip('/') +
+                                                       f"/status_reporting/loading_public_stac_records/"
+                                                       f"{status_id}/progress/")
+            try:
+                response = requests.post(app.config['STAC_SELECTIVE_INGESTER_ENDPOINT'], json=parameters,
+                                         timeout=app.config['INGESTION_REQUEST_TIMEOUT_SECONDS'])
+            except requests.RequestException as e:
+                logging.error("Error: " + str(e))
+                _finish_attempt(job_id, worker, str({"error": "Unable to reach ingestion microservice"}),
+                                retry=True)
+                return
+            if response.status_code != 200:
+                # the ingester rejects invalid parameters with 4xx, which would fail again
+                _finish_attempt(job_id, worker, response.text, retry=response.status_code >= 500)
+                return
+            try:
+                response_json = response.json()
+                result = [response_json[key] for key in _RESULT_KEYS]
+            except (ValueError, KeyError):
+                _finish_attempt(job_id, worker, "Unexpected response from ingestion microservice: " + response.text)
+                return
+            _finish_attempt(job_id, worker, result=result)
+        finally:
+            db.session.remove()
+
+
+def _finish_attempt(job_id: int, worker: str, error_message: str = None, retry: bool = False,
+                    result: List[any] = None) -> None:
+    """
+    Record the outcome of an attempt, unless the job was reclaimed after this worker lost its lease.
+
+    A successful attempt reports the result of the ingester on the status entry and advances the last successful
+    run of the linked search parameters, in the same transaction that checks the lease.
+
+    :param result: Values of the ingester response in the order of _RESULT_KEYS, for a successful attempt
+    """
+    job: IngestionJob = IngestionJob.query.filter_by(id=job_id, worker=worker, state=JOB_STATE_RUNNING) \
+        .with_for_update().first()
+    if job is None:
+        db.session.rollback()
+        return
+    job.worker = None
+    job.lease_expires_at = None
+    if error_message is None:
+        job.state = JOB_STATE_SUCCEEDED
+        set_stac_ingestion_status_entry(job.stac_ingestion_status_id, *result, state=JOB_STATE_SUCCEEDED,
+                                        commit=False)
+        _record_successful_run(job.stac_ingestion_status_id)
+        db.session.commit()
+        return
+    job.last_error = error_message
+    if retry and job.attempts < current_app.config['INGESTION_MAX_ATTEMPTS']:
+        job.state = JOB_STATE_QUEUED
+        job.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=_backoff(job.attempts))
+        status_state = "retrying"
+    else:
+        job.state = JOB_STATE_FAILED
+        status_state = JOB_STATE_FAILED
+    attempts = job.attempts
+    status_id = job.stac_ingestion_status_id
+    db.session.commit()
+    set_stac_ingestion_status_state(status_id, status_state, attempts, error_message)
+
+
+def _record_successful_run(status_id: int) -> None:
+    time_started = db.session.query(StacIngestionStatus.time_started).filter_by(id=status_id).scalar()
+    StoredSearchParameters.query.filter_by(last_stac_ingestion_status_id=status_id) \
+        .update({StoredSearchParameters.last_successful_run_at: time_started}, synchronize_session=False)
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(current_app.config['INGESTION_RETRY_BACKOFF_SECONDS'] * 2 ** (attempts - 1),
+                current_app.config['INGESTION_RETRY_BACKOFF_MAX_SECONDS'])
+    # jitter keeps jobs that failed together from retrying together
+    return delay * random.uniform(0.5, 1)
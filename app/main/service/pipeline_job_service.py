@@ -0,0 +1,310 @@
+"""
+Background pipeline from uploaded assets to a published STAC item.
+
+Pipeline jobs are stored as rows in pipeline_jobs and run by the pipeline worker (manage.py run_pipeline_worker).
+A job goes through the stages commit, generate, validate and publish: it completes the resumable uploads of its
+manifest and checks that its other blobs are stored, generates the STAC item from its metadata, has the item checked
+by the STAC validator and posts it to WRITE_STAC_API_SERVER. Like ingestion jobs, a claimed job holds a lease that
+the worker renews, and attempts that failed on an unreachable service are retried with exponential backoff.
+"""
+import datetime
+import json
+import logging
+import os
+import random
+import socket
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+import azure.core.exceptions
+import requests
+from flask import Flask, current_app
+
+from .stac_generator_service import create_STAC_Item
+from .stac_service import add_item_to_collection_on_stac_api
+from .upload_session_service import complete_upload_session
+from .validate_service import validate_json
+from .. import db
+from ..custom_exceptions import CollectionDoesNotExistError, InvalidCollectionPayloadError, ItemAlreadyExistsError, \
+    PipelineJobDoesNotExistError, UploadIncompleteError, UploadSessionDoesNotExistError
+from ..model.ingestion_job_model import JOB_STATE_FAILED, JOB_STATE_QUEUED, JOB_STATE_RUNNING, JOB_STATE_SUCCEEDED
+from ..model.pipeline_job_model import PipelineJob, PIPELINE_STAGES, STAGE_COMMIT, STAGE_GENERATE, \
+    STAGE_PUBLISH, STAGE_VALIDATE
+from ..util.blob_storage import get_blob_storage
+
+
+class _StageFailed(Exception):
+    def __init__(self, message: str, retry: bool = False):
+        super().__init__(message)
+        self.retry = retry
+
+
+def enqueue_pipeline_job(collection_id: str, manifest: Dict[str, List[str]], metadata: Dict[str, any]) -> int:
+    """
+    Queue the publication of an item for the pipeline worker.
+
+    :param collection_id: Id of the collection on WRITE_STAC_API_SERVER the item is added to
+    :param manifest: upload_ids of resumable uploads to complete and blob_names of files that were uploaded already
+    :param metadata: Metadata the item is generated from, as posted to /stac_generator/
+    :return: Id of the job, which can be used to check its status
+    """
+    job = PipelineJob()
+    job.collection_id = collection_id
+    job.manifest = json.dumps({"upload_ids": manifest.get("upload_ids") or [],
+                               "blob_names": manifest.get("blob_names") or []})
+    job.item_metadata = json.dumps(metadata)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def get_pipeline_job(job_id: int) -> Dict[str, any]:
+    """
+    Get a pipeline job with its state, current stage and the seconds taken by its finished stages.
+
+    :param job_id: Id of the job
+    :return: The job, including the generated item once the generate stage finished
+    """
+    job: PipelineJob = PipelineJob.query.get(job_id)
+    if job is None:
+        raise PipelineJobDoesNotExistError
+    data = job.as_dict()
+    data["item"] = json.loads(job.item) if job.item else None
+    return data
+
+
+def run_pipeline_worker() -> None:
+    """
+    Run queued pipeline jobs until the process is stopped.
+    """
+    app: Flask = current_app._get_current_object()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    max_jobs = app.config['PIPELINE_MAX_CONCURRENT_JOBS']
+    running: Dict[int, Future] = {}
+    logging.info("Pipeline worker %s started", worker)
+    with ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="pipeline") as executor:
+        while True:
+            for job_id, future in list(running.items()):
+                if future.done():
+                    del running[job_id]
+                    if future.exception() is not None:
+                        logging.error("Pipeline job %s crashed: %s", job_id, future.exception())
+            try:
+                _renew_leases(list(running), worker)
+                for job_id in _claim_jobs(max_jobs - len(running), worker):
+                    running[job_id] = executor.submit(_run_job, app, job_id, worker)
+            except Exception as e:
+                db.session.rollback()
+                logging.error("Pipeline worker error: " + str(e))
+            time.sleep(app.config['PIPELINE_WORKER_POLL_SECONDS'])
+
+
+def _lease_expiry() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=current_app.config['PIPELINE_JOB_LEASE_SECONDS'])
+
+
+def _renew_leases(job_ids: List[int], worker: str) -> None:
+    if job_ids:
+        PipelineJob.query.filter(PipelineJob.id.in_(job_ids), PipelineJob.worker == worker,
+                                 PipelineJob.state == JOB_STATE_RUNNING) \
+            .update({PipelineJob.lease_expires_at: _lease_expiry()}, synchronize_session=False)
+    db.session.commit()
+
+
+def _claim_jobs(free_slots: int, worker: str) -> List[int]:
+    """
+    Requeue jobs with an expired lease and claim up to free_slots due jobs, skipping jobs other workers are claiming.
+    """
+    now = datetime.datetime.utcnow()
+    _requeue_expired_jobs(now)
+    if free_slots <= 0:
+        db.session.commit()
+        return []
+    jobs: List[PipelineJob] = PipelineJob.query \
+        .filter(PipelineJob.state == JOB_STATE_QUEUED, PipelineJob.next_attempt_at <= now) \
+        .order_by(PipelineJob.next_attempt_at, PipelineJob.id) \
+        .limit(free_slots).with_for_update(skip_locked=True).all()
+    lease_expires_at = _lease_expiry()
+    for job in jobs:
+        job.state = JOB_STATE_RUNNING
+        job.attempts += 1
+        job.worker = worker
+        job.lease_expires_at = lease_expires_at
+        job.started_at = now
+    claimed = [job.id for job in jobs]
+    db.session.commit()
+    return claimed
+
+
+def _requeue_expired_jobs(now: datetime.datetime) -> None:
+    expired: List[PipelineJob] = PipelineJob.query \
+        .filter(PipelineJob.state == JOB_STATE_RUNNING, PipelineJob.lease_expires_at < now) \
+        .with_for_update(skip_locked=True).all()
+    for job in expired:
+        logging.warning("Lease of pipeline job %s held by %s expired", job.id, job.worker)
+        if job.attempts >= current_app.config['PIPELINE_MAX_ATTEMPTS']:
+            job.state = JOB_STATE_FAILED
+            job.time_finished = now
+        else:
+            job.state = JOB_STATE_QUEUED
+            job.next_attempt_at = now
+        job.worker = None
+        job.lease_expires_at = None
+        job.last_error = f"{job.current_stage}: Pipeline worker stopped while the job was running"
+
+
+def _update_running_job(job_id: int, worker: str, values: Dict[str, any]) -> bool:
+    """
+    Update a job this worker still holds the lease of.
+
+    :return: Whether the job was updated, False once it was reclaimed after this worker lost its lease
+    """
+    updated = PipelineJob.query.filter_by(id=job_id, worker=worker, state=JOB_STATE_RUNNING) \
+        .update(values, synchronize_session=False)
+    db.session.commit()
+    return updated > 0
+
+
+def _run_job(app: Flask, job_id: int, worker: str) -> None:
+    with app.app_context():
+        try:
+            job: PipelineJob = PipelineJob.query.get(job_id)
+            collection_id = job.collection_id
+            manifest = json.loads(job.manifest)
+            metadata = json.loads(job.item_metadata)
+            stage_timings = json.loads(job.stage_timings)
+            committed_upload_ids = json.loads(job.committed_upload_ids)
+            item = json.loads(job.item) if job.item else None
+            # current_stage is recorded before a stage runs, so an earlier attempt may have posted the item already
+            published_before = job.current_stage == STAGE_PUBLISH
+            db.session.commit()
+
+            for stage in PIPELINE_STAGES:
+                if stage in stage_timings:
+                    continue
+                if not _update_running_job(job_id, worker, {PipelineJob.current_stage: stage}):
+                    return
+                values = {}
+                start = time.perf_counter()
+                try:
+                    if stage == STAGE_COMMIT:
+                        _commit_uploads(job_id, worker, manifest, committed_upload_ids)
+                    elif stage == STAGE_GENERATE:
+                        item = create_STAC_Item(metadata)
+                        values = {PipelineJob.item: json.dumps(item), PipelineJob.item_id: item["id"]}
+                    elif stage == STAGE_VALIDATE:
+                        _validate_item(item)
+                    else:
+                        _publish_item(collection_id, item, published_before)
+                except _StageFailed as e:
+                    db.session.rollback()
+                    _finish_attempt(job_id, worker, f"{stage}: {e}", retry=e.retry)
+                    return
+                except (requests.RequestException, azure.core.exceptions.AzureError) as e:
+                    db.session.rollback()
+                    logging.error("Error: " + str(e))
+                    _finish_attempt(job_id, worker, f"{stage}: {e}", retry=True)
+                    return
+                except Exception as e:
+                    # invalid metadata fails the same way on every attempt
+                    db.session.rollback()
+                    logging.exception("Pipeline job %s failed in stage %s", job_id, stage)
+                    _finish_attempt(job_id, worker, f"{stage}: {type(e).__name__}: {e}")
+                    return
+                stage_timings[stage] = round(time.perf_counter() - start, 3)
+                values[PipelineJob.stage_timings] = json.dumps(stage_timings)
+                if not _update_running_job(job_id, worker, values):
+                    return
+            _finish_attempt(job_id, worker)
+        finally:
+            db.session.remove()
+
+
+def _commit_uploads(job_id: int, worker: str, manifest: Dict[str, List[str]],
+                    committed_upload_ids: List[str]) -> None:
+    for upload_id in manifest["upload_ids"]:
+        if upload_id in committed_upload_ids:
+            continue
+        try:
+            complete_upload_session(upload_id)
+        except UploadSessionDoesNotExistError:
+            raise _StageFailed(f"Upload {upload_id} not found")
+        except UploadIncompleteError as e:
+            raise _StageFailed(f"Upload {upload_id} is incomplete: {e}")
+        except FileExistsError:
+            raise _StageFailed(f"A file with the name of upload {upload_id} exists already")
+        # a completed upload is gone, so a retried attempt must not complete it again
+        committed_upload_ids.append(upload_id)
+        if not _update_running_job(job_id, worker,
+                                   {PipelineJob.committed_upload_ids: json.dumps(committed_upload_ids)}):
+            raise _StageFailed("Lease of the job expired")
+
+    container_client = get_blob_storage().container_client()
+    for blob_name in manifest["blob_names"]:
+        if not container_client.get_blob_client(blob_name).exists():
+            raise _StageFailed(f"Blob {blob_name} not found")
+
+
+def _validate_item(item: Dict[str, any]) -> None:
+    response, status_code = validate_json({"json": item})
+    if status_code >= 500:
+        raise _StageFailed(f"STAC validator responded with {status_code}: {response}", retry=True)
+    if status_code != 200:
+        raise _StageFailed(f"STAC validator responded with {status_code}: {response}")
+    # the validator reports every validated object with its valid_stac flag
+    results = response if isinstance(response, list) else [response]
+    invalid = [result for result in results if isinstance(result, dict) and result.get("valid_stac") is False]
+    if invalid:
+        raise _StageFailed("Item is not valid: " + json.dumps(invalid))
+
+
+def _publish_item(collection_id: str, item: Dict[str, any], published_before: bool) -> None:
+    try:
+        response = add_item_to_collection_on_stac_api(collection_id, item)
+    except CollectionDoesNotExistError:
+        raise _StageFailed(f"Collection {collection_id} not found")
+    except ItemAlreadyExistsError:
+        if published_before:
+            # posted by the earlier attempt, which failed or lost its lease before recording the stage
+            return
+        raise _StageFailed(f"Item {item['id']} exists already in collection {collection_id}")
+    except InvalidCollectionPayloadError:
+        raise _StageFailed("Item was rejected by the STAC API")
+    if "error_code" in response:
+        raise _StageFailed(f"STAC API responded with {response['error_code']}: {json.dumps(response)}",
+                           retry=response["error_code"] >= 500)
+
+
+def _finish_attempt(job_id: int, worker: str, error_message: str = None, retry: bool = False) -> None:
+    """
+    Record the outcome of an attempt, unless the job was reclaimed after this worker lost its lease.
+    """
+    job: PipelineJob = PipelineJob.query.filter_by(id=job_id, worker=worker, state=JOB_STATE_RUNNING) \
+        .with_for_update().first()
+    if job is None:
+        db.session.rollback()
+        return
+    job.worker = None
+    job.lease_expires_at = None
+    now = datetime.datetime.utcnow()
+    if error_message is None:
+        job.state = JOB_STATE_SUCCEEDED
+        job.current_stage = None
+        job.time_finished = now
+        db.session.commit()
+        return
+    job.last_error = error_message
+    if retry and job.attempts < current_app.config['PIPELINE_MAX_ATTEMPTS']:
+        job.state = JOB_STATE_QUEUED
+        job.next_attempt_at = now + datetime.timedelta(seconds=_backoff(job.attempts))
+    else:
+        job.state = JOB_STATE_FAILED
+        job.time_finished = now
+    db.session.commit()
+
+
+def _backoff(attempts: int) -> float:
+    delay = current_app.config['PIPELINE_RETRY_BACKOFF_SECONDS'] * 2 ** (attempts - 1)
+    # jitter keeps jobs that failed together from retrying together
+    return delay * random.uniform(0.5, 1)
@@ -1,16 +1,19 @@
 from typing import Dict
 
-import geoalchemy2
 import shapely
-from shapely.geometry import box, MultiPolygon
-from sqlalchemy import or_
+from flask import current_app
+from sqlalchemy import func, null, or_
+from sqlalchemy.orm import defer
 
 from .stac_service import update_existing_collection_on_stac_api, create_new_collection_on_stac_api, \
     remove_private_collection_by_id_on_stac_api
 from .. import db
 from ..custom_exceptions import *
+from ..model.collection_model import SEARCH_VECTOR_LANGUAGE
 from ..model.private_catalog_model import PrivateCollection
+from ..util import cql2
 from ..util import process_timestamp
+from ..util import search_cache
 from ..util.process_timestamp import *
 
 
@@ -44,13 +47,7 @@ def add_collection(collection: Dict[str, any]) -> Dict[str, any]:
         except KeyError:
             private_collection.description = None
 
-        bboxes = collection['extent']['spatial']['bbox']
-        shapely_boxes = []
-        for i in range(0, len(bboxes)):
-            shapely_box = box(*(collection['extent']['spatial']['bbox'][i]))
-            shapely_boxes.append(shapely_box)
-        shapely_multi_polygon = geoalchemy2.shape.from_shape(MultiPolygon(shapely_boxes), srid=4326)
-        private_collection.spatial_extent = shapely_multi_polygon
+        private_collection.set_spatial_extent(collection['extent']['spatial']['bbox'])
         temporal_extent_start = collection['extent']['temporal']['interval'][0][0]
         temporal_extent_end = collection['extent']['temporal']['interval'][0][1]
         private_collection.temporal_extent_start = process_timestamp_single_string(temporal_extent_start)
@@ -67,6 +64,8 @@ def add_collection(collection: Dict[str, any]) -> Dict[str, any]:
         except InvalidCollectionPayloadError:
             db.session.rollback()
             raise InvalidCollectionPayloadError
+        finally:
+            search_cache.get_collection_search_cache().bump(("private",))
 
 
 def update_collection(collection: Dict[str, any]) -> Dict[str, any]:
@@ -79,13 +78,7 @@ def update_collection(collection: Dict[str, any]) -> Dict[str, any]:
     except KeyError:
         pass
     private_collection.description = collection['description']
-    bboxes = collection['extent']['spatial']['bbox']
-    shapely_boxes = []
-    for i in range(0, len(bboxes)):
-        shapely_box = box(*(collection['extent']['spatial']['bbox'][i]))
-        shapely_boxes.append(shapely_box)
-    shapely_multi_polygon = geoalchemy2.shape.from_shape(MultiPolygon(shapely_boxes), srid=4326)
-    private_collection.spatial_extent = shapely_multi_polygon
+    private_collection.set_spatial_extent(collection['extent']['spatial']['bbox'])
     temporal_extent_start = collection['extent']['temporal']['interval'][0][0]
     temporal_extent_end = collection['extent']['temporal']['interval'][0][1]
     private_collection.temporal_extent_start = process_timestamp_single_string(temporal_extent_start)
@@ -101,6 +94,8 @@ def update_collection(collection: Dict[str, any]) -> Dict[str, any]:
     except InvalidCollectionPayloadError:
         db.session.rollback()
         raise InvalidCollectionPayloadError
+    finally:
+        search_cache.get_collection_search_cache().bump(("private",))
 
 
 def remove_collection(collection_id: str) -> Dict[str, any]:
@@ -109,18 +104,65 @@ def remove_collection(collection_id: str) -> Dict[str, any]:
     private_collection = PrivateCollection.query.filter_by(id=collection_id).first()
     db.session.delete(private_collection)
     db.session.commit()
+    search_cache.get_collection_search_cache().bump(("private",))
     remove_private_collection_by_id_on_stac_api(collection_id)
     return {"status": "success"}
 
 
-def search_collections(bbox: shapely.geometry.polygon.Polygon or list[float], time_interval_timestamp: str,
-                       ) -> dict[str, any] or list[any]:
+def search_collections(bbox: shapely.geometry.polygon.Polygon or list[float] or None,
+                       time_interval_timestamp: str or None, q: str = None,
+                       simplified_footprint: bool = False,
+                       filter_expression: Dict[str, any] = None) -> dict[str, any] or list[any]:
+    """Search private collections intersecting a bbox and a time interval and matching a keyword query.
+
+    Results are cached per worker, keyed on the bbox snapped to SEARCH_CACHE_BBOX_GRID_DEGREES, the
+    canonical time interval, the keyword query and the filter. The cached collections of the snapped bbox are
+    narrowed to the exact bbox of each search.
+
+    :param bbox: Bounding box as a list of floats or a shapely polygon, None to not filter spatially
+    :param time_interval_timestamp: Time interval string, use .. for open ranges, None to not filter temporally
+    :param q: Keywords matched against the id, title and description, results are ranked by relevance
+    :param simplified_footprint: Return the simplified footprint instead of the exact spatial extent
+    :param filter_expression: CQL2-JSON filter over the queryables of PrivateCollection
+    :return: List of matching collections
+    """
+    search_bbox = bbox
     if isinstance(bbox, list):
+        search_bbox = shapely.geometry.box(
+            *search_cache.snap_bbox_to_grid(bbox, current_app.config["SEARCH_CACHE_BBOX_GRID_DEGREES"]))
         bbox = shapely.geometry.box(*bbox)
-    a = db.session.query(PrivateCollection).filter(PrivateCollection.spatial_extent.ST_Intersects(
-        f"SRID=4326;{bbox.wkt}"))
-
-    time_start, time_end = process_timestamp.process_timestamp_dual_string(time_interval_timestamp)
+    time_interval = search_cache.canonical_time_interval(time_interval_timestamp) if time_interval_timestamp else None
+    q = q.strip() if q else None
+    filter_clause = None
+    if filter_expression is not None:
+        filter_clause = cql2.compile_filter(filter_expression, PrivateCollection.queryables())
+    cache_key = ("private", search_bbox.wkt if search_bbox is not None else None, time_interval, q,
+                 simplified_footprint, cql2.canonical_filter(filter_expression))
+    collections = search_cache.get_collection_search_cache().get_or_set(
+        cache_key, ("private",), lambda: _search_collections(search_bbox, time_interval_timestamp, q,
+                                                         simplified_footprint, filter_clause))
+    if bbox is not None:
+        return search_cache.filter_by_bbox(collections, bbox)
+    return [collection for _, collection in collections]
+
+
+def _search_collections(bbox: shapely.geometry.polygon.Polygon or None, time_interval_timestamp: str or None,
+                        q: str = None, simplified_footprint: bool = False, filter_clause=None) -> list[any]:
+    """Search private collections, each paired with its exact spatial extent as WKT when a bbox is given."""
+    # the returned footprint is exact unless simplified, which needs the exact extent alongside
+    exact_spatial_extent = null()
+    if bbox is not None and simplified_footprint:
+        exact_spatial_extent = func.ST_AsText(PrivateCollection.spatial_extent)
+    a = db.session.query(PrivateCollection, exact_spatial_extent)
+    if simplified_footprint:
+        a = a.options(defer(PrivateCollection.spatial_extent))
+    if bbox is not None:
+        a = a.filter(PrivateCollection.spatial_extent_intersects(f"SRID=4326;{bbox.wkt}"))
+
+    if time_interval_timestamp:
+        time_start, time_end = process_timestamp.process_timestamp_dual_string(time_interval_timestamp)
+    else:
+        time_start, time_end = None, None
     if time_start:
         a = a.filter(
             or_(PrivateCollection.temporal_extent_start == None, PrivateCollection.temporal_extent_start <= time_start))
@@ -128,18 +170,29 @@ def search_collections(bbox: shapely.geometry.polygon.Polygon or list[float], ti
         a = a.filter(
             or_(PrivateCollection.temporal_extent_end == None, PrivateCollection.temporal_extent_end >= time_end
                 ))
+    if filter_clause is not None:
+        a = a.filter(filter_clause)
+    if q:
+        ts_query = func.websearch_to_tsquery(SEARCH_VECTOR_LANGUAGE, q)
+        a = a.filter(PrivateCollection.search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank_cd(PrivateCollection.search_vector, ts_query).desc())
     data = a.all()
     grouped_data = []
-    for item in data:
+    for item, spatial_extent_wkt in data:
         item: PrivateCollection
-        grouped_data.append(item.as_dict())
+        collection = item.as_dict(simplified_footprint)
+        grouped_data.append(
+            (spatial_extent_wkt if simplified_footprint else collection["spatial_extent_wkt"], collection))
     return grouped_data
 
 
-def get_all_collections():
-    data = db.session.query(PrivateCollection).all()
+def get_all_collections(simplified_footprint: bool = False):
+    query = db.session.query(PrivateCollection)
+    if simplified_footprint:
+        query = query.options(defer(PrivateCollection.spatial_extent))
+    data = query.all()
     grouped_data = []
     for item in data:
         item: PrivateCollection
-        grouped_data.append(item.as_dict())
+        grouped_data.append(item.as_dict(simplified_footprint))
     return grouped_data
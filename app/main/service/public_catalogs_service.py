@@ -1,24 +1,29 @@
+import datetime
 import json
 import logging
+import random
 from threading import Thread
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
-import geoalchemy2
 import requests
 import shapely
 import sqlalchemy
 from flask import current_app
-from shapely.geometry import MultiPolygon
-from shapely.geometry import box
-from sqlalchemy import or_
+from sqlalchemy import func, null
+from sqlalchemy.orm import defer
 
 from app.main.model.public_catalogs_model import PublicCatalog, PublicCollection
-from .status_reporting_service import make_stac_ingestion_status_entry, set_stac_ingestion_status_entry
 from .. import db
 from ..custom_exceptions import *
+from ..model.collection_model import SEARCH_VECTOR_LANGUAGE
+from ..model.ingestion_job_model import LANE_INTERACTIVE
 from ..model.public_catalogs_model import StoredSearchParameters
+from ..service import ingestion_job_service
 from ..service import stac_service
+from ..util import cql2
 from ..util import process_timestamp
+from ..util import search_cache
+from ..util.parameters_hash import hash_parameters
 
 
 def store_new_public_catalog(name: str, url: str, description: str, return_as_dict=True) -> Dict[
@@ -85,6 +90,7 @@ def remove_all_public_catalogs() -> None:
     """
     db.session.query(PublicCatalog).delete()
     db.session.commit()
+    search_cache.get_collection_search_cache().bump(("public",))
 
 
 def get_public_collections():
@@ -154,13 +160,7 @@ def _store_collections(public_catalog_entry: PublicCatalog) -> int:
             public_collection.temporal_extent_start = process_timestamp.process_timestamp_single_string(
                 start_time_string)
             public_collection.temporal_extent_end = process_timestamp.process_timestamp_single_string(end_time_string)
-            bboxes = collection['extent']['spatial']['bbox']
-            shapely_boxes = []
-            for i in range(0, len(bboxes)):
-                shapely_box = box(*(collection['extent']['spatial']['bbox'][i]))
-                shapely_boxes.append(shapely_box)
-            shapely_multi_polygon = geoalchemy2.shape.from_shape(MultiPolygon(shapely_boxes), srid=4326)
-            public_collection.spatial_extent = shapely_multi_polygon
+            public_collection.set_spatial_extent(collection['extent']['spatial']['bbox'])
             public_collection.parent_catalog = public_catalog_entry.id  # TODO: Rename to parent_catalog_id
             db.session.add(public_collection)
             count_added += 1
@@ -171,6 +171,8 @@ def _store_collections(public_catalog_entry: PublicCatalog) -> int:
         raise ConvertingTimestampError
     except KeyError:
         db.session.commit()
+    finally:
+        search_cache.get_collection_search_cache().bump(("public", public_catalog_entry.id))
 
     return count_added
 
@@ -194,76 +196,129 @@ def _store_catalog_and_collections(title, url, summary) -> int or None:
         return _store_collections(already_existing_catalog)
 
 
-def search_collections(bbox: shapely.geometry.polygon.Polygon or list[float], time_interval_timestamp: str,
-                       public_catalog_id: int = None) -> dict[str, any] or list[any]:
+def search_collections(bbox: shapely.geometry.polygon.Polygon or list[float] or None,
+                       time_interval_timestamp: str or None,
+                       public_catalog_id: int = None, q: str = None,
+                       simplified_footprint: bool = False,
+                       filter_expression: Dict[str, any] = None) -> dict[str, any] or list[any]:
+    """
+    Search stored public collections intersecting a bbox and a time interval and matching a keyword query.
+
+    Results are cached per worker, keyed on the bbox snapped to SEARCH_CACHE_BBOX_GRID_DEGREES, the canonical
+    time interval, the catalog id, the keyword query and the filter. The cached collections of the snapped bbox
+    are narrowed to the exact bbox of each search.
+
+    :param bbox: Bounding box as a list of floats or a shapely polygon, None to not filter spatially
+    :param time_interval_timestamp: Time interval string, use .. for open ranges, None to not filter temporally
+    :param public_catalog_id: Only search collections of this public catalog
+    :param q: Keywords matched against the id, title and description, results are ranked by relevance
+    :param simplified_footprint: Return the simplified footprint instead of the exact spatial extent
+    :param filter_expression: CQL2-JSON filter over the queryables of PublicCollection
+    :return: Collections grouped by catalog, or the group of the specified catalog
+    """
     if public_catalog_id:
         try:
             get_public_catalog_by_id_as_dict(public_catalog_id)
         except CatalogDoesNotExistError:
             raise CatalogDoesNotExistError
 
+    search_bbox = bbox
     if isinstance(bbox, list):
+        search_bbox = shapely.geometry.box(
+            *search_cache.snap_bbox_to_grid(bbox, current_app.config["SEARCH_CACHE_BBOX_GRID_DEGREES"]))
         bbox = shapely.geometry.box(*bbox)
-    a = db.session.query(PublicCollection).filter(PublicCollection.spatial_extent.ST_Intersects(
-        f"SRID=4326;{bbox.wkt}"))
+    time_interval = search_cache.canonical_time_interval(time_interval_timestamp) if time_interval_timestamp else None
+    q = q.strip() if q else None
+    filter_clause = None
+    if filter_expression is not None:
+        filter_clause = cql2.compile_filter(filter_expression, PublicCollection.queryables())
+    cache_key = ("public", search_bbox.wkt if search_bbox is not None else None, time_interval, public_catalog_id,
+                 q, simplified_footprint, cql2.canonical_filter(filter_expression))
+    partition = ("public", public_catalog_id) if public_catalog_id else ("public",)
+    groups = search_cache.get_collection_search_cache().get_or_set(
+        cache_key, partition, lambda: _search_collections(search_bbox, time_interval_timestamp, public_catalog_id, q,
+                                                        simplified_footprint, filter_clause))
+    out = []
+    for group in groups:
+        if bbox is not None:
+            collections = search_cache.filter_by_bbox(group["collections"], bbox)
+        else:
+            collections = [collection for _, collection in group["collections"]]
+        if collections:
+            out.append({"catalog": group["catalog"], "collections": collections})
+    if not public_catalog_id:
+        return out
+    return out[0] if out else []
+
+
+def _search_collections(bbox: shapely.geometry.polygon.Polygon or None, time_interval_timestamp: str or None,
+                        public_catalog_id: int = None, q: str = None,
+                        simplified_footprint: bool = False, filter_clause=None) -> list[dict[str, any]]:
+    """
+    Search stored public collections and group them by catalog.
+
+    :return: Groups of a catalog and its collections, each paired with its exact spatial extent as WKT when a
+        bbox is given, so the cached groups can be narrowed to the bbox of each request
+    """
+    # the returned footprint is exact unless simplified, which needs the exact extent alongside
+    exact_spatial_extent = null()
+    if bbox is not None and simplified_footprint:
+        exact_spatial_extent = func.ST_AsText(PublicCollection.spatial_extent)
+    a = db.session.query(PublicCollection, exact_spatial_extent)
+    if simplified_footprint:
+        a = a.options(defer(PublicCollection.spatial_extent))
+    if bbox is not None:
+        a = a.filter(PublicCollection.spatial_extent_intersects(f"SRID=4326;{bbox.wkt}"))
     if public_catalog_id:
         a = a.filter(PublicCollection.parent_catalog == public_catalog_id)
-    time_start, time_end = process_timestamp.process_timestamp_dual_string(time_interval_timestamp)
-    # all 4 cases of time_start and time_end
-    if time_start and time_end:
-        a = a.filter(
-            or_(PublicCollection.temporal_extent_start <= time_end, PublicCollection.temporal_extent_start == None),
-            or_(PublicCollection.temporal_extent_end >= time_start, PublicCollection.temporal_extent_end == None))
-    elif time_start and not time_end:
-        a = a.filter(
-            or_(PublicCollection.temporal_extent_end >= time_start, PublicCollection.temporal_extent_end == None))
-    elif not time_start and time_end:
-        a = a.filter(
-            or_(PublicCollection.temporal_extent_start <= time_end, PublicCollection.temporal_extent_start == None))
+    if time_interval_timestamp:
+        time_start, time_end = process_timestamp.process_timestamp_dual_string(time_interval_timestamp)
     else:
-        pass
+        time_start, time_end = None, None
+    a = a.filter(PublicCollection.temporal_extent_overlaps(time_start, time_end))
+    if filter_clause is not None:
+        a = a.filter(filter_clause)
+    if q:
+        ts_query = func.websearch_to_tsquery(SEARCH_VECTOR_LANGUAGE, q)
+        # catalogs and their collections keep the order of the best ranked collections
+        a = a.filter(PublicCollection.search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank_cd(PublicCollection.search_vector, ts_query).desc())
     data = a.all()
     grouped_data = {}
-    for item in data:
+    for item, spatial_extent_wkt in data:
         item: PublicCollection
-        if item.parent_catalog in grouped_data:
-            grouped_data[item.parent_catalog]["collections"].append(item.as_dict())
-        else:
+        if item.parent_catalog not in grouped_data:
             grouped_data[item.parent_catalog] = {}
             grouped_data[item.parent_catalog]["catalog"] = PublicCatalog.query.filter_by(
                 id=item.parent_catalog).first().as_dict()
             grouped_data[item.parent_catalog]["collections"] = []
-            grouped_data[item.parent_catalog]["collections"].append(item.as_dict())
-    if not public_catalog_id:
-        keys = list(grouped_data.keys())
-        out = []
-        for i in keys:
-            out.append(grouped_data[i])
-        return out
-    else:
-        try:
-            return grouped_data[public_catalog_id]
-        except KeyError:
-            return []
+        collection = item.as_dict(simplified_footprint)
+        grouped_data[item.parent_catalog]["collections"].append(
+            (spatial_extent_wkt if simplified_footprint else collection["spatial_extent_wkt"], collection))
+    return list(grouped_data.values())
 
 
-def get_collections_from_public_catalog_id(public_catalog_id: int):
+def get_collections_from_public_catalog_id(public_catalog_id: int, simplified_footprint: bool = False):
     try:
         get_public_catalog_by_id_as_dict(public_catalog_id)
     except CatalogDoesNotExistError:
         raise PublicCatalogDoesNotExistError
-    data = PublicCollection.query.filter_by(parent_catalog=public_catalog_id).all()
+    query = PublicCollection.query.filter_by(parent_catalog=public_catalog_id)
+    if simplified_footprint:
+        query = query.options(defer(PublicCollection.spatial_extent))
     out = []
-    for item in data:
-        out.append(item.as_dict())
+    for item in query.all():
+        out.append(item.as_dict(simplified_footprint))
     return out
 
 
-def get_all_stored_public_collections_as_list_of_dict():
-    public_collections = PublicCollection.query.all()
+def get_all_stored_public_collections_as_list_of_dict(simplified_footprint: bool = False):
+    query = PublicCollection.query
+    if simplified_footprint:
+        query = query.options(defer(PublicCollection.spatial_extent))
     out = []
-    for public_collection in public_collections:
-        out.append(public_collection.as_dict())
+    for public_collection in query.all():
+        out.append(public_collection.as_dict(simplified_footprint))
     return out
 
 
@@ -355,6 +410,7 @@ def remove_public_catalog_via_catalog_id(public_catalog_id: int) -> Dict[any, an
             id=public_catalog_id).first()
         db.session.delete(a)
         db.session.commit()
+        search_cache.get_collection_search_cache().bump(("public", public_catalog_id))
         return a.as_dict()
     except sqlalchemy.orm.exc.UnmappedInstanceError:
         raise CatalogDoesNotExistError
@@ -376,28 +432,33 @@ def load_specific_collections_via_catalog_id(catalog_id: int,
         parameters = {}
     parameters['source_stac_catalog_url'] = public_catalogue_entry.url
     target_stac_api_url = current_app.config['WRITE_STAC_API_SERVER']
-    _store_search_parameters(catalog_id, parameters)
+    stored_search_parameters = _store_search_parameters(catalog_id, parameters)
     parameters["target_stac_catalog_url"] = target_stac_api_url
-    return _call_ingestion_microservice(parameters)
+    callback_id = ingestion_job_service.enqueue_ingestion_job(parameters, LANE_INTERACTIVE)
+    _link_stored_search_parameters_to_status(stored_search_parameters, callback_id)
+    return callback_id
 
 
-def update_all_stac_records() -> list[int]:
+def update_all_stac_records(full_refresh: bool = False) -> list[int]:
     """
     Update all STAC records in the database.
+    :param full_refresh: Ingest the full datetime windows instead of the windows since the last successful runs
     :return: Updated collection ids
     """
     stored_search_parameters: [StoredSearchParameters
                                ] = StoredSearchParameters.query.all()
-    return _run_ingestion_task_force_update(stored_search_parameters)
+    return _run_ingestion_task_force_update(stored_search_parameters, full_refresh)
 
 
 def update_specific_collections_via_catalog_id(catalog_id: int,
-                                               collections: [str] = None
+                                               collections: [str] = None,
+                                               full_refresh: bool = False
                                                ) -> list[int]:
     """
     Update specific collections from a catalog into the database.
     :param catalog_id: Catalog id of the catalog to update collections from
     :param collections: List of collection ids to update
+    :param full_refresh: Ingest the full datetime windows instead of the windows since the last successful runs
     :return: Updated collection ids
     """
     public_catalogue_entry: PublicCatalog = PublicCatalog.query.filter_by(
@@ -406,106 +467,33 @@ def update_specific_collections_via_catalog_id(catalog_id: int,
     if public_catalogue_entry is None:
         raise CatalogDoesNotExistError("No catalogue entry found for id: " +
                                        str(catalog_id))
-    stored_search_parameters: [StoredSearchParameters
-                               ] = StoredSearchParameters.query.filter_by(
-        associated_catalog_id=catalog_id).all()
-    stored_search_parameters_to_run = []
-    if collections is None or len(collections) == 0:
-        stored_search_parameters_to_run = stored_search_parameters
-        return _run_ingestion_task_force_update(
-            stored_search_parameters_to_run)
-    else:
-        for stored_search_parameter in stored_search_parameters:
-            used_search_parameters = json.loads(
-                stored_search_parameter.used_search_parameters)
-            used_search_parameters_collections = used_search_parameters[
-                'collections']
-            # if any collection in used_search_parameters_collections is in collections, then add to
-            # stored_search_parameters_to_run
-            check = any(item in used_search_parameters_collections
-                        for item in collections)
-            if check:
-                stored_search_parameters_to_run.append(stored_search_parameter)
-
-        return _run_ingestion_task_force_update(
-            stored_search_parameters_to_run)
-
-
-def _call_ingestion_microservice(parameters) -> int:
-    """
-    Call the ingestion microservice to load collections into the database.
-
-    Also saves the search parameters used to load the collections into the database so
-    the update can be called using the same parameters.
-
-    :param parameters: STAC Filter parameters
-    :return: Work session id which can be used to check the status of the ingestion
-    """
-    souce_stac_catalog_url = parameters['source_stac_catalog_url']
-    target_stac_catalog_url = current_app.config['WRITE_STAC_API_SERVER']
-    update = parameters['update']
-    callback_id = make_stac_ingestion_status_entry(souce_stac_catalog_url, target_stac_catalog_url, update)
-    parameters['callback_id'] = callback_id
-    microservice_endpoint = current_app.config['STAC_SELECTIVE_INGESTER_ENDPOINT']
-
-    def run_async(_parameters, _app):
-        try:
-            response = requests.post(
-                microservice_endpoint,
-                json=_parameters, timeout=None)
-            if response.status_code != 200:
-                error_msg = response.text
-                with _app.app_context():
-                    set_stac_ingestion_status_entry(int(callback_id), error_message=error_msg)
-                    return
-            response_json = response.json()
-            newly_stored_collections = response_json['newly_stored_collections']
-            newly_stored_collections_count = response_json['newly_stored_collections_count']
-            updated_collections_count = response_json['updated_collections_count']
-            updated_collections = response_json['updated_collections']
-            newly_stored_items_count = response_json['newly_stored_items_count']
-            updated_items_count = response_json['updated_items_count']
-            already_stored_items_count = response_json['already_stored_items_count']
-            with _app.app_context():
-                set_stac_ingestion_status_entry(int(callback_id), newly_stored_collections_count,
-                                                newly_stored_collections,
-                                                updated_collections_count, updated_collections,
-                                                newly_stored_items_count,
-                                                updated_items_count, already_stored_items_count)
-            return response_json
-
-        except Exception as e:
-            with _app.app_context():
-                err = str({
-                    "error": "Unable to reach ingestion microservice"
-                })
-                set_stac_ingestion_status_entry(int(callback_id), error_message=err)
-            logging.error("Error: " + str(e))
-
-    app = current_app._get_current_object()  # TODO: Is there a better way to do this?
-    thread = Thread(target=run_async, args=(parameters, app))
-    thread.start()
-    return callback_id
+    query = StoredSearchParameters.query.filter_by(associated_catalog_id=catalog_id)
+    if collections:
+        # rows whose collections filter shares any collection with collections
+        query = query.filter(StoredSearchParameters.collections.overlap(collections))
+    return _run_ingestion_task_force_update(query.all(), full_refresh)
 
 
 def _store_search_parameters(associated_catalogue_id,
-                             parameters: dict) -> None:
+                             parameters: dict) -> List[StoredSearchParameters]:
     """
     Store the search parameters used to load the collections into the database.
 
     :param associated_catalogue_id: Catalogue id of the catalogue the collections were loaded from
     :param parameters: STAC Filter parameters
+    :return: Stored search parameters of the load, including ones that were already stored
     """
+    parameters_hashes = []
     try:
         for collection in parameters['collections']:
             filtered_parameters = parameters.copy()
             filtered_parameters['collections'] = [collection]
+            parameters_hashes.append(hash_parameters(filtered_parameters))
 
             try:
                 stored_search_parameters = StoredSearchParameters()
                 stored_search_parameters.associated_catalog_id = associated_catalogue_id
-                stored_search_parameters.used_search_parameters = json.dumps(
-                    filtered_parameters)
+                stored_search_parameters.set_used_search_parameters(filtered_parameters)
                 stored_search_parameters.collection = collection
                 try:
                     stored_search_parameters.bbox = json.dumps(
@@ -527,11 +515,11 @@ def _store_search_parameters(associated_catalogue_id,
                 db.session.rollback()
     except KeyError:
         filtered_parameters = parameters.copy()
+        parameters_hashes.append(hash_parameters(filtered_parameters))
         try:
             stored_search_parameters = StoredSearchParameters()
             stored_search_parameters.associated_catalog_id = associated_catalogue_id
-            stored_search_parameters.used_search_parameters = json.dumps(
-                filtered_parameters)
+            stored_search_parameters.set_used_search_parameters(filtered_parameters)
             try:
                 stored_search_parameters.bbox = json.dumps(
                     filtered_parameters['bbox'])
@@ -550,6 +538,11 @@ def _store_search_parameters(associated_catalogue_id,
             pass
         finally:
             db.session.rollback()
+    finally:
+        # catalogs in search results report their number of stored search parameters
+        search_cache.get_collection_search_cache().bump(("public", associated_catalogue_id))
+    return StoredSearchParameters.query.filter(
+        StoredSearchParameters.parameters_hash.in_(parameters_hashes)).all()
 
 
 def remove_search_params_for_collection_id(collection_id: str) -> int:
@@ -566,33 +559,216 @@ def remove_search_params_for_collection_id(collection_id: str) -> int:
         db.session.delete(stored_search_parameter)
         num_deleted += 1
     db.session.commit()
+    # catalogs in search results report their number of stored search parameters
+    search_cache.get_collection_search_cache().bump(("public",))
     return num_deleted
 
 
+# Parameters that do not change which items an ingestion reads from the source catalog
+_PARAMETERS_NOT_IN_GROUP_KEY = ("collections", "update", "target_stac_catalog_url", "callback_id")
+
+
+def _plan_ingestion_groups(stored_search_parameters: List[StoredSearchParameters]) \
+        -> List[Tuple[Dict[str, any], List[StoredSearchParameters]]]:
+    """
+    Group stored search parameters that only differ in their collections, so each group needs one ingestion.
+
+    :param stored_search_parameters: Stored search parameters to run
+    :return: Parameters of the ingestion of each group, with the collections of all its rows, and the rows
+    """
+    groups: Dict[Tuple, Tuple[Dict[str, any], List[StoredSearchParameters]]] = {}
+    for stored_search_parameter in stored_search_parameters:
+        used_search_parameters = json.loads(stored_search_parameter.used_search_parameters)
+        if "collections" not in used_search_parameters:
+            # a load of the whole catalog, which no other row can be merged into
+            group_key = ("catalog", stored_search_parameter.id)
+        else:
+            filters = {k: v for k, v in used_search_parameters.items() if k not in _PARAMETERS_NOT_IN_GROUP_KEY}
+            group_key = (stored_search_parameter.associated_catalog_id, json.dumps(filters, sort_keys=True))
+        if group_key not in groups:
+            groups[group_key] = (used_search_parameters, [])
+        else:
+            group_collections = groups[group_key][0]["collections"]
+            group_collections.extend(c for c in used_search_parameters["collections"] if c not in group_collections)
+        groups[group_key][1].append(stored_search_parameter)
+    return list(groups.values())
+
+
+def _link_stored_search_parameters_to_status(stored_search_parameters: List[StoredSearchParameters],
+                                             callback_id: int) -> None:
+    for stored_search_parameter in stored_search_parameters:
+        stored_search_parameter.last_stac_ingestion_status_id = callback_id
+    db.session.commit()
+
+
+def _narrow_to_incremental_window(used_search_parameters: Dict[str, any],
+                                  last_successful_run_at: datetime.datetime or None) -> Dict[str, any] or None:
+    """
+    Narrow the datetime filter of search parameters to the window since their last successful run.
+
+    The window starts INGESTION_INCREMENTAL_OVERLAP_SECONDS before that run, to pick up items that were published
+    late.
+
+    :param used_search_parameters: STAC Filter parameters, narrowed in place
+    :param last_successful_run_at: Time the last successful run started, None if there was none
+    :return: Narrowed parameters, or None if the window since the last run is empty
+    """
+    if last_successful_run_at is None:
+        return used_search_parameters
+    since = last_successful_run_at - datetime.timedelta(
+        seconds=current_app.config["INGESTION_INCREMENTAL_OVERLAP_SECONDS"])
+    since_timestamp = since.strftime("%Y-%m-%dT%H:%M:%SZ")
+    datetime_filter = used_search_parameters.get("datetime")
+    if not datetime_filter:
+        used_search_parameters["datetime"] = f"{since_timestamp}/.."
+        return used_search_parameters
+    try:
+        time_start, time_end = process_timestamp.process_timestamp_dual_string(datetime_filter)
+    except ConvertingTimestampError:
+        # a single instant can not be narrowed
+        return used_search_parameters
+    if time_start is not None and time_start.tzinfo is not None:
+        time_start = time_start.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    if time_end is not None and time_end.tzinfo is not None:
+        time_end = time_end.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    if time_end is not None and time_end < since:
+        return None
+    if time_start is None or time_start < since:
+        used_search_parameters["datetime"] = f"{since_timestamp}/{datetime_filter.split('/')[1]}"
+    return used_search_parameters
+
+
 def _run_ingestion_task_force_update(
         stored_search_parameters: [StoredSearchParameters
-                                   ]) -> list[int]:
+                                   ], full_refresh: bool = False) -> list[int]:
     """
     Run the ingestion task for a list of stored search parameters but force update.
 
+    Rows of the same catalog with identical filters are sent as one multi-collection ingestion, whose status is
+    linked back to every row. Unless full_refresh is set, each ingestion only covers the datetime window since
+    the oldest last successful run of its rows, and groups with an empty window are skipped.
+
     :param stored_search_parameters: List of stored search parameters to run the ingestion task for
+    :param full_refresh: Ingest the full datetime windows instead of the windows since the last successful runs
     :return: List of work session ids which can be used to check the status of the ingestion
     """
     responses_from_ingestion_microservice = []
-    for i in stored_search_parameters:
-        try:
-            used_search_parameters = json.loads(i.used_search_parameters)
-            used_search_parameters["target_stac_catalog_url"] = current_app.config["READ_STAC_API_SERVER"]
-            used_search_parameters["update"] = True
-            microservice_response = _call_ingestion_microservice(
-                used_search_parameters)
+    for used_search_parameters, group in _plan_ingestion_groups(stored_search_parameters):
+        microservice_response = _queue_group_update(used_search_parameters, group, full_refresh)
+        if microservice_response is not None:
             responses_from_ingestion_microservice.append(
                 microservice_response)
-        except ValueError:
-            pass
     return responses_from_ingestion_microservice
 
 
+def _queue_group_update(used_search_parameters: Dict[str, any], group: List[StoredSearchParameters],
+                        full_refresh: bool) -> int or None:
+    if not full_refresh:
+        last_successful_runs = [row.last_successful_run_at for row in group]
+        last_successful_run_at = None if None in last_successful_runs else min(last_successful_runs)
+        used_search_parameters = _narrow_to_incremental_window(used_search_parameters, last_successful_run_at)
+        if used_search_parameters is None:
+            return None
+    try:
+        used_search_parameters["target_stac_catalog_url"] = current_app.config["READ_STAC_API_SERVER"]
+        used_search_parameters["update"] = True
+        microservice_response = ingestion_job_service.enqueue_ingestion_job(
+            used_search_parameters)
+        _link_stored_search_parameters_to_status(group, microservice_response)
+        return microservice_response
+    except ValueError:
+        return None
+
+
+def _next_refresh_at(now: datetime.datetime, refresh_interval_seconds: int) -> datetime.datetime:
+    jitter = current_app.config["SCHEDULER_JITTER_FRACTION"]
+    return now + datetime.timedelta(seconds=refresh_interval_seconds * random.uniform(1 - jitter, 1 + jitter))
+
+
+def run_due_refreshes(max_ingestions: int) -> list[int]:
+    """
+    Queue updates of the stored search parameters whose refresh is due.
+
+    The refresh interval of a row falls back to the one of its catalog. Rows without a scheduled refresh get a
+    random first refresh within one interval, so rows that got an interval together do not all refresh at once.
+    A row that missed several refreshes is refreshed once, and its next refresh is one interval from now.
+
+    :param max_ingestions: Maximum number of ingestions to queue, due rows beyond it wait for the next call
+    :return: Work session ids of the queued ingestions
+    """
+    now = datetime.datetime.utcnow()
+    refresh_interval = func.coalesce(StoredSearchParameters.refresh_interval_seconds,
+                                     PublicCatalog.refresh_interval_seconds)
+    rows = db.session.query(StoredSearchParameters, refresh_interval) \
+        .join(PublicCatalog, PublicCatalog.id == StoredSearchParameters.associated_catalog_id) \
+        .filter(refresh_interval > 0,
+                sqlalchemy.or_(StoredSearchParameters.next_refresh_at == None,
+                               StoredSearchParameters.next_refresh_at <= now)) \
+        .order_by(StoredSearchParameters.next_refresh_at).all()
+    due = []
+    refresh_intervals = {}
+    for row, refresh_interval_seconds in rows:
+        if row.next_refresh_at is None:
+            row.next_refresh_at = now + datetime.timedelta(seconds=random.uniform(0, refresh_interval_seconds))
+        else:
+            due.append(row)
+            refresh_intervals[row.id] = refresh_interval_seconds
+    db.session.commit()
+
+    callback_ids = []
+    for used_search_parameters, group in _plan_ingestion_groups(due):
+        if len(callback_ids) >= max_ingestions:
+            break
+        callback_id = _queue_group_update(used_search_parameters, group, full_refresh=False)
+        for row in group:
+            row.next_refresh_at = _next_refresh_at(now, refresh_intervals[row.id])
+        db.session.commit()
+        if callback_id is not None:
+            callback_ids.append(callback_id)
+    return callback_ids
+
+
+def set_public_catalog_refresh_interval(public_catalog_id: int, refresh_interval_seconds: int or None) \
+        -> Dict[any, any]:
+    """
+    Set how often the stored search parameters of a catalog are refreshed, unless they have their own interval.
+
+    :param public_catalog_id: Id of the public catalog
+    :param refresh_interval_seconds: Seconds between refreshes, None or 0 to not refresh periodically
+    :return: Updated public catalog
+    """
+    public_catalog: PublicCatalog = PublicCatalog.query.filter_by(id=public_catalog_id).first()
+    if public_catalog is None:
+        raise PublicCatalogDoesNotExistError
+    public_catalog.refresh_interval_seconds = refresh_interval_seconds or None
+    # rows following the catalog interval are rescheduled with the new one
+    StoredSearchParameters.query.filter_by(associated_catalog_id=public_catalog_id, refresh_interval_seconds=None) \
+        .update({StoredSearchParameters.next_refresh_at: None}, synchronize_session=False)
+    db.session.commit()
+    search_cache.get_collection_search_cache().bump(("public", public_catalog_id))
+    return public_catalog.as_dict()
+
+
+def set_stored_search_parameters_refresh_interval(parameter_id: int, refresh_interval_seconds: int or None) \
+        -> Dict[any, any]:
+    """
+    Set how often stored search parameters are refreshed, overriding the interval of their catalog.
+
+    :param parameter_id: Id of the stored search parameters
+    :param refresh_interval_seconds: Seconds between refreshes, None to follow the catalog interval, 0 to not
+        refresh periodically
+    :return: Updated stored search parameters
+    """
+    stored_search_parameters: StoredSearchParameters = StoredSearchParameters.query.filter_by(
+        id=parameter_id).first()
+    if stored_search_parameters is None:
+        raise StoredSearchParametersDoesNotExistError
+    stored_search_parameters.refresh_interval_seconds = refresh_interval_seconds
+    stored_search_parameters.next_refresh_at = None
+    db.session.commit()
+    return stored_search_parameters.as_dict()
+
+
 def remove_collection_from_public_catalog(catalog_id: int, collection_id: str):
     """
     Remove a collection from the public catalog.
@@ -605,6 +781,7 @@ def remove_collection_from_public_catalog(catalog_id: int, collection_id: str):
         raise PublicCollectionDoesNotExistError
     db.session.delete(public_catalog)
     db.session.commit()
+    search_cache.get_collection_search_cache().bump(("public", catalog_id))
     try:
         return stac_service.remove_public_collection_by_id_on_stac_api(collection_id)
     except CollectionDoesNotExistError:
@@ -632,21 +809,26 @@ def get_all_stored_search_parameters(public_catalog_id: int = None) -> [Dict[any
         return [i.as_dict() for i in data]
 
 
-def run_search_parameters(parameter_id: int) -> int:
+def run_search_parameters(parameter_id: int, full_refresh: bool = False) -> int:
     """
     Run a search parameter.
 
     :param parameter_id: Id of the search parameter to run
+    :param full_refresh: Ingest the full datetime window instead of the window since the last successful run
     :return: Work session id
+    :raises IncrementalWindowEmptyError: The datetime window ended before the last successful run
     """
     stored_search_parameters = StoredSearchParameters.query.filter_by(id=parameter_id).first()
     if stored_search_parameters is None:
         raise StoredSearchParametersDoesNotExistError
-    try:
-        used_search_parameters = json.loads(stored_search_parameters.used_search_parameters)
-        used_search_parameters["target_stac_catalog_url"] = current_app.config["READ_STAC_API_SERVER"]
-        used_search_parameters["update"] = True
-        microservice_response = _call_ingestion_microservice(used_search_parameters)
-        return microservice_response
-    except ValueError:
-        pass
+    used_search_parameters = json.loads(stored_search_parameters.used_search_parameters)
+    if not full_refresh:
+        used_search_parameters = _narrow_to_incremental_window(used_search_parameters,
+                                                               stored_search_parameters.last_successful_run_at)
+        if used_search_parameters is None:
+            raise IncrementalWindowEmptyError
+    used_search_parameters["target_stac_catalog_url"] = current_app.config["READ_STAC_API_SERVER"]
+    used_search_parameters["update"] = True
+    microservice_response = ingestion_job_service.enqueue_ingestion_job(used_search_parameters, LANE_INTERACTIVE)
+    _link_stored_search_parameters_to_status([stored_search_parameters], microservice_response)
+    return microservice_response
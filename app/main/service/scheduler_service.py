@@ -0,0 +1,63 @@
+"""
+Periodic refreshes of stored search parameters and housekeeping, run by manage.py run_scheduler.
+
+Only one scheduler is active at a time, further schedulers wait on an advisory lock and take over when the active
+one stops.
+"""
+import datetime
+import logging
+import time
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from . import public_catalogs_service
+from . import status_reporting_service
+from . import upload_session_service
+from .. import db
+from ..model.ingestion_job_model import IngestionJob, ACTIVE_JOB_STATES
+
+# Key of the session advisory lock held by the active scheduler
+_SCHEDULER_LOCK_KEY = 7_134_002
+
+
+def run_scheduler() -> None:
+    """
+    Schedule refreshes until the process is stopped.
+    """
+    lock_connection = db.engine.connect()
+    while not lock_connection.execute(select(func.pg_try_advisory_lock(_SCHEDULER_LOCK_KEY))).scalar():
+        time.sleep(current_app.config['SCHEDULER_POLL_SECONDS'])
+    logging.info("Scheduler started")
+    last_pruned_at = None
+    while True:
+        try:
+            queued = run_scheduled_refreshes()
+            if queued:
+                logging.info("Scheduler queued ingestions %s", queued)
+            prune_interval = current_app.config['SCHEDULER_PRUNE_INTERVAL_SECONDS']
+            now = datetime.datetime.utcnow()
+            if prune_interval > 0 and (last_pruned_at is None or
+                                       (now - last_pruned_at).total_seconds() >= prune_interval):
+                status_reporting_service.prune_stac_ingestion_statuses()
+                upload_session_service.prune_upload_sessions()
+                last_pruned_at = now
+        except Exception as e:
+            db.session.rollback()
+            logging.error("Scheduler error: " + str(e))
+        finally:
+            db.session.remove()
+        time.sleep(current_app.config['SCHEDULER_POLL_SECONDS'])
+
+
+def run_scheduled_refreshes() -> list[int]:
+    """
+    Queue the due refreshes that fit below SCHEDULER_MAX_ACTIVE_INGESTIONS.
+
+    :return: Work session ids of the queued ingestions
+    """
+    active = IngestionJob.query.filter(IngestionJob.state.in_(ACTIVE_JOB_STATES)).count()
+    free_slots = current_app.config['SCHEDULER_MAX_ACTIVE_INGESTIONS'] - active
+    if free_slots <= 0:
+        return []
+    return public_catalogs_service.run_due_refreshes(free_slots)
@@ -3,11 +3,12 @@ from datetime import datetime
 import mimetypes
 
 import pystac
-from flask import current_app
 from pyproj import CRS
 from rasterio.warp import transform_bounds
 from shapely.geometry import Polygon
 
+from ..util.blob_storage import get_blob_storage
+
 stac_extensions = {
     "eo": "https://stac-extensions.github.io/eo/v1.0.0/schema.json",
     "proj": "https://stac-extensions.github.io/projection/v1.0.0/schema.json",
@@ -59,18 +60,7 @@ def create_STAC_Item(metadata):
         properties=properties,
     )
 
-    connection_string = current_app.config["AZURE_STORAGE_CONNECTION_STRING"]
-    # split the connection string by ;
-    account_key = connection_string.split("AccountKey=")[1].split(";")[0]
-    connection_string_split = connection_string.split(";")
-    azure_params = {}
-    for param in connection_string_split:
-        param_split = param.split("=")
-        azure_params[param_split[0]] = param_split[1]
-    azure_params["AccountKey"] = account_key
-    account_name = azure_params["AccountName"]
-    endpoint_suffix = azure_params["EndpointSuffix"]
-    blob_url = f"https://{account_name}.blob.{endpoint_suffix}"
+    blob_url = get_blob_storage().blob_endpoint
 
     for asset in metadata["assets"]:
         # Remove extension from asset name
@@ -105,8 +95,7 @@ def create_STAC_Item(metadata):
         thumbnail_href = generate_url(
             thumbnail["name"],
             metadata["staticVariables"]["url"].split("/")[0:-1],
-            account_name,
-            endpoint_suffix,
+            blob_url,
         )
 
         item.add_asset(
@@ -121,8 +110,7 @@ def create_STAC_Item(metadata):
         href = generate_url(
             other_asset["name"],
             metadata["staticVariables"]["url"].split("/")[0:-1],
-            account_name,
-            endpoint_suffix,
+            blob_url,
         )
 
         if not other_asset["type"]:
@@ -281,9 +269,7 @@ def generate_thumbnail(metadata):
     return thumbnail[0] if thumbnail else None
 
 
-def generate_url(item_name, base_url, account_name, endpoint_suffix):
-    blob_url = f"https://{account_name}.blob.{endpoint_suffix}"
-
+def generate_url(item_name, base_url, blob_url):
     href = "/".join(base_url) + "/" + item_name
     if not href.startswith(blob_url):
         # if href starts does not start with slash add it
@@ -1,14 +1,53 @@
 import datetime
-from typing import Dict, Tuple, List
+import json
+import queue
+import time
+from typing import Dict, Iterator, Tuple, List
+
+from flask import current_app
+from sqlalchemy import case, func, select
 
 from app.main.model.public_catalogs_model import PublicCatalog
 from .. import db
-from ..model.status_reporting_model import StacIngestionStatus
+from ..model.status_reporting_model import COLLECTION_RESULT_NEWLY_STORED, COLLECTION_RESULT_UPDATED, \
+    StacIngestionCollectionResult, StacIngestionStatus
+from ..util import search_cache
+from ..util import status_notifications
+
+FINAL_STATES = ("succeeded", "failed")
+MAX_STATUS_PAGE_SIZE = 1000
+
 
+def get_stac_ingestion_statuses(public_catalog_id: int = None, state: str = None,
+                                started_after: datetime.datetime = None, started_before: datetime.datetime = None,
+                                limit: int = 100, offset: int = 0) -> Tuple[List[Dict[any, any]], int]:
+    """
+    Get a page of stac ingestion statuses, newest first.
 
-def get_all_stac_ingestion_statuses() -> List[Dict[any, any]]:
-    a: [StacIngestionStatus] = StacIngestionStatus.query.all()
-    return [i.as_dict() for i in a]
+    :param public_catalog_id: Only statuses of ingestions from this public catalog
+    :param state: Only statuses in this state
+    :param started_after: Only statuses of ingestions started at or after this time
+    :param started_before: Only statuses of ingestions started before this time
+    :param limit: Maximum number of statuses to return, capped at MAX_STATUS_PAGE_SIZE
+    :param offset: Number of statuses to skip
+    :return: Page of statuses and the number of statuses matching the filters
+    """
+    query = StacIngestionStatus.query
+    if public_catalog_id is not None:
+        query = query.join(PublicCatalog, PublicCatalog.url == StacIngestionStatus.source_stac_api_url) \
+            .filter(PublicCatalog.id == public_catalog_id)
+    if state is not None:
+        query = query.filter(StacIngestionStatus.state == state)
+    if started_after is not None:
+        query = query.filter(StacIngestionStatus.time_started >= started_after)
+    if started_before is not None:
+        query = query.filter(StacIngestionStatus.time_started < started_before)
+    total = query.order_by(None).count()
+    limit = max(0, min(limit, MAX_STATUS_PAGE_SIZE))
+    page: [StacIngestionStatus] = query.order_by(StacIngestionStatus.time_started.desc(),
+                                                 StacIngestionStatus.id.desc()) \
+        .limit(limit).offset(max(0, offset)).all()
+    return [i.as_dict() for i in page], total
 
 
 def get_stac_ingestion_status_by_id(id: str) -> Dict[any, any]:
@@ -40,25 +79,115 @@ def set_stac_ingestion_status_entry(
         updated_collections: List[str] = None, newly_stored_items_count: int = 0,
         updated_items_count: int = 0,
         already_stored_items_count: int = 0,
-        error_message=None) -> Tuple[Dict[any, any]]:
+        error_message=None, state: str = None, commit: bool = True) -> Tuple[Dict[any, any]]:
     a: StacIngestionStatus = StacIngestionStatus.query.get(status_id)
     a.newly_stored_collections_count = newly_stored_collections_count
     if newly_stored_collections is not None:
-        a.newly_stored_collections = ",".join(newly_stored_collections)
+        a.set_collections(COLLECTION_RESULT_NEWLY_STORED, newly_stored_collections)
     a.updated_collections_count = updated_collections_count
     if updated_collections is not None:
-        a.updated_collections = ",".join(updated_collections)
+        a.set_collections(COLLECTION_RESULT_UPDATED, updated_collections)
     a.newly_stored_items_count = newly_stored_items_count
     a.updated_items_count = updated_items_count
     a.already_stored_items_count = already_stored_items_count
     a.time_finished = datetime.datetime.utcnow()
     if error_message is not None:
         a.error_message = error_message
+    if state is not None:
+        a.state = state
     db.session.add(a)
+    status_notifications.notify_status_changed(status_id)
+    if commit:
+        db.session.commit()
+    return a.as_dict()
+
+
+def set_stac_ingestion_status_state(status_id: int, state: str, attempts: int = None,
+                                    error_message: str = None) -> None:
+    """
+    Report the state of the ingestion job behind a status entry without touching its counts.
+
+    :param status_id: Id of the status entry
+    :param state: One of queued, running, retrying, succeeded or failed
+    :param attempts: Number of times the job was dispatched so far
+    :param error_message: Error of the last attempt
+    """
+    a: StacIngestionStatus = StacIngestionStatus.query.get(status_id)
+    if a is None:
+        return
+    a.state = state
+    if attempts is not None:
+        a.attempts = attempts
+    if error_message is not None:
+        a.error_message = error_message
+    if state == "failed":
+        a.time_finished = datetime.datetime.utcnow()
+    db.session.add(a)
+    status_notifications.notify_status_changed(status_id)
+    db.session.commit()
+
+
+def report_stac_ingestion_progress(status_id: int, items_done: int, items_per_second: float = None,
+                                   current_collection: str = None) -> Dict[any, any]:
+    """
+    Store partial progress of a running ingestion and push it to the streams of the status.
+
+    :param status_id: Id of the status entry
+    :param items_done: Number of items processed so far
+    :param items_per_second: Current throughput of the ingester
+    :param current_collection: Collection the ingester is working on
+    :return: Updated status entry
+    """
+    a: StacIngestionStatus = StacIngestionStatus.query.get(status_id)
+    if a is None:
+        raise AttributeError("No stac ingestion status with id " + str(status_id))
+    a.items_done = items_done
+    a.items_per_second = items_per_second
+    a.current_collection = current_collection
+    a.progress_updated_at = datetime.datetime.utcnow()
+    status_notifications.notify_status_changed(status_id)
     db.session.commit()
     return a.as_dict()
 
 
+def stream_stac_ingestion_status(status_id: int) -> Iterator[str]:
+    """
+    Server-sent events with the status entry, sent whenever it changes, until the ingestion finished.
+
+    :param status_id: Id of the status entry
+    :return: Generator of server-sent event messages
+    """
+    listener = status_notifications.get_status_notification_listener()
+    # subscribe before the first read so no change in between is missed
+    subscription = listener.subscribe(status_id)
+    try:
+        deadline = time.monotonic() + current_app.config['STATUS_STREAM_MAX_SECONDS']
+        while True:
+            a: StacIngestionStatus = StacIngestionStatus.query.get(status_id)
+            data = a.as_dict() if a is not None else None
+            # do not hold a database connection while waiting for the next change
+            db.session.remove()
+            if data is None:
+                yield "event: error\ndata: " + json.dumps({"message": "No result found"}) + "\n\n"
+                return
+            yield "event: status\ndata: " + json.dumps(data) + "\n\n"
+            if data["state"] in FINAL_STATES:
+                return
+            while True:
+                try:
+                    subscription.get(timeout=current_app.config['STATUS_STREAM_KEEPALIVE_SECONDS'])
+                    break
+                except queue.Empty:
+                    if time.monotonic() > deadline:
+                        return
+                    yield ": keepalive\n\n"
+            # changes that arrived together are sent as one event
+            while not subscription.empty():
+                subscription.get_nowait()
+    finally:
+        listener.unsubscribe(status_id, subscription)
+
+
 def remove_stac_ingestion_status_entry(
         status_id: str) -> Tuple[Dict[any, any]]:
     a: StacIngestionStatus = StacIngestionStatus.query.filter_by(
@@ -66,3 +195,124 @@ def remove_stac_ingestion_status_entry(
     db.session.delete(a)
     db.session.commit()
     return a.as_dict()
+
+
+def prune_stac_ingestion_statuses(retention_days: float = None, batch_size: int = None) -> int:
+    """
+    Delete statuses of finished ingestions that started before the retention period, in batches.
+
+    Their collection results and ingestion jobs are deleted with them.
+
+    :param retention_days: Age in days of the statuses to delete, STAC_INGESTION_STATUS_RETENTION_DAYS if None
+    :param batch_size: Statuses deleted per transaction, STAC_INGESTION_STATUS_PRUNE_BATCH_SIZE if None
+    :return: Number of deleted statuses
+    """
+    if retention_days is None:
+        retention_days = current_app.config['STAC_INGESTION_STATUS_RETENTION_DAYS']
+    if batch_size is None:
+        batch_size = current_app.config['STAC_INGESTION_STATUS_PRUNE_BATCH_SIZE']
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        batch = db.session.query(StacIngestionStatus.id).filter(
+            StacIngestionStatus.time_started < cutoff,
+            StacIngestionStatus.state.in_(FINAL_STATES)).limit(batch_size).subquery()
+        count = StacIngestionStatus.query.filter(StacIngestionStatus.id.in_(select(batch.c.id))) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def get_ingestion_analytics(since: datetime.datetime, until: datetime.datetime, public_catalog_id: int = None,
+                            slowest_collections_limit: int = 5) -> Dict[str, any]:
+    """
+    Throughput, duration percentiles and failure rates of ingestions per source catalog.
+
+    Durations and throughput are taken over succeeded ingestions. The slowest collections of a source are the
+    collections stored or updated by its ingestions with the longest mean duration.
+
+    :param since: Only ingestions started at or after this time
+    :param until: Only ingestions started before this time
+    :param public_catalog_id: Only ingestions from this public catalog
+    :param slowest_collections_limit: Number of slowest collections reported per source catalog
+    :return: Analytics per source catalog
+    """
+    succeeded = StacIngestionStatus.state == "succeeded"
+    duration = func.extract("epoch", StacIngestionStatus.time_finished - StacIngestionStatus.time_started)
+    succeeded_duration = case((succeeded, duration))
+    items = (func.coalesce(StacIngestionStatus.newly_stored_items_count, 0) +
+             func.coalesce(StacIngestionStatus.updated_items_count, 0) +
+             func.coalesce(StacIngestionStatus.already_stored_items_count, 0))
+    window = [StacIngestionStatus.time_started >= since, StacIngestionStatus.time_started < until]
+    if public_catalog_id is not None:
+        window.append(StacIngestionStatus.source_stac_api_url == select(PublicCatalog.url).where(
+            PublicCatalog.id == public_catalog_id).scalar_subquery())
+
+    percentiles = (0.5, 0.9, 0.95, 0.99)
+    rows = db.session.query(
+        StacIngestionStatus.source_stac_api_url,
+        func.count().label("ingestions"),
+        func.count(case((succeeded, 1))).label("succeeded"),
+        func.count(case((StacIngestionStatus.state == "failed", 1))).label("failed"),
+        func.sum(case((succeeded, items))).label("items"),
+        func.sum(succeeded_duration).label("seconds"),
+        func.max(succeeded_duration).label("max_duration"),
+        *[func.percentile_cont(p).within_group(succeeded_duration).label(f"p{round(p * 100)}")
+          for p in percentiles]
+    ).filter(*window).group_by(StacIngestionStatus.source_stac_api_url).all()
+
+    collection_duration = db.session.query(
+        StacIngestionStatus.source_stac_api_url,
+        StacIngestionCollectionResult.collection_id,
+        func.count().label("ingestions"),
+        func.avg(duration).label("mean_duration"),
+        func.max(duration).label("max_duration"),
+        func.row_number().over(partition_by=StacIngestionStatus.source_stac_api_url,
+                               order_by=func.avg(duration).desc()).label("position")
+    ).join(StacIngestionCollectionResult,
+           StacIngestionCollectionResult.stac_ingestion_status_id == StacIngestionStatus.id) \
+        .filter(succeeded, *window) \
+        .group_by(StacIngestionStatus.source_stac_api_url, StacIngestionCollectionResult.collection_id).subquery()
+    slowest_collections = {}
+    for row in db.session.query(collection_duration).filter(
+            collection_duration.c.position <= slowest_collections_limit).order_by(
+            collection_duration.c.source_stac_api_url, collection_duration.c.position).all():
+        slowest_collections.setdefault(row.source_stac_api_url, []).append({
+            "collection_id": row.collection_id,
+            "ingestions": row.ingestions,
+            "mean_duration_seconds": _as_float(row.mean_duration),
+            "max_duration_seconds": _as_float(row.max_duration),
+        })
+
+    sources = []
+    for row in rows:
+        seconds = _as_float(row.seconds)
+        sources.append({
+            "source_stac_api_url": row.source_stac_api_url,
+            "ingestions": row.ingestions,
+            "succeeded": row.succeeded,
+            "failed": row.failed,
+            "failure_rate": row.failed / row.ingestions if row.ingestions else None,
+            "items": row.items or 0,
+            "items_per_second": row.items / seconds if row.items and seconds else None,
+            "duration_seconds": {
+                **{f"p{round(p * 100)}": _as_float(getattr(row, f"p{round(p * 100)}")) for p in percentiles},
+                "max": _as_float(row.max_duration),
+            },
+            "slowest_collections": slowest_collections.get(row.source_stac_api_url, []),
+        })
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "sources": sources,
+    }
+
+
+def _as_float(value) -> float or None:
+    return float(value) if value is not None else None
+
+
+def get_search_cache_statistics() -> Dict[str, any]:
+    return search_cache.get_collection_search_cache().stats()
@@ -0,0 +1,212 @@
+"""
+Resumable uploads of large files.
+
+A session is initiated for a blob of known size, after which its chunks can be sent in any order and sent again
+after a failure. Every chunk is staged as an uncommitted block whose id is made of the session id and the offset
+of the chunk, so the staged ranges can be read back from the block list of the blob. Completing the session commits
+the blocks that cover the blob from start to end.
+"""
+import datetime
+import uuid
+from typing import Dict, List, Tuple
+
+import azure.core.exceptions
+import sqlalchemy
+from azure.core import MatchConditions
+from azure.storage.blob import BlobBlock, ContentSettings
+from flask import current_app
+
+from .file_service import blob_name_for_item_file, invalidate_asset_listings
+from .. import db
+from ..custom_exceptions import InvalidUploadChunkError, UploadIncompleteError, \
+    UploadSessionAlreadyExistsError, UploadSessionDoesNotExistError
+from ..model.upload_session_model import UploadSession
+from ..util.blob_storage import get_blob_storage
+
+
+def _block_id(upload_id: str, offset: int) -> str:
+    # block ids of a blob must all have the same length. The session id keeps blocks left behind by an earlier,
+    # abandoned session for the same blob out of this one
+    return f"{upload_id}-{offset:015d}"
+
+
+def _get_upload_session(upload_id: str) -> UploadSession:
+    session = UploadSession.query.filter_by(id=upload_id).first()
+    if session is None:
+        raise UploadSessionDoesNotExistError
+    return session
+
+
+def _session_as_dict(session: UploadSession) -> Dict[str, any]:
+    data = session.as_dict()
+    data["max_chunk_size"] = current_app.config["UPLOAD_SESSION_MAX_CHUNK_SIZE"]
+    data["expires_at"] = str(session.updated_at +
+                             datetime.timedelta(seconds=current_app.config["UPLOAD_SESSION_TTL_SECONDS"]))
+    return data
+
+
+def create_upload_session(item_id: str, filename: str, size: int, content_type: str = None) -> Dict[str, any]:
+    """
+    Initiate a resumable upload.
+
+    The blob is named like in upload_filestream_to_blob.
+
+    :param item_id: Id of the item the file belongs to
+    :param filename: Name of the file
+    :param size: Size of the file in bytes
+    :param content_type: Content type the blob is stored with
+    :return: The session, including the upload_id chunks are sent to
+    """
+    if size < 0:
+        raise InvalidUploadChunkError("size must not be negative")
+    filename = blob_name_for_item_file(item_id, filename)
+    if get_blob_storage().container_client().get_blob_client(filename).exists():
+        raise FileExistsError
+
+    session = UploadSession(id=uuid.uuid4().hex, item_id=item_id, blob_name=filename, size=size,
+                            content_type=content_type)
+    db.session.add(session)
+    try:
+        db.session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        db.session.rollback()
+        raise UploadSessionAlreadyExistsError
+    return _session_as_dict(session)
+
+
+def upload_chunk(upload_id: str, offset: int, stream, length: int) -> Dict[str, any]:
+    """
+    Stage a chunk of a resumable upload, replacing a chunk sent earlier at the same offset.
+
+    :param upload_id: Id of the session
+    :param offset: Offset of the chunk in the file
+    :param stream: Data of the chunk
+    :param length: Size of the chunk in bytes
+    :return: Offset and length of the staged chunk
+    """
+    session = _get_upload_session(upload_id)
+    if offset < 0 or length <= 0 or offset + length > session.size:
+        raise InvalidUploadChunkError(f"Chunk must lie within the {session.size} bytes of the file")
+    if length > current_app.config["UPLOAD_SESSION_MAX_CHUNK_SIZE"]:
+        raise InvalidUploadChunkError(
+            f"Chunks must not be larger than {current_app.config['UPLOAD_SESSION_MAX_CHUNK_SIZE']} bytes")
+
+    blob_client = get_blob_storage().container_client().get_blob_client(session.blob_name)
+    blob_client.stage_block(_block_id(session.id, offset), stream, length=length)
+    session.updated_at = datetime.datetime.utcnow()
+    db.session.commit()
+    return {"offset": offset, "length": length}
+
+
+def _staged_chunks(session: UploadSession) -> List[Tuple[int, int, str]]:
+    blob_client = get_blob_storage().container_client().get_blob_client(session.blob_name)
+    try:
+        _, uncommitted = blob_client.get_block_list("uncommitted")
+    except azure.core.exceptions.ResourceNotFoundError:
+        # no chunk was staged yet
+        return []
+    prefix = session.id + "-"
+    return sorted((int(block.id[len(prefix):]), block.size, block.id)
+                  for block in uncommitted if block.id.startswith(prefix))
+
+
+def _received_ranges(chunks: List[Tuple[int, int, str]]) -> List[List[int]]:
+    ranges = []
+    for offset, size, _ in chunks:
+        if ranges and offset <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], offset + size)
+        else:
+            ranges.append([offset, offset + size])
+    return ranges
+
+
+def _missing_ranges(received: List[List[int]], size: int) -> List[List[int]]:
+    missing = []
+    position = 0
+    for start, end in received:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+def get_upload_session_status(upload_id: str) -> Dict[str, any]:
+    """
+    Get a resumable upload with the byte ranges received so far, as [start, end) pairs.
+
+    :param upload_id: Id of the session
+    """
+    session = _get_upload_session(upload_id)
+    received = _received_ranges(_staged_chunks(session))
+    data = _session_as_dict(session)
+    data["received_ranges"] = received
+    data["missing_ranges"] = _missing_ranges(received, session.size)
+    data["bytes_received"] = sum(end - start for start, end in received)
+    return data
+
+
+def complete_upload_session(upload_id: str) -> Dict[str, any]:
+    """
+    Commit the chunks of a resumable upload and end the session.
+
+    Starting at offset 0, each chunk is followed by the chunk at its end. Chunks outside of this chain, for example
+    ones sent again with a different size, are dropped.
+
+    :param upload_id: Id of the session
+    :return: Name, url and size of the stored blob
+    """
+    session = _get_upload_session(upload_id)
+    chunks = {offset: (size, block_id) for offset, size, block_id in _staged_chunks(session)}
+    block_ids = []
+    position = 0
+    while position < session.size:
+        if position not in chunks:
+            raise UploadIncompleteError(f"No chunk starts at offset {position}")
+        size, block_id = chunks[position]
+        block_ids.append(block_id)
+        position += size
+
+    storage = get_blob_storage()
+    blob_client = storage.container_client().get_blob_client(session.blob_name)
+    try:
+        blob_client.commit_block_list(
+            [BlobBlock(block_id) for block_id in block_ids],
+            content_settings=ContentSettings(content_type=session.content_type) if session.content_type else None,
+            match_condition=MatchConditions.IfMissing,
+        )
+    except (azure.core.exceptions.ResourceExistsError, azure.core.exceptions.ResourceModifiedError):
+        raise FileExistsError
+    invalidate_asset_listings()
+    data = {"blob_name": session.blob_name, "url": storage.blob_url(session.blob_name), "size": session.size}
+    db.session.delete(session)
+    db.session.commit()
+    return data
+
+
+def abort_upload_session(upload_id: str) -> None:
+    """
+    End a resumable upload without storing the file. Its staged chunks are discarded by the storage account.
+
+    :param upload_id: Id of the session
+    """
+    db.session.delete(_get_upload_session(upload_id))
+    db.session.commit()
+
+
+def prune_upload_sessions(ttl_seconds: float = None) -> int:
+    """
+    Delete sessions that received no chunk within the ttl, which frees their blob names for new uploads.
+
+    Uncommitted blocks are discarded by the storage account after a week.
+
+    :param ttl_seconds: Age of the last chunk of the sessions to delete, UPLOAD_SESSION_TTL_SECONDS if None
+    :return: Number of deleted sessions
+    """
+    if ttl_seconds is None:
+        ttl_seconds = current_app.config["UPLOAD_SESSION_TTL_SECONDS"]
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)
+    deleted = UploadSession.query.filter(UploadSession.updated_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,176 @@
+"""
+Access to the Azure blob storage account configured by AZURE_STORAGE_CONNECTION_STRING.
+
+Every worker process holds one storage context, created on first use, which keeps the parsed account
+parameters, a blob service client over a pooled transport and the container clients handed out so far.
+"""
+import datetime
+import os
+import threading
+from typing import Dict, Tuple
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobSasPermissions, BlobServiceClient, ContainerClient, ContainerSasPermissions, \
+    generate_blob_sas, generate_container_sas
+from flask import current_app
+
+# Well known account of the Azurite emulator, used for UseDevelopmentStorage=true
+DEVELOPMENT_STORAGE_ACCOUNT_NAME = "devstoreaccount1"
+DEVELOPMENT_STORAGE_ACCOUNT_KEY = ("Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq"
+                                   "/K1SZFPTOtr/KBHBeksoGMGw==")
+DEVELOPMENT_STORAGE_BLOB_ENDPOINT = "http://127.0.0.1:10000/devstoreaccount1"
+# Blobs up to this size are uploaded and downloaded in a single request
+MAX_SINGLE_PUT_SIZE = 64 * 1024 * 1024
+MAX_SINGLE_GET_SIZE = 64 * 1024 * 1024
+# Size of the requests of downloads that are processed while they are being received
+DEFAULT_STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_connection_string(connection_string: str) -> Dict[str, str]:
+    """
+    Parse a storage account connection string into its parameters.
+
+    Values may contain "=", as account keys do. UseDevelopmentStorage=true is expanded to the account of the
+    Azurite emulator, a DevelopmentStorageProxyUri replaces the host of its endpoint.
+
+    :param connection_string: Connection string of the form Key=Value;Key=Value
+    :return: Parameters, always including AccountName, AccountKey and BlobEndpoint
+    """
+    params = {}
+    for part in connection_string.split(";"):
+        if not part.strip():
+            continue
+        if "=" not in part:
+            raise ValueError("Invalid storage connection string parameter: " + part.strip())
+        key, value = part.split("=", 1)
+        params[key.strip()] = value.strip()
+
+    if params.get("UseDevelopmentStorage", "").lower() == "true":
+        params.setdefault("AccountName", DEVELOPMENT_STORAGE_ACCOUNT_NAME)
+        params.setdefault("AccountKey", DEVELOPMENT_STORAGE_ACCOUNT_KEY)
+        blob_endpoint = DEVELOPMENT_STORAGE_BLOB_ENDPOINT
+        if "DevelopmentStorageProxyUri" in params:
+            blob_endpoint = params["DevelopmentStorageProxyUri"].rstrip("/") + ":10000/" + params["AccountName"]
+        params.setdefault("BlobEndpoint", blob_endpoint)
+
+    if "AccountName" not in params or "AccountKey" not in params:
+        raise ValueError("Storage connection string must contain AccountName and AccountKey")
+    if "BlobEndpoint" not in params:
+        protocol = params.get("DefaultEndpointsProtocol", "https")
+        endpoint_suffix = params.get("EndpointSuffix", "core.windows.net")
+        params["BlobEndpoint"] = f"{protocol}://{params['AccountName']}.blob.{endpoint_suffix}"
+    params["BlobEndpoint"] = params["BlobEndpoint"].rstrip("/")
+    return params
+
+
+class BlobStorage:
+    def __init__(self, connection_string: str, default_container: str, pool_size: int,
+                 stream_chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE):
+        params = parse_connection_string(connection_string)
+        self.account_name = params["AccountName"]
+        self.account_key = params["AccountKey"]
+        self.blob_endpoint = params["BlobEndpoint"]
+        self.default_container = default_container
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.service_client = BlobServiceClient(
+            self.blob_endpoint,
+            credential={"account_name": self.account_name, "account_key": self.account_key},
+            transport=RequestsTransport(session=self._session, session_owner=False),
+            max_single_put_size=MAX_SINGLE_PUT_SIZE,
+            max_single_get_size=MAX_SINGLE_GET_SIZE,
+        )
+        # same account and connections, but downloads are received in requests of stream_chunk_size
+        self._stream_service_client = BlobServiceClient(
+            self.blob_endpoint,
+            credential={"account_name": self.account_name, "account_key": self.account_key},
+            transport=RequestsTransport(session=self._session, session_owner=False),
+            max_single_get_size=stream_chunk_size,
+            max_chunk_get_size=stream_chunk_size,
+        )
+        self._container_clients: Dict[Tuple[str, bool], ContainerClient] = {}
+
+    def container_client(self, container: str = None, streaming: bool = False) -> ContainerClient:
+        """
+        Get the client of a container, shared by all callers in this worker.
+
+        :param container: Name of the container, AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS when not given
+        :param streaming: Download in requests of stream_chunk_size, so the chunks of a download can be processed
+            before all of it was received. Otherwise blobs up to MAX_SINGLE_GET_SIZE are fetched in one request
+        """
+        key = (container or self.default_container, streaming)
+        client = self._container_clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._container_clients.get(key)
+                if client is None:
+                    service_client = self._stream_service_client if streaming else self.service_client
+                    client = service_client.get_container_client(key[0])
+                    self._container_clients[key] = client
+        return client
+
+    def container_url(self, container: str = None) -> str:
+        return f"{self.blob_endpoint}/{quote(container or self.default_container)}"
+
+    def blob_url(self, blob_name: str, container: str = None) -> str:
+        """
+        Get the url of a blob, without any SAS token.
+
+        :param blob_name: Name of the blob, may contain slashes
+        :param container: Name of the container, AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS when not given
+        """
+        return f"{self.container_url(container)}/{quote(blob_name, safe='/~')}"
+
+    def blob_sas(self, blob_name: str, permission: BlobSasPermissions, expiry: datetime.datetime,
+                 container: str = None) -> str:
+        """
+        Issue a SAS token for a blob, signed with the account key.
+
+        :param blob_name: Name of the blob
+        :param permission: Permissions the token grants
+        :param expiry: Time the token expires at, in UTC
+        :param container: Name of the container, AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS when not given
+        """
+        return generate_blob_sas(self.account_name, container or self.default_container, blob_name,
+                                 account_key=self.account_key, permission=permission, expiry=expiry)
+
+    def container_sas(self, permission: ContainerSasPermissions, expiry: datetime.datetime,
+                      container: str = None) -> str:
+        """
+        Issue a SAS token for a whole container, signed with the account key.
+        """
+        return generate_container_sas(self.account_name, container or self.default_container,
+                                      account_key=self.account_key, permission=permission, expiry=expiry)
+
+    def close(self) -> None:
+        self.service_client.close()
+        self._stream_service_client.close()
+        self._session.close()
+
+
+_blob_storage: BlobStorage or None = None
+_blob_storage_pid = None
+_blob_storage_lock = threading.Lock()
+
+
+def get_blob_storage() -> BlobStorage:
+    """
+    Get the storage context of this worker, creating it from the app config on first use.
+    """
+    global _blob_storage, _blob_storage_pid
+    # a forked worker must not share the pooled connections of its parent
+    if _blob_storage is None or _blob_storage_pid != os.getpid():
+        with _blob_storage_lock:
+            if _blob_storage is None or _blob_storage_pid != os.getpid():
+                _blob_storage = BlobStorage(current_app.config["AZURE_STORAGE_CONNECTION_STRING"],
+                                            current_app.config["AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS"],
+                                            current_app.config["AZURE_STORAGE_CONNECTION_POOL_SIZE"],
+                                            current_app.config["RETRIEVE_FILE_CHUNK_SIZE"])
+                _blob_storage_pid = os.getpid()
+    return _blob_storage
@@ -0,0 +1,550 @@
+"""
+Parsing of CQL2 filters and compilation into SQLAlchemy expressions.
+
+Filters are accepted as CQL2-JSON or CQL2-text. CQL2-text is parsed into the CQL2-JSON form first, which is
+also the canonical form used in cache keys. Only properties listed in the queryables of the searched model can
+be referenced, so a filter can never reach columns that are not meant to be exposed.
+"""
+import datetime
+import json
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+import shapely.geometry
+import shapely.wkt
+from sqlalchemy import and_, false, func, literal, not_, or_, true
+
+from ..custom_exceptions import InvalidFilterError
+
+CQL2_TEXT = "cql2-text"
+CQL2_JSON = "cql2-json"
+
+COMPARISON_OPERATORS = {"=", "<>", "<", "<=", ">", ">="}
+SPATIAL_OPERATORS = {"s_intersects", "s_disjoint", "s_within", "s_contains", "s_equals", "s_touches",
+                     "s_overlaps", "s_crosses"}
+TEMPORAL_OPERATORS = {"t_intersects", "t_disjoint", "t_before", "t_after", "t_during", "t_contains", "t_equals"}
+WKT_GEOMETRY_TYPES = {"POINT", "LINESTRING", "POLYGON", "MULTIPOINT", "MULTILINESTRING", "MULTIPOLYGON",
+                      "GEOMETRYCOLLECTION"}
+
+# kind of the values of scalar queryables, literals are checked against it
+_SCALAR_VALUE_KINDS = {"string": "string", "integer": "number", "timestamp": "timestamp"}
+
+_QUERYABLE_JSON_SCHEMA_TYPES = {
+    "string": {"type": "string"},
+    "integer": {"type": "integer"},
+    "timestamp": {"type": "string", "format": "date-time"},
+    "interval": {"type": "string", "format": "date-time"},
+    "geometry": {"$ref": "https://geojson.org/schema/Geometry.json"},
+}
+
+
+class Queryable:
+    """
+    A property that filters may reference.
+
+    :param kind: One of string, integer, timestamp, interval or geometry
+    :param expression: Column expression, or a (start, end) tuple of column expressions for intervals
+    :param description: Description shown in the queryables document
+    :param intersects: Optional callable building an intersects filter from EWKT, used for geometries to
+        benefit from prefiltering
+    """
+
+    def __init__(self, kind: str, expression: Any, description: str, intersects: Callable[[str], Any] = None):
+        self.kind = kind
+        self.expression = expression
+        self.description = description
+        self.intersects = intersects
+
+
+def queryables_as_json_schema(queryables: Dict[str, Queryable], schema_id: str) -> Dict[str, any]:
+    """
+    Describe queryables as the JSON schema served by an OGC API queryables endpoint.
+    """
+    properties = {}
+    for name, queryable in queryables.items():
+        properties[name] = dict(_QUERYABLE_JSON_SCHEMA_TYPES[queryable.kind], description=queryable.description)
+    return {
+        "$schema": "https://json-schema.org/draft/2019-09/schema",
+        "$id": schema_id,
+        "type": "object",
+        "title": "Queryables",
+        "properties": properties,
+        "additionalProperties": False,
+    }
+
+
+def parse_filter(filter_value: str or Dict[str, any] or None, filter_lang: str = None) -> Dict[str, any] or None:
+    """
+    Parse a filter into its CQL2-JSON form.
+
+    :param filter_value: CQL2-text string, CQL2-JSON object or CQL2-JSON string, None for no filter
+    :param filter_lang: cql2-text or cql2-json, guessed from the type of filter_value when not given
+    :return: Filter in CQL2-JSON form, None for no filter
+    """
+    if filter_value is None or filter_value == "":
+        return None
+    if filter_lang is None:
+        filter_lang = CQL2_TEXT if isinstance(filter_value, str) else CQL2_JSON
+    filter_lang = filter_lang.lower()
+    if filter_lang == CQL2_TEXT:
+        if not isinstance(filter_value, str):
+            raise InvalidFilterError("A cql2-text filter must be a string")
+        return _TextParser(filter_value).parse()
+    if filter_lang == CQL2_JSON:
+        if isinstance(filter_value, str):
+            try:
+                filter_value = json.loads(filter_value)
+            except json.decoder.JSONDecodeError as e:
+                raise InvalidFilterError(f"Filter is not valid JSON: {e}")
+        if not isinstance(filter_value, (dict, bool)):
+            raise InvalidFilterError("A cql2-json filter must be an object")
+        return filter_value
+    raise InvalidFilterError(f"Unsupported filter language {filter_lang}, use {CQL2_TEXT} or {CQL2_JSON}")
+
+
+def canonical_filter(filter_expression: Dict[str, any] or None) -> str or None:
+    """
+    Serialize a CQL2-JSON filter deterministically, for use in cache keys.
+    """
+    if filter_expression is None:
+        return None
+    return json.dumps(filter_expression, sort_keys=True, separators=(",", ":"))
+
+
+def compile_filter(filter_expression: Dict[str, any] or bool, queryables: Dict[str, Queryable]):
+    """
+    Compile a CQL2-JSON filter into an SQLAlchemy boolean expression.
+
+    :param filter_expression: Filter in CQL2-JSON form
+    :param queryables: Properties the filter may reference
+    :return: SQLAlchemy expression usable in a where clause
+    """
+    return _Compiler(queryables).boolean(filter_expression)
+
+
+def _parse_instant(value: str) -> datetime.datetime:
+    if not isinstance(value, str):
+        raise InvalidFilterError(f"Expected a timestamp string, got {value!r}")
+    try:
+        if len(value) == 10:
+            return datetime.datetime.strptime(value, "%Y-%m-%d")
+        instant = datetime.datetime.fromisoformat(re.sub(r"[zZ]$", "+00:00", value))
+    except ValueError:
+        raise InvalidFilterError(f"Invalid timestamp {value}")
+    if instant.tzinfo is not None:
+        # temporal extents are stored as naive UTC timestamps
+        instant = instant.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return instant
+
+
+class _Compiler:
+
+    def __init__(self, queryables: Dict[str, Queryable]):
+        self.queryables = queryables
+
+    def _args(self, node: Dict[str, any], count: int = None) -> List[any]:
+        args = node.get("args")
+        if not isinstance(args, list):
+            raise InvalidFilterError(f"Operator {node.get('op')} requires a list of args")
+        if count is not None and len(args) != count:
+            raise InvalidFilterError(f"Operator {node.get('op')} requires {count} args")
+        return args
+
+    def _queryable(self, node: any, kinds: Tuple[str, ...]) -> Queryable:
+        if not isinstance(node, dict) or "property" not in node:
+            raise InvalidFilterError(f"Expected a property, got {node!r}")
+        name = node["property"]
+        if name not in self.queryables:
+            raise InvalidFilterError(f"{name} is not a queryable property, use one of: "
+                                     + ", ".join(sorted(self.queryables)))
+        queryable = self.queryables[name]
+        if queryable.kind not in kinds:
+            raise InvalidFilterError(f"Property {name} can not be used here")
+        return queryable
+
+    def boolean(self, node: any):
+        if isinstance(node, bool):
+            return true() if node else false()
+        if not isinstance(node, dict) or "op" not in node:
+            raise InvalidFilterError(f"Expected a boolean expression, got {node!r}")
+        op = str(node["op"]).lower()
+        if op in ("and", "or"):
+            args = self._args(node)
+            if len(args) == 0:
+                raise InvalidFilterError(f"Operator {op} requires at least one arg")
+            clauses = [self.boolean(arg) for arg in args]
+            return and_(*clauses) if op == "and" else or_(*clauses)
+        if op == "not":
+            return not_(self.boolean(self._args(node, 1)[0]))
+        if op in COMPARISON_OPERATORS:
+            left, right = self.comparable_scalars(op, self._args(node, 2))
+            return left.op(op)(right) if op != "=" else left == right
+        if op == "like":
+            value, pattern = self.comparable_scalars(op, self._args(node, 2), kind="string")
+            return value.like(pattern)
+        if op == "between":
+            value, low, high = self.comparable_scalars(op, self._args(node, 3))
+            return value.between(low, high)
+        if op == "in":
+            args = self._args(node, 2)
+            if not isinstance(args[1], list) or len(args[1]) == 0:
+                raise InvalidFilterError("Operator in requires a non empty list of values")
+            value, *values = self.comparable_scalars(op, [args[0], *args[1]])
+            return value.in_(values)
+        if op == "isnull":
+            return self.scalar(self._args(node, 1)[0])[0].is_(None)
+        if op in SPATIAL_OPERATORS:
+            return self.spatial(op, *self._args(node, 2))
+        if op in TEMPORAL_OPERATORS:
+            return self.temporal(op, *self._args(node, 2))
+        raise InvalidFilterError(f"Unsupported operator {node['op']}")
+
+    def scalar(self, node: any) -> Tuple[Any, str]:
+        """
+        Compile a property or literal.
+
+        :return: The expression and the kind of its values, one of string, number, timestamp or boolean
+        """
+        if isinstance(node, bool):
+            return literal(node), "boolean"
+        if isinstance(node, (int, float)):
+            return literal(node), "number"
+        if isinstance(node, str):
+            return literal(node), "string"
+        if isinstance(node, dict):
+            if "property" in node:
+                queryable = self._queryable(node, tuple(_SCALAR_VALUE_KINDS))
+                return queryable.expression, _SCALAR_VALUE_KINDS[queryable.kind]
+            if "timestamp" in node:
+                return literal(_parse_instant(node["timestamp"])), "timestamp"
+            if "date" in node:
+                return literal(_parse_instant(node["date"])), "timestamp"
+            if str(node.get("op", "")).lower() == "casei":
+                expression, kind = self.scalar(self._args(node, 1)[0])
+                if kind != "string":
+                    raise InvalidFilterError(f"casei requires a string, got a {kind}")
+                return func.lower(expression), "string"
+        raise InvalidFilterError(f"Unsupported value {node!r}")
+
+    def comparable_scalars(self, op: str, nodes: List[any], kind: str = None) -> List[Any]:
+        """
+        Compile the operands of a comparison, which must all be of the same kind, so that mismatches are reported
+        as invalid filters instead of failing in the database.
+
+        :param kind: Kind the operands must be of, any single kind when not given
+        """
+        operands = [self.scalar(node) for node in nodes]
+        kinds = {operand_kind for _, operand_kind in operands}
+        if kinds == {"timestamp", "string"} and kind is None:
+            # timestamps written as plain strings, as in datetime > '2021-01-01'
+            operands = [(literal(_parse_instant(node)), "timestamp") if isinstance(node, str) else operand
+                        for node, operand in zip(nodes, operands)]
+            kinds = {"timestamp"}
+        if len(kinds) > 1:
+            raise InvalidFilterError(f"Operator {op} can not compare {' and '.join(sorted(kinds))} values")
+        if kind is not None and kinds != {kind}:
+            raise InvalidFilterError(f"Operator {op} requires {kind} values, got {kinds.pop()} values")
+        return [expression for expression, _ in operands]
+
+    def spatial(self, op: str, property_node: any, geometry_node: any):
+        queryable = self._queryable(property_node, ("geometry",))
+        try:
+            if isinstance(geometry_node, dict) and "bbox" in geometry_node:
+                bbox = geometry_node["bbox"]
+                if len(bbox) == 6:
+                    bbox = [bbox[0], bbox[1], bbox[3], bbox[4]]
+                geometry = shapely.geometry.box(*bbox)
+            else:
+                geometry = shapely.geometry.shape(geometry_node)
+        except Exception:
+            raise InvalidFilterError(f"Invalid geometry {geometry_node!r}")
+        geometry_ewkt = f"SRID=4326;{geometry.wkt}"
+        column = queryable.expression
+        if op in ("s_intersects", "s_disjoint"):
+            if queryable.intersects is not None:
+                intersects = queryable.intersects(geometry_ewkt)
+            else:
+                intersects = column.ST_Intersects(geometry_ewkt)
+            return intersects if op == "s_intersects" else not_(intersects)
+        return {
+            "s_within": column.ST_Within,
+            "s_contains": column.ST_Contains,
+            "s_equals": column.ST_Equals,
+            "s_touches": column.ST_Touches,
+            "s_overlaps": column.ST_Overlaps,
+            "s_crosses": column.ST_Crosses,
+        }[op](geometry_ewkt)
+
+    def _temporal_literal(self, node: any) -> Tuple[datetime.datetime or None, datetime.datetime or None]:
+        if isinstance(node, dict):
+            if "timestamp" in node:
+                instant = _parse_instant(node["timestamp"])
+                return instant, instant
+            if "date" in node:
+                instant = _parse_instant(node["date"])
+                return instant, instant
+            if "interval" in node and isinstance(node["interval"], list) and len(node["interval"]) == 2:
+                bounds = []
+                for bound in node["interval"]:
+                    if isinstance(bound, dict):
+                        bound = bound.get("timestamp", bound.get("date"))
+                    bounds.append(None if bound == ".." else _parse_instant(bound))
+                return bounds[0], bounds[1]
+        raise InvalidFilterError(f"Expected a timestamp, date or interval, got {node!r}")
+
+    def temporal(self, op: str, property_node: any, value_node: any):
+        queryable = self._queryable(property_node, ("interval", "timestamp"))
+        if queryable.kind == "interval":
+            start, end = queryable.expression
+        else:
+            start = end = queryable.expression
+        value_start, value_end = self._temporal_literal(value_node)
+
+        # missing bounds of both the property and the value are treated as open ended
+        def starts_before(instant):
+            return or_(start == None, start <= instant)
+
+        def ends_after(instant):
+            return or_(end == None, end >= instant)
+
+        intersects = and_(true(),
+                          *([starts_before(value_end)] if value_end else []),
+                          *([ends_after(value_start)] if value_start else []))
+        if op == "t_intersects":
+            return intersects
+        if op == "t_disjoint":
+            return not_(intersects)
+        if op == "t_before":
+            return and_(end != None, end < value_start) if value_start else false()
+        if op == "t_after":
+            return and_(start != None, start > value_end) if value_end else false()
+        if op == "t_during":
+            return and_(true(),
+                        *([start != None, start >= value_start] if value_start else []),
+                        *([end != None, end <= value_end] if value_end else []))
+        if op == "t_contains":
+            return and_(starts_before(value_start) if value_start else start == None,
+                        ends_after(value_end) if value_end else end == None)
+        if op == "t_equals":
+            return and_(start == value_start if value_start else start == None,
+                        end == value_end if value_end else end == None)
+        raise InvalidFilterError(f"Unsupported operator {op}")
+
+
+_TOKEN_RE = re.compile(r"""
+    (?P<string>'(?:[^']|'')*')
+    |(?P<number>-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<operator><>|!=|<=|>=|=|<|>)
+    |(?P<punctuation>[(),])
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<identifier>[A-Za-z_][A-Za-z0-9_:.]*)
+""", re.VERBOSE)
+
+
+def _tokenize(text: str) -> List[Tuple[str, str, int, int]]:
+    tokens = []
+    position = 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position >= len(text):
+            return tokens
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise InvalidFilterError(f"Unexpected character {text[position]!r} at position {position}")
+        tokens.append((match.lastgroup, match.group(), match.start(), match.end()))
+        position = match.end()
+
+
+class _TextParser:
+    """
+    Recursive descent parser turning CQL2-text into CQL2-JSON.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.index = 0
+
+    def parse(self) -> Dict[str, any] or bool:
+        expression = self._or()
+        if self._peek() is not None:
+            raise InvalidFilterError(f"Unexpected {self._peek()[1]!r} at position {self._peek()[2]}")
+        return expression
+
+    def _peek(self, offset: int = 0):
+        if self.index + offset < len(self.tokens):
+            return self.tokens[self.index + offset]
+        return None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise InvalidFilterError("Unexpected end of filter")
+        self.index += 1
+        return token
+
+    def _is_keyword(self, token, *keywords: str) -> bool:
+        return token is not None and token[0] == "identifier" and token[1].upper() in keywords
+
+    def _is_punctuation(self, token, value: str) -> bool:
+        return token is not None and token[0] == "punctuation" and token[1] == value
+
+    def _accept_keyword(self, *keywords: str) -> bool:
+        if self._is_keyword(self._peek(), *keywords):
+            self.index += 1
+            return True
+        return False
+
+    def _expect_punctuation(self, value: str) -> None:
+        token = self._next()
+        if token[0] != "punctuation" or token[1] != value:
+            raise InvalidFilterError(f"Expected {value!r} at position {token[2]}, got {token[1]!r}")
+
+    def _or(self):
+        args = [self._and()]
+        while self._accept_keyword("OR"):
+            args.append(self._and())
+        return args[0] if len(args) == 1 else {"op": "or", "args": args}
+
+    def _and(self):
+        args = [self._not()]
+        while self._accept_keyword("AND"):
+            args.append(self._not())
+        return args[0] if len(args) == 1 else {"op": "and", "args": args}
+
+    def _not(self):
+        if self._accept_keyword("NOT"):
+            return {"op": "not", "args": [self._not()]}
+        return self._predicate()
+
+    def _predicate(self):
+        token = self._peek()
+        if self._is_punctuation(token, "("):
+            self.index += 1
+            expression = self._or()
+            self._expect_punctuation(")")
+            return expression
+        if token is not None and token[0] == "identifier" and self._is_punctuation(self._peek(1), "(") \
+                and token[1].lower() in SPATIAL_OPERATORS | TEMPORAL_OPERATORS:
+            self.index += 2
+            first = self._scalar()
+            self._expect_punctuation(",")
+            second = self._scalar()
+            self._expect_punctuation(")")
+            return {"op": token[1].lower(), "args": [first, second]}
+
+        left = self._scalar()
+        token = self._peek()
+        if token is not None and token[0] == "operator":
+            self.index += 1
+            operator = "<>" if token[1] == "!=" else token[1]
+            return {"op": operator, "args": [left, self._scalar()]}
+        if self._accept_keyword("IS"):
+            negated = self._accept_keyword("NOT")
+            if not self._accept_keyword("NULL"):
+                raise InvalidFilterError("Expected NULL after IS")
+            expression = {"op": "isNull", "args": [left]}
+            return {"op": "not", "args": [expression]} if negated else expression
+        negated = self._accept_keyword("NOT")
+        if self._accept_keyword("LIKE"):
+            expression = {"op": "like", "args": [left, self._scalar()]}
+        elif self._accept_keyword("BETWEEN"):
+            low = self._scalar()
+            if not self._accept_keyword("AND"):
+                raise InvalidFilterError("Expected AND in BETWEEN")
+            expression = {"op": "between", "args": [left, low, self._scalar()]}
+        elif self._accept_keyword("IN"):
+            self._expect_punctuation("(")
+            values = [self._scalar()]
+            while self._is_punctuation(self._peek(), ","):
+                self.index += 1
+                values.append(self._scalar())
+            self._expect_punctuation(")")
+            expression = {"op": "in", "args": [left, values]}
+        elif not negated and isinstance(left, bool):
+            return left
+        else:
+            raise InvalidFilterError(f"Expected a comparison after {left!r}")
+        return {"op": "not", "args": [expression]} if negated else expression
+
+    def _string(self) -> str:
+        token = self._next()
+        if token[0] != "string":
+            raise InvalidFilterError(f"Expected a string at position {token[2]}, got {token[1]!r}")
+        return token[1][1:-1].replace("''", "'")
+
+    def _function_args(self, parse_arg: Callable[[], any]) -> List[any]:
+        self._expect_punctuation("(")
+        args = [parse_arg()]
+        while self._is_punctuation(self._peek(), ","):
+            self.index += 1
+            args.append(parse_arg())
+        self._expect_punctuation(")")
+        return args
+
+    def _interval_bound(self) -> str:
+        if self._accept_keyword("TIMESTAMP", "DATE"):
+            return self._function_args(self._string)[0]
+        return self._string()
+
+    def _number(self) -> float:
+        token = self._next()
+        if token[0] != "number":
+            raise InvalidFilterError(f"Expected a number at position {token[2]}, got {token[1]!r}")
+        return float(token[1])
+
+    def _wkt(self, start_token) -> Dict[str, any]:
+        depth = 0
+        end = start_token[3]
+        while True:
+            token = self._next()
+            end = token[3]
+            if self._is_punctuation(token, "("):
+                depth += 1
+            elif self._is_punctuation(token, ")"):
+                depth -= 1
+                if depth == 0:
+                    break
+            elif depth == 0 and self._is_keyword(token, "EMPTY"):
+                break
+        try:
+            geometry = shapely.wkt.loads(self.text[start_token[2]:end])
+        except Exception:
+            raise InvalidFilterError(f"Invalid geometry at position {start_token[2]}")
+        return json.loads(json.dumps(shapely.geometry.mapping(geometry)))
+
+    def _scalar(self):
+        token = self._next()
+        kind, value = token[0], token[1]
+        if kind == "string":
+            return value[1:-1].replace("''", "'")
+        if kind == "number":
+            return int(value) if re.fullmatch(r"-?\d+", value) else float(value)
+        if kind == "quoted":
+            return {"property": value[1:-1].replace('""', '"')}
+        if kind != "identifier":
+            raise InvalidFilterError(f"Unexpected {value!r} at position {token[2]}")
+        keyword = value.upper()
+        if keyword in ("TRUE", "FALSE"):
+            return keyword == "TRUE"
+        if self._is_punctuation(self._peek(), "("):
+            if keyword == "TIMESTAMP":
+                return {"timestamp": self._function_args(self._string)[0]}
+            if keyword == "DATE":
+                return {"date": self._function_args(self._string)[0]}
+            if keyword == "INTERVAL":
+                bounds = self._function_args(self._interval_bound)
+                if len(bounds) != 2:
+                    raise InvalidFilterError("INTERVAL requires a start and an end")
+                return {"interval": bounds}
+            if keyword == "BBOX":
+                bbox = self._function_args(self._number)
+                if len(bbox) not in (4, 6):
+                    raise InvalidFilterError("BBOX requires 4 or 6 numbers")
+                return {"bbox": bbox}
+            if keyword == "CASEI":
+                return {"op": "casei", "args": self._function_args(self._scalar)}
+        if keyword in WKT_GEOMETRY_TYPES:
+            return self._wkt(token)
+        return {"property": value}
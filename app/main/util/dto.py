@@ -1,6 +1,6 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from flask_restx import Namespace, fields
+from flask_restx import Namespace, fields, inputs
 from werkzeug.datastructures import FileStorage
 
 
@@ -21,14 +21,31 @@ class PrivateCatalogDto:
         {
             "bbox": fields.List(
                 fields.Float,
-                required=True,
+                required=False,
                 description="bounding box of the area to be ingested",
                 example=[-1, 50, 1, 51],
             ),
             "datetime": fields.String(
-                required=True,
+                required=False,
                 description="datetime of the area to be ingested",
                 example="2021-05-05T00:00:00Z/2022-05-05T00:00:00Z",
+            ),
+            "q": fields.String(
+                required=False,
+                description="keywords matched against collection id, title and description",
+                example="landsat surface reflectance",
+            ),
+            "filter": fields.Raw(
+                required=False,
+                description="CQL2 filter over the collection queryables, a string for cql2-text or an object "
+                            "for cql2-json",
+                example="title LIKE 'Landsat%' AND S_INTERSECTS(geometry, BBOX(-1, 50, 1, 51))",
+            ),
+            "filter-lang": fields.String(
+                required=False,
+                enum=["cql2-text", "cql2-json"],
+                description="language of the filter, inferred from its type when omitted",
+                example="cql2-text",
             )},
     )
     collection_dto = api.model(
@@ -162,6 +179,10 @@ class PrivateCatalogDto:
             ),
         },
     )
+    collection_list_arguments = api.parser()
+    collection_list_arguments.add_argument(
+        "simplified_footprint", type=inputs.boolean, location="args", required=False, default=False,
+        help="return the simplified footprint instead of the exact spatial extent")
 
 
 class ValidateDto:
@@ -270,8 +291,111 @@ class PublicCatalogsDto:
                 required=False,
                 description="datetime of the area to be ingested",
                 example="2021-05-05T00:00:00Z/2022-05-05T00:00:00Z",
+            ),
+            "q": fields.String(
+                required=False,
+                description="keywords matched against collection id, title and description",
+                example="landsat surface reflectance",
+            ),
+            "filter": fields.Raw(
+                required=False,
+                description="CQL2 filter over the collection queryables, a string for cql2-text or an object "
+                            "for cql2-json",
+                example="title LIKE 'Landsat%' AND S_INTERSECTS(geometry, BBOX(-1, 50, 1, 51))",
+            ),
+            "filter-lang": fields.String(
+                required=False,
+                enum=["cql2-text", "cql2-json"],
+                description="language of the filter, inferred from its type when omitted",
+                example="cql2-text",
             )},
     )
+    collection_list_arguments = api.parser()
+    collection_list_arguments.add_argument(
+        "simplified_footprint", type=inputs.boolean, location="args", required=False, default=False,
+        help="return the simplified footprint instead of the exact spatial extent")
+
+    refresh_interval = api.model(
+        "refresh_interval",
+        {
+            "refresh_interval_seconds": fields.Integer(
+                required=True,
+                min=0,
+                description="seconds between periodic refreshes, 0 to not refresh periodically",
+                example=86400,
+            ),
+        },
+    )
+    stored_search_parameters_refresh_interval = api.model(
+        "stored_search_parameters_refresh_interval",
+        {
+            "refresh_interval_seconds": fields.Integer(
+                required=False,
+                min=0,
+                description="seconds between periodic refreshes, 0 to not refresh periodically, leave out to follow "
+                            "the refresh interval of the catalog",
+                example=3600,
+            ),
+        },
+    )
+
+    update_arguments = api.parser()
+    update_arguments.add_argument(
+        "full_refresh", type=inputs.boolean, location="args", required=False, default=False,
+        help="ingest the full datetime window of the stored search parameters instead of the window since their "
+             "last successful run")
+
+
+class CollectionSearchDto:
+    api = Namespace("collections", description="Search over public and private collections")
+    collection_search = api.model(
+        "collection_search_all",
+        {
+            "bbox": fields.List(
+                fields.Float,
+                required=False,
+                description="bounding box of the area to be searched",
+                example=[-1, 50, 1, 51],
+            ),
+            "datetime": fields.String(
+                required=False,
+                description="datetime interval the collections must overlap",
+                example="2021-05-05T00:00:00Z/2022-05-05T00:00:00Z",
+            ),
+            "q": fields.String(
+                required=False,
+                description="keywords matched against collection id, title and description",
+                example="landsat surface reflectance",
+            ),
+            "filter": fields.Raw(
+                required=False,
+                description="CQL2 filter over the collection queryables, a string for cql2-text or an object "
+                            "for cql2-json",
+                example="title LIKE 'Landsat%' AND S_INTERSECTS(geometry, BBOX(-1, 50, 1, 51))",
+            ),
+            "filter-lang": fields.String(
+                required=False,
+                enum=["cql2-text", "cql2-json"],
+                description="language of the filter, inferred from its type when omitted",
+                example="cql2-text",
+            ),
+            "limit": fields.Integer(
+                required=False,
+                default=100,
+                description="maximum number of collections to return",
+                example=100,
+            ),
+            "offset": fields.Integer(
+                required=False,
+                default=0,
+                description="number of collections to skip",
+                example=0,
+            )},
+    )
+    collection_list_arguments = api.parser()
+    collection_list_arguments.add_argument(
+        "simplified_footprint", type=inputs.boolean, location="args", required=False, default=False,
+        help="return the simplified footprint instead of the exact spatial extent")
 
 
 class StatusReportingDto:
@@ -304,18 +428,134 @@ class StatusReportingDto:
             ),
         },
     )
+    stac_ingestion_status_list_arguments = api.parser()
+    stac_ingestion_status_list_arguments.add_argument(
+        "public_catalog_id", type=int, location="args", required=False,
+        help="only statuses of ingestions from this public catalog")
+    stac_ingestion_status_list_arguments.add_argument(
+        "state", type=str, location="args", required=False,
+        choices=("queued", "running", "retrying", "succeeded", "failed"),
+        help="only statuses in this state")
+    stac_ingestion_status_list_arguments.add_argument(
+        "started_after", type=inputs.datetime_from_iso8601, location="args", required=False,
+        help="only statuses of ingestions started at or after this time")
+    stac_ingestion_status_list_arguments.add_argument(
+        "started_before", type=inputs.datetime_from_iso8601, location="args", required=False,
+        help="only statuses of ingestions started before this time")
+    stac_ingestion_status_list_arguments.add_argument(
+        "limit", type=int, location="args", required=False, default=100,
+        help="maximum number of statuses to return")
+    stac_ingestion_status_list_arguments.add_argument(
+        "offset", type=int, location="args", required=False, default=0,
+        help="number of statuses to skip")
+    ingestion_analytics_arguments = api.parser()
+    ingestion_analytics_arguments.add_argument(
+        "since", type=inputs.datetime_from_iso8601, location="args", required=False,
+        help="start of the window of ingestion start times, 30 days before until by default")
+    ingestion_analytics_arguments.add_argument(
+        "until", type=inputs.datetime_from_iso8601, location="args", required=False,
+        help="end of the window of ingestion start times, now by default")
+    ingestion_analytics_arguments.add_argument(
+        "public_catalog_id", type=int, location="args", required=False,
+        help="only ingestions from this public catalog")
+    ingestion_analytics_arguments.add_argument(
+        "slowest_collections", type=int, location="args", required=False, default=5,
+        help="number of slowest collections reported per source catalog")
+    stac_ingestion_progress = api.model(
+        "stac_ingestion_progress",
+        {
+            "items_done": fields.Integer(
+                required=True, description="number of items processed so far", example=1200
+            ),
+            "items_per_second": fields.Float(
+                required=False, description="current throughput of the ingester", example=35.5
+            ),
+            "current_collection": fields.String(
+                required=False, description="collection the ingester is working on", example="landsat-c2-l2"
+            ),
+        },
+    )
 
 
 class FileDto:
     api = Namespace("files", description="File upload related operations")
     file_upload = api.parser()
     file_upload.add_argument("file", location="files", type=FileStorage, required=True)
+    sas_tokens = api.model(
+        "sas_tokens",
+        {
+            "permission": fields.String(
+                required=True, enum=["read", "write"], description="permission granted by the tokens", example="read"
+            ),
+            "blob_names": fields.List(
+                fields.String, required=False, description="names or urls of the blobs",
+                example=["LC09_L2SP_202024_20220810_20220812_02_T1_SR_B4.tiff"]
+            ),
+            "prefix": fields.String(
+                required=False, description="prefix of the names of existing blobs, for read tokens",
+                example="LC09_L2SP_202024_20220810"
+            ),
+            "container_scope": fields.Boolean(
+                required=False, default=False, description="issue a single token for the whole container"
+            ),
+        },
+    )
+    upload_session = api.model(
+        "upload_session",
+        {
+            "item_id": fields.String(required=True, description="id of the item the file belongs to",
+                                     example="LC09_L2SP_202024_20220810_20220812_02_T1"),
+            "filename": fields.String(required=True, description="name of the file", example="SR_B4.tiff"),
+            "size": fields.Integer(required=True, min=0, description="size of the file in bytes", example=1073741824),
+            "content_type": fields.String(required=False, description="content type the file is stored with",
+                                          example="image/tiff"),
+        },
+    )
+    upload_preflight = api.model(
+        "upload_preflight",
+        {
+            "files": fields.List(fields.Nested(api.model(
+                "upload_preflight_file",
+                {
+                    "item_id": fields.String(required=True, description="id of the item the file belongs to",
+                                             example="LC09_L2SP_202024_20220810_20220812_02_T1"),
+                    "filename": fields.String(required=True, description="name of the file", example="SR_B4.tiff"),
+                    "sha256": fields.String(required=False, description="hex SHA-256 of the file"),
+                    "md5": fields.String(required=False, description="hex MD5 of the file"),
+                    "size": fields.Integer(required=False, description="size of the file in bytes"),
+                },
+            )), required=True),
+        },
+    )
+    list_assets_arguments = api.parser()
+    list_assets_arguments.add_argument(
+        "page_size", type=int, location="args", required=False, default=1000, help="most blobs to return")
+    list_assets_arguments.add_argument(
+        "continuation_token", type=str, location="args", required=False,
+        help="continuation_token returned with the previous page")
+    list_assets_arguments.add_argument(
+        "signed", type=inputs.boolean, location="args", required=False, default=False,
+        help="add read SAS tokens to the urls of the blobs")
+    retrieve_file_arguments = api.parser()
+    retrieve_file_arguments.add_argument(
+        "preview_bytes", type=int, location="args", required=False,
+        help="return the first bytes of the file as text instead of parsing it")
+    upload_chunk_arguments = api.parser()
+    upload_chunk_arguments.add_argument(
+        "offset", type=int, location="args", required=True, help="offset of the chunk in the file")
 
 
 class FilesDto:
     files_api = Namespace('files', description='File upload related operations')
     files_upload = files_api.parser()
     files_upload.add_argument('files', location='files', type=FileStorage, required=True, action='append')
+    upload_arguments = files_api.parser()
+    upload_arguments.add_argument(
+        "concurrent", type=inputs.boolean, location="args", required=False, default=False,
+        help="stream the files into staged blocks concurrently and report a result per file")
+    upload_arguments.add_argument(
+        "itemIds", type=str, location="args", required=False,
+        help="comma separated item ids of the files, instead of the itemIds form field")
 
 
 class GdalInfoDto:
@@ -345,6 +585,24 @@ class StacGeneratorDto:
         'stac_extensions': fields.List(fields.String, required=False, description='stac extensions', example=['eo']),
         'stac_collection': fields.String(required=False, description='stac collection', example='landsat-8-l1-c1'),
     })
+    pipeline = api.model(
+        "pipeline",
+        {
+            "collection_id": fields.String(required=True, description="collection the item is published to",
+                                           example="landsat-c2-l2"),
+            "manifest": fields.Nested(api.model(
+                "pipeline_manifest",
+                {
+                    "upload_ids": fields.List(fields.String, required=False, default=[],
+                                              description="resumable uploads to complete"),
+                    "blob_names": fields.List(fields.String, required=False, default=[],
+                                              description="files that were uploaded already",
+                                              example=["LC09_L2SP_202024_20220810_20220812_02_T1_SR_B4.tiff"]),
+                },
+            ), required=True),
+            "metadata": fields.Raw(required=True, description="metadata json the item is generated from"),
+        },
+    )
     item_search = api.model(
         "item_search",
         {
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict
+
+from flask import current_app
+
+# Interval at which a worker re-reads the size of the cache, which other workers of the host write to as well
+_RESCAN_INTERVAL_SECONDS = 60
+# Eviction frees space down to this fraction of max_bytes, so not every write has to evict
+_EVICTION_TARGET_FRACTION = 0.9
+
+
+class MetadataDiskCache:
+    """
+    LRU cache of parsed metadata files on the local disk, shared by all workers of a host.
+
+    Every entry is a JSON file named after the hash of the blob name, holding the parsed document together with the
+    ETag of the blob it was parsed from and the time that ETag was last confirmed. The modification time of the file
+    records its last use, the least recently used files are deleted once the cache grows over max_bytes. Files are
+    replaced atomically, so concurrent workers never read a partially written entry.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, fresh_seconds: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self._scanned_at = 0.0
+        self._hits = 0
+        self._revalidations = 0
+        self._misses = 0
+        self._evictions = 0
+        self._scan()
+
+    def _path(self, blob_name: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(blob_name.encode()).hexdigest() + ".json")
+
+    def _entries(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    try:
+                        yield entry.path, entry.stat()
+                    except FileNotFoundError:
+                        # deleted by another worker
+                        pass
+
+    def _scan(self) -> None:
+        self._current_bytes = sum(stat.st_size for _, stat in self._entries())
+        self._scanned_at = time.monotonic()
+
+    def get(self, blob_name: str) -> Dict[str, Any] or None:
+        """
+        Get the entry of a blob and mark it as used.
+
+        :param blob_name: Name of the blob
+        :return: Entry with the etag, validated_at and document, or None on a miss
+        """
+        path = self._path(blob_name)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._misses += 1
+            return None
+        if entry.get("blob_name") != blob_name:
+            with self._lock:
+                self._misses += 1
+            return None
+        return entry
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        """
+        Whether the entry was validated recently enough to be used without asking the storage account.
+        """
+        return entry["validated_at"] + self.fresh_seconds > time.time()
+
+    def record_hit(self, revalidated: bool = False) -> None:
+        with self._lock:
+            if revalidated:
+                self._revalidations += 1
+            else:
+                self._hits += 1
+
+    def set(self, blob_name: str, etag: str, document: Any) -> None:
+        """
+        Store the parsed document of a blob, or confirm that a stored one is still current.
+
+        :param blob_name: Name of the blob
+        :param etag: ETag of the blob the document was parsed from
+        :param document: Parsed document, must be JSON serializable
+        """
+        data = json.dumps({"blob_name": blob_name, "etag": etag, "validated_at": time.time(),
+                           "document": document}).encode()
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(blob_name)
+        try:
+            previous_size = os.path.getsize(path)
+        except OSError:
+            previous_size = 0
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporary_path, path)
+        except OSError:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._current_bytes += len(data) - previous_size
+            if self._current_bytes > self.max_bytes or \
+                    time.monotonic() - self._scanned_at > _RESCAN_INTERVAL_SECONDS:
+                self._scan()
+            if self._current_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        target = self.max_bytes * _EVICTION_TARGET_FRACTION
+        for path, stat in sorted(self._entries(), key=lambda entry: entry[1].st_mtime):
+            if self._current_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._evictions += 1
+            except FileNotFoundError:
+                pass
+            self._current_bytes -= stat.st_size
+
+    def stats(self) -> Dict[str, any]:
+        with self._lock:
+            self._scan()
+            lookups = self._hits + self._revalidations + self._misses
+            return {
+                "hits": self._hits,
+                "revalidations": self._revalidations,
+                "misses": self._misses,
+                "hit_ratio": (self._hits + self._revalidations) / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "entries": sum(1 for _ in self._entries()),
+                "current_bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "fresh_seconds": self.fresh_seconds,
+            }
+
+
+_metadata_cache: MetadataDiskCache or None = None
+_metadata_cache_lock = threading.Lock()
+
+
+def get_metadata_cache() -> MetadataDiskCache or None:
+    """
+    Get the metadata cache of this worker, creating it from the app config on first use.
+
+    :return: The cache, None when METADATA_CACHE_MAX_BYTES is 0
+    """
+    global _metadata_cache
+    if current_app.config["METADATA_CACHE_MAX_BYTES"] <= 0:
+        return None
+    if _metadata_cache is None:
+        with _metadata_cache_lock:
+            if _metadata_cache is None:
+                _metadata_cache = MetadataDiskCache(current_app.config["METADATA_CACHE_DIR"],
+                                                    current_app.config["METADATA_CACHE_MAX_BYTES"],
+                                                    current_app.config["METADATA_CACHE_FRESH_SECONDS"])
+    return _metadata_cache
@@ -0,0 +1,18 @@
+import hashlib
+import json
+from typing import Dict
+
+
+def hash_parameters(parameters: Dict[str, any]) -> str:
+    """
+    Hash STAC Filter parameters independently of key and collection order.
+
+    The callback id of an ingestion is not part of the hash.
+
+    :param parameters: STAC Filter parameters
+    :return: Hex digest of the canonical JSON of the parameters
+    """
+    canonical = {k: v for k, v in parameters.items() if k != 'callback_id'}
+    if isinstance(canonical.get('collections'), list):
+        canonical['collections'] = sorted(set(canonical['collections']))
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
@@ -0,0 +1,188 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import shapely.prepared
+import shapely.wkt
+from flask import current_app
+from shapely.geometry.base import BaseGeometry
+
+from .process_timestamp import process_timestamp_dual_string
+
+
+class SearchResultCache:
+    """
+    In-process LRU cache for search results.
+
+    Every entry belongs to a partition, a tuple such as ("public", 3) describing which data it was computed
+    from. Writes bump the generation of the partition they touch, which invalidates entries of that partition,
+    of all its parents and of all its children, while leaving siblings alone. Generations are local to the
+    worker, so entries additionally expire after ttl_seconds to bound staleness caused by writes handled
+    in other workers.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, Tuple, float]]" = OrderedDict()
+        self._subtree_generations: Dict[Tuple, int] = defaultdict(int)
+        self._node_generations: Dict[Tuple, int] = defaultdict(int)
+        self._current_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def _generation(self, partition: Tuple) -> Tuple:
+        ancestors = tuple(self._node_generations[partition[:i]] for i in range(len(partition)))
+        return self._subtree_generations[partition], ancestors
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _, _ = self._entries.pop(key)
+        self._current_bytes -= size
+
+    def get_or_set(self, key: Hashable, partition: Tuple, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss.
+
+        :param key: Hashable key of the normalized query, must include everything the result depends on
+        :param partition: Partition the result was computed from
+        :param compute: Callable producing the value on a miss
+        :return: Cached or freshly computed value, callers must not mutate it
+        """
+        with self._lock:
+            generation = self._generation(partition)
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, _, entry_generation, expires_at = entry
+                if entry_generation == generation and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                self._remove(key)
+                self._invalidations += 1
+            self._misses += 1
+
+        value = compute()
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            # a write that happened while computing makes the value stale before it is stored
+            if self._generation(partition) != generation:
+                return value
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, generation, time.monotonic() + self.ttl_seconds)
+            self._current_bytes += size
+            while self._current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._evictions += 1
+        return value
+
+    def bump(self, partition: Tuple) -> None:
+        """
+        Invalidate all entries computed from partition, its parents or its children.
+
+        :param partition: Partition that was written to
+        """
+        with self._lock:
+            self._node_generations[partition] += 1
+            for i in range(len(partition) + 1):
+                self._subtree_generations[partition[:i]] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> Dict[str, any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "entries": len(self._entries),
+                "current_bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+_collection_search_cache: SearchResultCache or None = None
+_collection_search_cache_lock = threading.Lock()
+
+
+def get_collection_search_cache() -> SearchResultCache:
+    """
+    Get the collection search cache of this worker, creating it from the app config on first use.
+    """
+    global _collection_search_cache
+    if _collection_search_cache is None:
+        with _collection_search_cache_lock:
+            if _collection_search_cache is None:
+                _collection_search_cache = SearchResultCache(current_app.config["SEARCH_CACHE_MAX_BYTES"],
+                                                             current_app.config["SEARCH_CACHE_TTL_SECONDS"])
+    return _collection_search_cache
+
+
+_blob_listing_cache: SearchResultCache or None = None
+_blob_listing_cache_lock = threading.Lock()
+
+
+def get_blob_listing_cache() -> SearchResultCache:
+    """
+    Get the cache of blob listings of this worker, creating it from the app config on first use.
+    """
+    global _blob_listing_cache
+    if _blob_listing_cache is None:
+        with _blob_listing_cache_lock:
+            if _blob_listing_cache is None:
+                _blob_listing_cache = SearchResultCache(current_app.config["BLOB_LISTING_CACHE_MAX_BYTES"],
+                                                        current_app.config["BLOB_LISTING_CACHE_TTL_SECONDS"])
+    return _blob_listing_cache
+
+
+def snap_bbox_to_grid(bbox: List[float], grid: float) -> Tuple[float, float, float, float]:
+    """
+    Snap a bbox outwards to a grid so near-identical searches share a cache entry.
+
+    The snapped bbox always covers the original one, so results searched with it must be narrowed to the
+    original bbox with filter_by_bbox.
+    """
+    min_x, min_y, max_x, max_y = bbox
+    return (round(math.floor(min_x / grid) * grid, 10),
+            round(math.floor(min_y / grid) * grid, 10),
+            round(math.ceil(max_x / grid) * grid, 10),
+            round(math.ceil(max_y / grid) * grid, 10))
+
+
+def filter_by_bbox(entries: List[Tuple[str or None, Any]], bbox: BaseGeometry) -> List[Any]:
+    """
+    Keep the values whose spatial extent intersects a bbox, like the spatial filter of the searches.
+
+    :param entries: Pairs of the exact spatial extent as WKT, None if there is none, and a value
+    :param bbox: Bbox the values are narrowed to
+    :return: Values of the intersecting entries, in order
+    """
+    prepared_bbox = shapely.prepared.prep(bbox)
+    return [value for spatial_extent_wkt, value in entries
+            if spatial_extent_wkt is not None and prepared_bbox.intersects(shapely.wkt.loads(spatial_extent_wkt))]
+
+
+def canonical_time_interval(time_interval_timestamp: str) -> Tuple[str, str]:
+    """
+    Process a timestamp interval string into a canonical tuple, using .. for open ends.
+    """
+    time_start, time_end = process_timestamp_dual_string(time_interval_timestamp)
+    return (time_start.isoformat() if time_start else "..",
+            time_end.isoformat() if time_end else "..")
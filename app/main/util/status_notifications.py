@@ -0,0 +1,107 @@
+"""
+Notifications about changed stac ingestion statuses, passed between processes through Postgres LISTEN/NOTIFY.
+
+Every process holds at most one listening connection, which is opened when the first stream subscribes and is
+shared by all streams of that process.
+"""
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from typing import Dict, Set
+
+from sqlalchemy import func
+from sqlalchemy import select as sql_select
+
+from .. import db
+
+CHANNEL = "stac_ingestion_status"
+# Seconds the listener waits before reconnecting after losing its connection
+_RECONNECT_DELAY_SECONDS = 5
+
+
+def notify_status_changed(status_id: int) -> None:
+    """
+    Notify listeners that a status changed, once the current transaction commits.
+
+    :param status_id: Id of the changed status
+    """
+    db.session.execute(sql_select(func.pg_notify(CHANNEL, str(status_id))))
+
+
+class StatusNotificationListener:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[queue.Queue]] = {}
+        self._thread: threading.Thread or None = None
+        self._pid = None
+
+    def subscribe(self, status_id: int) -> queue.Queue:
+        """
+        Subscribe to changes of a status.
+
+        :param status_id: Id of the status
+        :return: Queue that receives the status id whenever the status may have changed
+        """
+        subscription = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(status_id, set()).add(subscription)
+            # a forked worker does not inherit the listening thread of its parent
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._listen, args=(db.engine,), daemon=True,
+                                                name="status-notifications")
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, status_id: int, subscription: queue.Queue) -> None:
+        with self._lock:
+            subscriptions = self._subscribers.get(status_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscribers.pop(status_id, None)
+
+    def _publish(self, status_id: int = None) -> None:
+        with self._lock:
+            if status_id is None:
+                subscriptions = [s for subscriptions in self._subscribers.values() for s in subscriptions]
+            else:
+                subscriptions = list(self._subscribers.get(status_id, ()))
+        for subscription in subscriptions:
+            subscription.put(status_id)
+
+    def _listen(self, engine) -> None:
+        while True:
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                dbapi_connection = connection.connection
+                dbapi_connection.autocommit = True
+                dbapi_connection.cursor().execute(f"LISTEN {CHANNEL}")
+                # notifications sent while the listener was not connected are lost, so every stream reloads
+                self._publish()
+                while True:
+                    if select.select([dbapi_connection], [], [], 60) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notification = dbapi_connection.notifies.pop(0)
+                        try:
+                            self._publish(int(notification.payload))
+                        except ValueError:
+                            pass
+            except Exception as e:
+                logging.error("Status notification listener error: " + str(e))
+            finally:
+                if connection is not None:
+                    connection.invalidate()
+            time.sleep(_RECONNECT_DELAY_SECONDS)
+
+
+_listener = StatusNotificationListener()
+
+
+def get_status_notification_listener() -> StatusNotificationListener:
+    return _listener
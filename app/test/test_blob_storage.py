@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from app.main.util import blob_storage
+from app.main.util.blob_storage import BlobStorage, DEVELOPMENT_STORAGE_ACCOUNT_KEY, \
+    DEVELOPMENT_STORAGE_ACCOUNT_NAME, DEVELOPMENT_STORAGE_BLOB_ENDPOINT, get_blob_storage, parse_connection_string
+
+ACCOUNT_KEY = "a2V5PT0=="
+CONNECTION_STRING = f"AccountName=account;AccountKey={ACCOUNT_KEY};BlobEndpoint=http://azurite:10000/account"
+
+
+class TestParseConnectionString(unittest.TestCase):
+    def test_development_storage(self):
+        params = parse_connection_string("UseDevelopmentStorage=true")
+        self.assertEqual(params["AccountName"], DEVELOPMENT_STORAGE_ACCOUNT_NAME)
+        self.assertEqual(params["AccountKey"], DEVELOPMENT_STORAGE_ACCOUNT_KEY)
+        self.assertEqual(params["BlobEndpoint"], DEVELOPMENT_STORAGE_BLOB_ENDPOINT)
+
+    def test_development_storage_proxy_uri(self):
+        params = parse_connection_string("UseDevelopmentStorage=true;DevelopmentStorageProxyUri=http://azurite/")
+        self.assertEqual(params["BlobEndpoint"], "http://azurite:10000/devstoreaccount1")
+
+    def test_explicit_blob_endpoint(self):
+        params = parse_connection_string("DefaultEndpointsProtocol=http;AccountName=account;AccountKey=key;"
+                                         "BlobEndpoint=http://azurite:10000/account/;")
+        self.assertEqual(params["BlobEndpoint"], "http://azurite:10000/account")
+
+    def test_explicit_blob_endpoint_overrides_development_storage(self):
+        params = parse_connection_string("UseDevelopmentStorage=true;"
+                                         "BlobEndpoint=http://azurite:10000/devstoreaccount1")
+        self.assertEqual(params["BlobEndpoint"], "http://azurite:10000/devstoreaccount1")
+
+    def test_endpoint_from_account_name(self):
+        params = parse_connection_string("AccountName=account;AccountKey=key;EndpointSuffix=core.chinacloudapi.cn")
+        self.assertEqual(params["BlobEndpoint"], "https://account.blob.core.chinacloudapi.cn")
+        params = parse_connection_string("DefaultEndpointsProtocol=http;AccountName=account;AccountKey=key")
+        self.assertEqual(params["BlobEndpoint"], "http://account.blob.core.windows.net")
+
+    def test_account_key_containing_equals_signs(self):
+        params = parse_connection_string(CONNECTION_STRING)
+        self.assertEqual(params["AccountKey"], ACCOUNT_KEY)
+
+    def test_missing_account_key(self):
+        with self.assertRaises(ValueError):
+            parse_connection_string("AccountName=account;BlobEndpoint=http://azurite:10000/account")
+
+    def test_parameter_without_value(self):
+        with self.assertRaises(ValueError):
+            parse_connection_string("AccountName=account;AccountKey=key;garbage")
+
+
+class TestBlobStorage(unittest.TestCase):
+    def setUp(self):
+        self.storage = BlobStorage(CONNECTION_STRING, "stac-items", pool_size=1)
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_blob_url_quotes_the_name(self):
+        self.assertEqual(self.storage.blob_url("item/a b#1?.tif"),
+                         "http://azurite:10000/account/stac-items/item/a%20b%231%3F.tif")
+        self.assertEqual(self.storage.blob_url("ä~.json", container="other"),
+                         "http://azurite:10000/account/other/%C3%A4~.json")
+
+    def test_container_clients_are_shared(self):
+        self.assertIs(self.storage.container_client(), self.storage.container_client("stac-items"))
+        self.assertIsNot(self.storage.container_client(), self.storage.container_client(streaming=True))
+
+
+class TestGetBlobStorage(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(AZURE_STORAGE_CONNECTION_STRING=CONNECTION_STRING,
+                               AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS="stac-items",
+                               AZURE_STORAGE_CONNECTION_POOL_SIZE=1,
+                               RETRIEVE_FILE_CHUNK_SIZE=1024)
+        blob_storage._blob_storage = None
+        blob_storage._blob_storage_pid = None
+
+    def tearDown(self):
+        blob_storage._blob_storage = None
+        blob_storage._blob_storage_pid = None
+
+    def test_shared_within_a_process(self):
+        with self.app.app_context():
+            self.assertIs(get_blob_storage(), get_blob_storage())
+
+    def test_recreated_after_fork(self):
+        with self.app.app_context():
+            parent = get_blob_storage()
+            with mock.patch.object(blob_storage.os, "getpid", return_value=blob_storage._blob_storage_pid + 1):
+                child = get_blob_storage()
+                self.assertIsNot(child, parent)
+                self.assertIs(get_blob_storage(), child)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import datetime
+import unittest
+
+from sqlalchemy import DateTime, Integer, Text, column
+from sqlalchemy.dialects import postgresql
+
+from app.main.custom_exceptions import InvalidFilterError
+from app.main.util.cql2 import Queryable, compile_filter, parse_filter
+
+QUERYABLES = {
+    "title": Queryable("string", column("title", Text), "Title"),
+    "catalog": Queryable("integer", column("catalog", Integer), "Catalog"),
+    "datetime": Queryable("timestamp", column("datetime", DateTime), "Datetime"),
+}
+
+
+def compile_text(text: str):
+    return compile_filter(parse_filter(text), QUERYABLES).compile(dialect=postgresql.dialect())
+
+
+class TestLiteralKinds(unittest.TestCase):
+    def test_matching_kinds(self):
+        self.assertEqual(list(compile_text("catalog = 3").params.values()), [3])
+        self.assertEqual(list(compile_text("title LIKE 'Landsat%'").params.values()), ["Landsat%"])
+        self.assertEqual(list(compile_text("catalog IN (1, 2)").params.values()), [1, 2])
+        self.assertEqual(list(compile_text("datetime BETWEEN TIMESTAMP('2021-01-01T00:00:00Z') AND "
+                                           "DATE('2022-01-01')").params.values()),
+                         [datetime.datetime(2021, 1, 1), datetime.datetime(2022, 1, 1)])
+
+    def test_timestamps_written_as_strings(self):
+        self.assertEqual(list(compile_text("datetime > '2021-01-01'").params.values()),
+                         [datetime.datetime(2021, 1, 1)])
+        with self.assertRaises(InvalidFilterError):
+            compile_text("datetime > 'yesterday'")
+
+    def test_mismatched_kinds(self):
+        for text in ("catalog = 'abc'", "title > 5", "datetime = 3", "catalog IN (1, 'b')",
+                     "catalog BETWEEN 1 AND 'z'", "catalog LIKE '1%'", "CASEI(catalog) = 'a'", "title = TRUE"):
+            with self.subTest(text=text), self.assertRaises(InvalidFilterError):
+                compile_text(text)
+
+    def test_mismatched_kinds_in_cql2_json(self):
+        with self.assertRaises(InvalidFilterError):
+            compile_filter({"op": "=", "args": [{"property": "catalog"}, "abc"]}, QUERYABLES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from app.main.service.file_service import _is_item_asset, blob_name_for_item_file
+
+
+class TestIsItemAsset(unittest.TestCase):
+    def test_blobs_named_after_the_item(self):
+        for name in ("a", blob_name_for_item_file("a", "B4.tif"), "a.json", "a-thumb.png"):
+            with self.subTest(name=name):
+                self.assertTrue(_is_item_asset(name, "a"))
+
+    def test_blobs_of_items_with_a_longer_id(self):
+        self.assertFalse(_is_item_asset("a2", "a"))
+        self.assertFalse(_is_item_asset(blob_name_for_item_file("ab", "B4.tif"), "a"))
+
+    def test_blobs_of_items_whose_id_continues_after_a_separator(self):
+        # documented limitation, the blob name does not tell where the item id ends
+        self.assertTrue(_is_item_asset(blob_name_for_item_file("a_b", "B4.tif"), "a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
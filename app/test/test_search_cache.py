@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+
+import shapely.geometry
+from flask import Flask
+
+from app.main.service import collection_search_service, private_catalog_service, public_catalogs_service
+from app.main.util import search_cache
+
+INSIDE = shapely.geometry.box(10.2, 20.2, 10.4, 20.4).wkt
+# inside the grid cell of the searched bbox, but outside the bbox
+OUTSIDE = shapely.geometry.box(10.7, 20.7, 10.9, 20.9).wkt
+BBOX = [10.1, 20.1, 10.5, 20.5]
+
+
+class TestFilterByBbox(unittest.TestCase):
+    def test_keeps_intersecting_values(self):
+        bbox = shapely.geometry.box(*BBOX)
+        self.assertEqual(search_cache.filter_by_bbox([(INSIDE, "in"), (OUTSIDE, "out"), (None, "none")], bbox),
+                         ["in"])
+
+    def test_touching_extent_intersects(self):
+        bbox = shapely.geometry.box(*BBOX)
+        touching = shapely.geometry.box(10.5, 20.5, 10.6, 20.6).wkt
+        self.assertEqual(search_cache.filter_by_bbox([(touching, "touching")], bbox), ["touching"])
+
+
+class TestSnappedSearches(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(SEARCH_CACHE_MAX_BYTES=1024 * 1024, SEARCH_CACHE_TTL_SECONDS=60,
+                               SEARCH_CACHE_BBOX_GRID_DEGREES=1.0)
+        search_cache._collection_search_cache = None
+
+    def tearDown(self):
+        search_cache._collection_search_cache = None
+
+    def test_public_search_excludes_collections_outside_the_bbox(self):
+        groups = [{"catalog": {"id": 1}, "collections": [(INSIDE, {"id": "in"}), (OUTSIDE, {"id": "out"})]},
+                  {"catalog": {"id": 2}, "collections": [(OUTSIDE, {"id": "other"})]}]
+        with self.app.app_context(), \
+                mock.patch.object(public_catalogs_service, "_search_collections", return_value=groups) as search:
+            self.assertEqual(public_catalogs_service.search_collections(BBOX, None),
+                             [{"catalog": {"id": 1}, "collections": [{"id": "in"}]}])
+            self.assertEqual(search.call_args[0][0].bounds, (10.0, 20.0, 11.0, 21.0))
+            # a bbox in the same grid cell is answered from the cached collections of the cell
+            self.assertEqual(public_catalogs_service.search_collections([10.6, 20.6, 10.8, 20.8], None),
+                             [{"catalog": {"id": 1}, "collections": [{"id": "out"}]},
+                              {"catalog": {"id": 2}, "collections": [{"id": "other"}]}])
+            self.assertEqual(search.call_count, 1)
+
+    def test_private_search_excludes_collections_outside_the_bbox(self):
+        collections = [(INSIDE, {"id": "in"}), (OUTSIDE, {"id": "out"})]
+        with self.app.app_context(), \
+                mock.patch.object(private_catalog_service, "_search_collections", return_value=collections):
+            self.assertEqual(private_catalog_service.search_collections(BBOX, None), [{"id": "in"}])
+            self.assertEqual(private_catalog_service.search_collections(None, None), [{"id": "in"}, {"id": "out"}])
+
+    def test_unified_search_excludes_collections_outside_the_bbox(self):
+        collections = [(INSIDE, {"id": "a"}), (OUTSIDE, {"id": "out"}), (INSIDE, {"id": "b"}), (INSIDE, {"id": "c"})]
+        with self.app.app_context(), \
+                mock.patch.object(collection_search_service, "_search_all_collections_in_cell",
+                                  return_value=collections) as search:
+            self.assertEqual(collection_search_service.search_all_collections(BBOX, None, limit=2, offset=1),
+                             {"collections": [{"id": "b"}, {"id": "c"}], "total": 3, "limit": 2, "offset": 1})
+            self.assertEqual(search.call_args[0][0].bounds, (10.0, 20.0, 11.0, 21.0))
+            # other pages of the same cell are answered from the cache
+            self.assertEqual(collection_search_service.search_all_collections(BBOX, None, limit=2)["collections"],
+                             [{"id": "a"}, {"id": "b"}])
+            self.assertEqual(search.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
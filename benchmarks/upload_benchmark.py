@@ -0,0 +1,196 @@
+"""
+Upload throughput benchmark of the file endpoints against a local Azurite blob emulator.
+
+Every configuration is served by a fresh API process, so the peak RSS reported for a configuration is the one of a
+single worker handling its uploads. Uploaded blobs are deleted after every request.
+
+    docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+    AZURE_STORAGE_CONNECTION_STRING="UseDevelopmentStorage=true" python benchmarks/upload_benchmark.py
+
+Run with --help for the file sizes, block sizes and concurrency settings that can be covered.
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+import azure.core.exceptions
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.main.util.blob_storage import BlobStorage  # noqa: E402
+
+MB = 1024 * 1024
+# single: /file/stac_assets/<item_id>/upload/ with one file per request
+# multi: /file/stac_assets/upload/ with --files files per request, uploaded one after another
+# multi_concurrent: /file/stac_assets/upload/?concurrent=true, streamed into concurrently staged blocks
+MODES = ("single", "multi", "multi_concurrent")
+
+
+def _serve(config_overrides: dict, ready) -> None:
+    from werkzeug.serving import make_server
+
+    from app import blueprint
+    from app.main import create_app
+
+    app = create_app(os.getenv("FLASK_ENV") or "dev")
+    app.register_blueprint(blueprint)
+    app.config.update(config_overrides)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+def _peak_rss_mb(pid: int) -> float or None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # peak RSS is only read on Linux
+    return None
+
+
+def _percentile(values: list, percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percentile / 100 * len(ordered)) - 1)]
+
+
+def _prepare_request(base_url: str, mode: str, item_id: str, size: int, files: int) -> requests.PreparedRequest:
+    data = os.urandom(size)
+    if mode == "single":
+        return requests.Request("POST", f"{base_url}/file/stac_assets/{item_id}/upload/",
+                                files={"file": ("asset.tif", data, "image/tiff")}).prepare()
+    url = f"{base_url}/file/stac_assets/upload/"
+    if mode == "multi_concurrent":
+        url += "?concurrent=true"
+    # the itemIds field has to precede the files for the concurrent upload
+    parts = [("itemIds", (None, ",".join([item_id] * files)))]
+    parts += [(f"file[{i}]", (f"asset{i}.tif", data, "image/tiff")) for i in range(files)]
+    return requests.Request("POST", url, files=parts).prepare()
+
+
+def _delete_item_blobs(storage: BlobStorage, item_id: str) -> None:
+    container_client = storage.container_client()
+    for blob in container_client.list_blobs(name_starts_with=item_id):
+        container_client.delete_blob(blob.name)
+
+
+def run_case(storage: BlobStorage, mode: str, size: int, files: int, block_size: int or None,
+             concurrency: int or None, repeat: int, warmup: int) -> dict:
+    """
+    Upload the same request repeat times to a fresh API process and measure it.
+
+    :param block_size: AZURE_STORAGE_UPLOAD_BLOCK_SIZE of the API process, the configured one if None
+    :param concurrency: AZURE_STORAGE_UPLOAD_MAX_CONCURRENCY of the API process, the configured one if None
+    :return: Configuration with throughput in MB/s, latencies in seconds and peak RSS of the API process in MB
+    """
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    overrides = {}
+    if block_size is not None:
+        overrides["AZURE_STORAGE_UPLOAD_BLOCK_SIZE"] = block_size
+    if concurrency is not None:
+        overrides["AZURE_STORAGE_UPLOAD_MAX_CONCURRENCY"] = concurrency
+    server = context.Process(target=_serve, args=(overrides, ready), daemon=True)
+    server.start()
+    try:
+        base_url = f"http://127.0.0.1:{ready.get(timeout=60)}"
+        files = 1 if mode == "single" else files
+        item_id = uuid.uuid4().hex
+        prepared = _prepare_request(base_url, mode, item_id, size, files)
+        latencies = []
+        with requests.Session() as session:
+            for i in range(warmup + repeat):
+                start = time.perf_counter()
+                response = session.send(prepared)
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    raise RuntimeError(f"Upload failed with {response.status_code}: {response.text[:500]}")
+                if i >= warmup:
+                    latencies.append(elapsed)
+                _delete_item_blobs(storage, item_id)
+        return {
+            "mode": mode,
+            "file_size_mb": size / MB,
+            "files": files,
+            "block_size_mb": block_size / MB if block_size is not None else None,
+            "concurrency": concurrency,
+            "requests": repeat,
+            "throughput_mb_s": size * files * repeat / MB / sum(latencies),
+            "p50_latency_s": _percentile(latencies, 50),
+            "p95_latency_s": _percentile(latencies, 95),
+            "peak_rss_mb": _peak_rss_mb(server.pid),
+        }
+    finally:
+        server.terminate()
+        server.join()
+
+
+def _print_table(results: list) -> None:
+    columns = ("mode", "file_size_mb", "files", "block_size_mb", "concurrency", "throughput_mb_s", "p50_latency_s",
+               "p95_latency_s", "peak_rss_mb")
+    print(" ".join(f"{column:>16}" for column in columns))
+    for result in results:
+        print(" ".join(f"{result[column]:>16.3f}" if isinstance(result[column], float) else
+                       f"{str(result[column]):>16}" for column in columns))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated modes out of " + ", ".join(MODES))
+    parser.add_argument("--sizes-mb", default="1,16,128", help="comma separated file sizes in MB")
+    parser.add_argument("--files", type=int, default=8, help="files per request of the multi modes")
+    parser.add_argument("--block-sizes-mb", default="4,8,32",
+                        help="comma separated block sizes in MB, only varied for multi_concurrent")
+    parser.add_argument("--concurrency", default="1,4,8",
+                        help="comma separated max concurrency settings, only varied for multi_concurrent")
+    parser.add_argument("--repeat", type=int, default=5, help="measured requests per configuration")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests per configuration")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING") or "UseDevelopmentStorage=true"
+    os.environ["AZURE_STORAGE_CONNECTION_STRING"] = connection_string
+    container = os.getenv("AZURE_STORAGE_BLOB_NAME_FOR_STAC_ITEMS", "stac-items")
+    storage = BlobStorage(connection_string, container, pool_size=4)
+    try:
+        storage.service_client.create_container(container)
+    except azure.core.exceptions.ResourceExistsError:
+        pass
+
+    sizes = [int(float(size) * MB) for size in args.sizes_mb.split(",")]
+    block_sizes = [int(float(size) * MB) for size in args.block_sizes_mb.split(",")]
+    concurrency_settings = [int(concurrency) for concurrency in args.concurrency.split(",")]
+    results = []
+    for mode in args.modes.split(","):
+        if mode not in MODES:
+            parser.error(f"Unknown mode {mode}")
+        if mode == "multi_concurrent":
+            settings = itertools.product(sizes, block_sizes, concurrency_settings)
+        else:
+            # block size and concurrency only apply to the concurrent upload
+            settings = ((size, None, None) for size in sizes)
+        for size, block_size, concurrency in settings:
+            result = run_case(storage, mode, size, args.files, block_size, concurrency, args.repeat, args.warmup)
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+    storage.close()
+
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
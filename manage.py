@@ -6,6 +6,10 @@ from flask_migrate import Migrate
 
 from app import blueprint
 from app.main import create_app, db
+from app.main.service import ingestion_job_service
+from app.main.service import pipeline_job_service
+from app.main.service import scheduler_service
+from app.main.service import status_reporting_service
 
 app = create_app(os.getenv('FLASK_ENV') or 'dev')
 app.register_blueprint(blueprint)
@@ -23,5 +27,30 @@ def run():
     app.run(host='0.0.0.0', port=5000)
 
 
+@cli.command("run_ingestion_dispatcher")
+def run_ingestion_dispatcher():
+    """Send queued ingestions to the selective ingester."""
+    ingestion_job_service.run_dispatcher()
+
+
+@cli.command("run_pipeline_worker")
+def run_pipeline_worker():
+    """Commit uploads, generate and publish the STAC items of queued pipeline jobs."""
+    pipeline_job_service.run_pipeline_worker()
+
+
+@cli.command("run_scheduler")
+def run_scheduler():
+    """Queue periodic refreshes of stored search parameters."""
+    scheduler_service.run_scheduler()
+
+
+@cli.command("prune_stac_ingestion_statuses")
+def prune_stac_ingestion_statuses():
+    """Delete statuses of finished ingestions older than the retention period."""
+    deleted = status_reporting_service.prune_stac_ingestion_statuses()
+    print(f"Deleted {deleted} stac ingestion statuses")
+
+
 if __name__ == '__main__':
     cli()
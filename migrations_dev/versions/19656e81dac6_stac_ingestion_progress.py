@@ -0,0 +1,29 @@
+"""add ingestion progress to stac ingestion status
+
+Revision ID: 19656e81dac6
+Revises: 8463eb92e118
+Create Date: 2026-10-19 13:34:09.517742
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '19656e81dac6'
+down_revision = '8463eb92e118'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('stac_ingestion_status', sa.Column('items_done', sa.Integer(), nullable=True))
+    op.add_column('stac_ingestion_status', sa.Column('items_per_second', sa.Float(), nullable=True))
+    op.add_column('stac_ingestion_status', sa.Column('current_collection', sa.Text(), nullable=True))
+    op.add_column('stac_ingestion_status', sa.Column('progress_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('stac_ingestion_status', 'progress_updated_at')
+    op.drop_column('stac_ingestion_status', 'current_collection')
+    op.drop_column('stac_ingestion_status', 'items_per_second')
+    op.drop_column('stac_ingestion_status', 'items_done')
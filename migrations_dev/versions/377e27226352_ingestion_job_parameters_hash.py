@@ -0,0 +1,26 @@
+"""add parameters hash to ingestion jobs
+
+Revision ID: 377e27226352
+Revises: 8cff7ab5dcfb
+Create Date: 2026-10-19 12:20:31.644810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '377e27226352'
+down_revision = '8cff7ab5dcfb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('ingestion_jobs', sa.Column('parameters_hash', sa.Text(), nullable=True))
+    op.create_index('ix_ingestion_jobs_active_parameters_hash', 'ingestion_jobs', ['parameters_hash'], unique=True,
+                    postgresql_where=sa.text("state IN ('queued', 'running')"))
+
+
+def downgrade():
+    op.drop_index('ix_ingestion_jobs_active_parameters_hash', table_name='ingestion_jobs')
+    op.drop_column('ingestion_jobs', 'parameters_hash')
@@ -0,0 +1,58 @@
+"""move ingestion collection lists into their own table
+
+Revision ID: 46c24d87b137
+Revises: 19656e81dac6
+Create Date: 2026-10-19 14:08:44.130592
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '46c24d87b137'
+down_revision = '19656e81dac6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stac_ingestion_collection_results',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('stac_ingestion_status_id', sa.Integer(), nullable=False),
+    sa.Column('collection_id', sa.Text(), nullable=False),
+    sa.Column('result', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['stac_ingestion_status_id'], ['stac_ingestion_status.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stac_ingestion_collection_results_stac_ingestion_status_id'),
+                    'stac_ingestion_collection_results', ['stac_ingestion_status_id'], unique=False)
+    for column, result in (('newly_stored_collections', 'newly_stored'), ('updated_collections', 'updated')):
+        op.execute(f"""
+            INSERT INTO stac_ingestion_collection_results (stac_ingestion_status_id, collection_id, result)
+            SELECT id, collection_id, '{result}'
+            FROM stac_ingestion_status, unnest(string_to_array({column}, ',')) AS collection_id
+            WHERE coalesce({column}, '') <> ''
+        """)
+    op.drop_column('stac_ingestion_status', 'newly_stored_collections')
+    op.drop_column('stac_ingestion_status', 'updated_collections')
+    op.create_index(op.f('ix_stac_ingestion_status_time_started'), 'stac_ingestion_status', ['time_started'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_stac_ingestion_status_time_started'), table_name='stac_ingestion_status')
+    op.add_column('stac_ingestion_status', sa.Column('updated_collections', sa.Text(), nullable=True))
+    op.add_column('stac_ingestion_status', sa.Column('newly_stored_collections', sa.Text(), nullable=True))
+    for column, result in (('newly_stored_collections', 'newly_stored'), ('updated_collections', 'updated')):
+        op.execute(f"""
+            UPDATE stac_ingestion_status s
+            SET {column} = r.collection_ids
+            FROM (SELECT stac_ingestion_status_id, string_agg(collection_id, ',' ORDER BY id) AS collection_ids
+                  FROM stac_ingestion_collection_results
+                  WHERE result = '{result}'
+                  GROUP BY stac_ingestion_status_id) r
+            WHERE s.id = r.stac_ingestion_status_id
+        """)
+    op.drop_index(op.f('ix_stac_ingestion_collection_results_stac_ingestion_status_id'),
+                  table_name='stac_ingestion_collection_results')
+    op.drop_table('stac_ingestion_collection_results')
@@ -0,0 +1,56 @@
+"""add ingestion jobs
+
+Revision ID: 6890132155f2
+Revises: eb518d4e32c3
+Create Date: 2026-10-19 11:12:40.318227
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '6890132155f2'
+down_revision = 'eb518d4e32c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingestion_jobs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('stac_ingestion_status_id', sa.Integer(), nullable=False),
+    sa.Column('source_stac_api_url', sa.Text(), nullable=False),
+    sa.Column('parameters', sa.Text(), nullable=False),
+    sa.Column('state', sa.Text(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('time_created', sa.DateTime(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.Text(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['stac_ingestion_status_id'], ['stac_ingestion_status.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('stac_ingestion_status_id')
+    )
+    op.create_index(op.f('ix_ingestion_jobs_source_stac_api_url'), 'ingestion_jobs', ['source_stac_api_url'],
+                    unique=False)
+    op.create_index('ix_ingestion_jobs_state_next_attempt_at', 'ingestion_jobs', ['state', 'next_attempt_at'],
+                    unique=False)
+    op.add_column('stac_ingestion_status', sa.Column('state', sa.Text(), nullable=True))
+    op.add_column('stac_ingestion_status', sa.Column('attempts', sa.Integer(), nullable=True))
+    # ingestions started before the dispatcher ran in threads that no longer exist
+    op.execute("""
+        UPDATE stac_ingestion_status
+        SET state = CASE WHEN time_finished IS NULL THEN 'failed'
+                         WHEN coalesce(error_message, '') = '' THEN 'succeeded'
+                         ELSE 'failed' END,
+            attempts = 1
+    """)
+
+
+def downgrade():
+    op.drop_column('stac_ingestion_status', 'attempts')
+    op.drop_column('stac_ingestion_status', 'state')
+    op.drop_index('ix_ingestion_jobs_state_next_attempt_at', table_name='ingestion_jobs')
+    op.drop_index(op.f('ix_ingestion_jobs_source_stac_api_url'), table_name='ingestion_jobs')
+    op.drop_table('ingestion_jobs')
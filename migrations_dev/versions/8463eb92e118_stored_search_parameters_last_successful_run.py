@@ -0,0 +1,23 @@
+"""add last successful run to stored search parameters
+
+Revision ID: 8463eb92e118
+Revises: 377e27226352
+Create Date: 2026-10-19 12:51:17.208364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8463eb92e118'
+down_revision = '377e27226352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('stored_search_parameters', sa.Column('last_successful_run_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('stored_search_parameters', 'last_successful_run_at')
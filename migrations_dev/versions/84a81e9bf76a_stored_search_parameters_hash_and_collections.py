@@ -0,0 +1,69 @@
+"""key stored search parameters on a canonical hash and store their collections as an array
+
+Revision ID: 84a81e9bf76a
+Revises: f5895e18f3fd
+Create Date: 2026-10-19 15:55:12.409861
+
+"""
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '84a81e9bf76a'
+down_revision = 'f5895e18f3fd'
+branch_labels = None
+depends_on = None
+
+
+def _hash_parameters(parameters):
+    # same as app.main.util.parameters_hash.hash_parameters at the time of this migration
+    canonical = {k: v for k, v in parameters.items() if k != 'callback_id'}
+    if isinstance(canonical.get('collections'), list):
+        canonical['collections'] = sorted(set(canonical['collections']))
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def upgrade():
+    op.add_column('stored_search_parameters', sa.Column('parameters_hash', sa.Text(), nullable=True))
+    op.add_column('stored_search_parameters', sa.Column('collections', postgresql.ARRAY(sa.Text()), nullable=True))
+
+    connection = op.get_bind()
+    stored_search_parameters = sa.table('stored_search_parameters', sa.column('id', sa.Integer),
+                                        sa.column('used_search_parameters', sa.Text),
+                                        sa.column('parameters_hash', sa.Text),
+                                        sa.column('collections', postgresql.ARRAY(sa.Text())))
+    seen_hashes = set()
+    for row_id, used_search_parameters in connection.execute(
+            sa.select(stored_search_parameters.c.id, stored_search_parameters.c.used_search_parameters)
+            .order_by(stored_search_parameters.c.id)).all():
+        parameters = json.loads(used_search_parameters)
+        parameters_hash = _hash_parameters(parameters)
+        if parameters_hash in seen_hashes:
+            # the same parameters stored with a different key order
+            connection.execute(stored_search_parameters.delete().where(stored_search_parameters.c.id == row_id))
+            continue
+        seen_hashes.add(parameters_hash)
+        connection.execute(stored_search_parameters.update().where(stored_search_parameters.c.id == row_id)
+                           .values(parameters_hash=parameters_hash, collections=parameters.get('collections')))
+
+    op.alter_column('stored_search_parameters', 'parameters_hash', nullable=False)
+    op.create_unique_constraint('stored_search_parameters_parameters_hash_key', 'stored_search_parameters',
+                                ['parameters_hash'])
+    op.drop_constraint('stored_search_parameters_used_search_parameters_key', 'stored_search_parameters',
+                       type_='unique')
+    op.create_index('ix_stored_search_parameters_collections', 'stored_search_parameters', ['collections'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_stored_search_parameters_collections', table_name='stored_search_parameters',
+                  postgresql_using='gin')
+    op.create_unique_constraint('stored_search_parameters_used_search_parameters_key', 'stored_search_parameters',
+                                ['used_search_parameters'])
+    op.drop_constraint('stored_search_parameters_parameters_hash_key', 'stored_search_parameters', type_='unique')
+    op.drop_column('stored_search_parameters', 'collections')
+    op.drop_column('stored_search_parameters', 'parameters_hash')
@@ -0,0 +1,31 @@
+"""link stored search parameters to their last ingestion
+
+Revision ID: 8cff7ab5dcfb
+Revises: 6890132155f2
+Create Date: 2026-10-19 11:48:05.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8cff7ab5dcfb'
+down_revision = '6890132155f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('stored_search_parameters', sa.Column('last_stac_ingestion_status_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_stored_search_parameters_last_stac_ingestion_status_id'), 'stored_search_parameters',
+                    ['last_stac_ingestion_status_id'], unique=False)
+    op.create_foreign_key('stored_search_parameters_last_stac_ingestion_status_id_fkey', 'stored_search_parameters',
+                          'stac_ingestion_status', ['last_stac_ingestion_status_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    op.drop_constraint('stored_search_parameters_last_stac_ingestion_status_id_fkey', 'stored_search_parameters',
+                       type_='foreignkey')
+    op.drop_index(op.f('ix_stored_search_parameters_last_stac_ingestion_status_id'),
+                  table_name='stored_search_parameters')
+    op.drop_column('stored_search_parameters', 'last_stac_ingestion_status_id')
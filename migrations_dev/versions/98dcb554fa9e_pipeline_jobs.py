@@ -0,0 +1,46 @@
+"""pipeline jobs
+
+Revision ID: 98dcb554fa9e
+Revises: d39bd6743c5d
+Create Date: 2026-10-19 18:41:09.537112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '98dcb554fa9e'
+down_revision = 'd39bd6743c5d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pipeline_jobs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('collection_id', sa.Text(), nullable=False),
+    sa.Column('manifest', sa.Text(), nullable=False),
+    sa.Column('item_metadata', sa.Text(), nullable=False),
+    sa.Column('state', sa.Text(), nullable=False),
+    sa.Column('current_stage', sa.Text(), nullable=True),
+    sa.Column('stage_timings', sa.Text(), nullable=False),
+    sa.Column('committed_upload_ids', sa.Text(), nullable=False),
+    sa.Column('item', sa.Text(), nullable=True),
+    sa.Column('item_id', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('time_created', sa.DateTime(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('time_finished', sa.DateTime(), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.Text(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pipeline_jobs_state_next_attempt_at', 'pipeline_jobs', ['state', 'next_attempt_at'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_pipeline_jobs_state_next_attempt_at', table_name='pipeline_jobs')
+    op.drop_table('pipeline_jobs')
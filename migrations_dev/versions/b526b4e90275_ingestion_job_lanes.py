@@ -0,0 +1,25 @@
+"""add lanes to ingestion jobs
+
+Revision ID: b526b4e90275
+Revises: 84a81e9bf76a
+Create Date: 2026-10-19 16:30:27.518830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b526b4e90275'
+down_revision = '84a81e9bf76a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('ingestion_jobs', sa.Column('lane', sa.Text(), nullable=False, server_default='bulk'))
+    op.add_column('ingestion_jobs', sa.Column('started_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('ingestion_jobs', 'started_at')
+    op.drop_column('ingestion_jobs', 'lane')
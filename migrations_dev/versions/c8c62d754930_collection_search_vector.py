@@ -0,0 +1,43 @@
+"""add full-text search vector to collections
+
+Revision ID: c8c62d754930
+Revises: e1bbc5bcbbbf
+Create Date: 2026-10-19 09:12:31.418219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c8c62d754930'
+down_revision = 'e1bbc5bcbbbf'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(id, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
+def upgrade():
+    # generated columns are computed for the existing rows when they are added
+    op.add_column('public_collections',
+                  sa.Column('search_vector', postgresql.TSVECTOR(),
+                            sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True), nullable=True))
+    op.create_index('ix_public_collections_search_vector', 'public_collections', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+    op.add_column('private_collections',
+                  sa.Column('search_vector', postgresql.TSVECTOR(),
+                            sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True), nullable=True))
+    op.create_index('ix_private_collections_search_vector', 'private_collections', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_private_collections_search_vector', table_name='private_collections', postgresql_using='gin')
+    op.drop_column('private_collections', 'search_vector')
+    op.drop_index('ix_public_collections_search_vector', table_name='public_collections', postgresql_using='gin')
+    op.drop_column('public_collections', 'search_vector')
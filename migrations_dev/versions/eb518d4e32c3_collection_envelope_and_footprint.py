@@ -0,0 +1,46 @@
+"""add envelope and simplified footprint to collections
+
+Revision ID: eb518d4e32c3
+Revises: c8c62d754930
+Create Date: 2026-10-19 10:03:52.771034
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+# revision identifiers, used by Alembic.
+revision = 'eb518d4e32c3'
+down_revision = 'c8c62d754930'
+branch_labels = None
+depends_on = None
+
+SIMPLIFIED_FOOTPRINT_TOLERANCE = 0.01
+
+
+def upgrade():
+    for table_name in ('public_collections', 'private_collections'):
+        op.add_column(table_name, sa.Column('spatial_extent_envelope',
+                                            geoalchemy2.types.Geometry(geometry_type='GEOMETRY',
+                                                                       from_text='ST_GeomFromEWKT', name='geometry'),
+                                            nullable=True))
+        op.add_column(table_name, sa.Column('spatial_extent_simplified',
+                                            geoalchemy2.types.Geometry(geometry_type='GEOMETRY',
+                                                                       from_text='ST_GeomFromEWKT', name='geometry'),
+                                            nullable=True))
+        op.execute(f"""
+            UPDATE {table_name}
+            SET spatial_extent_envelope = ST_Envelope(spatial_extent),
+                spatial_extent_simplified = ST_SimplifyPreserveTopology(ST_UnaryUnion(spatial_extent),
+                                                                        {SIMPLIFIED_FOOTPRINT_TOLERANCE})
+            WHERE spatial_extent IS NOT NULL
+        """)
+        op.create_index(f'ix_{table_name}_spatial_extent_envelope', table_name, ['spatial_extent_envelope'],
+                        unique=False, postgresql_using='gist')
+
+
+def downgrade():
+    for table_name in ('private_collections', 'public_collections'):
+        op.drop_index(f'ix_{table_name}_spatial_extent_envelope', table_name=table_name, postgresql_using='gist')
+        op.drop_column(table_name, 'spatial_extent_simplified')
+        op.drop_column(table_name, 'spatial_extent_envelope')
@@ -0,0 +1,23 @@
+"""index stac ingestion status on source and start time
+
+Revision ID: f5895e18f3fd
+Revises: f90bef727745
+Create Date: 2026-10-19 15:21:36.770125
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f5895e18f3fd'
+down_revision = 'f90bef727745'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_stac_ingestion_status_source_time_started', 'stac_ingestion_status',
+                    ['source_stac_api_url', 'time_started'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_stac_ingestion_status_source_time_started', table_name='stac_ingestion_status')
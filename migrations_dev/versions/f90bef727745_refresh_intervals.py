@@ -0,0 +1,30 @@
+"""add refresh intervals to public catalogs and stored search parameters
+
+Revision ID: f90bef727745
+Revises: 46c24d87b137
+Create Date: 2026-10-19 14:46:52.083716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f90bef727745'
+down_revision = '46c24d87b137'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('public_catalogs', sa.Column('refresh_interval_seconds', sa.Integer(), nullable=True))
+    op.add_column('stored_search_parameters', sa.Column('refresh_interval_seconds', sa.Integer(), nullable=True))
+    op.add_column('stored_search_parameters', sa.Column('next_refresh_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_stored_search_parameters_next_refresh_at'), 'stored_search_parameters',
+                    ['next_refresh_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_stored_search_parameters_next_refresh_at'), table_name='stored_search_parameters')
+    op.drop_column('stored_search_parameters', 'next_refresh_at')
+    op.drop_column('stored_search_parameters', 'refresh_interval_seconds')
+    op.drop_column('public_catalogs', 'refresh_interval_seconds')
@@ -0,0 +1,18 @@
+#!/bin/bash
+# Runs the command given as arguments, usually the API, next to the background processes listed in
+# BACKGROUND_PROCESSES. When any of them exits the others are stopped, so the container exits and is restarted as a
+# whole. Set BACKGROUND_PROCESSES to an empty string when they run in containers of their own.
+export FLASK_APP=manage.py
+pids=()
+for process in ${BACKGROUND_PROCESSES-run_ingestion_dispatcher run_scheduler run_pipeline_worker}; do
+    python3 manage.py "$process" &
+    pids+=($!)
+done
+"$@" &
+pids+=($!)
+trap 'kill "${pids[@]}" 2>/dev/null' TERM INT
+wait -n
+status=$?
+kill "${pids[@]}" 2>/dev/null
+wait
+exit $status